@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Mailchimp Marketing API
+Implements the endpoints MailchimpNotifier uses (templates, segments, campaigns, batches) in memory,
+with configurable latency, 429 injection and failure rates, so the notifier can be load tested offline
+
+Usage: FAKE_MAILCHIMP_PORT=8765 FAKE_MAILCHIMP_LATENCY=0.05 python benchmarks/fake_mailchimp.py
+Point a client at it with client.api_client.host = "http://127.0.0.1:8765/3.0"
+"""
+
+import io
+import json
+import logging
+import os
+import random
+import re
+import tarfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+# Numeric / campaign / batch ids in a path, collapsed for the per-endpoint request counts
+ID_SEGMENT = re.compile(r'/(?:c|b)?\d+(?=/|$)')
+
+DEFAULT_TEMPLATE_HTML = ("<html><body><p>Hi *|FNAME|*,</p><p>New listings matching your criteria:</p>"
+                         "*|TEMP_HTML|*</body></html>")
+
+
+class FakeMailchimpError(Exception):
+    def __init__(self, status: int, title: str, detail: str = ""):
+        super().__init__(detail or title)
+        self.status = status
+        self.title = title
+        self.detail = detail
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+class FakeMailchimpState:
+    """In-memory lists, segments, campaigns, templates and batches"""
+
+    def __init__(self, batch_seconds_per_operation: float = 0.001, operation_failure_rate: float = 0.0):
+        self.batch_seconds_per_operation = batch_seconds_per_operation
+        self.operation_failure_rate = operation_failure_rate
+        self.lock = threading.Lock()
+        self.templates: Dict[str, Dict] = {}
+        self.segments: Dict[str, Dict[int, Dict]] = {}
+        self.campaigns: Dict[str, Dict] = {}
+        self.batches: Dict[str, Dict] = {}
+        self.sent_campaigns = 0
+        self.batched_operations = 0
+        self._next_id = 1000
+
+    def next_id(self) -> int:
+        with self.lock:
+            self._next_id += 1
+            return self._next_id
+
+    def template(self, template_id: str) -> Dict:
+        return self.templates.setdefault(template_id, {'id': int(template_id), 'name': f'Template {template_id}',
+                                                       'date_edited': _now(), 'html': DEFAULT_TEMPLATE_HTML})
+
+    def _segment(self, list_id: str, segment_id: str) -> Dict:
+        segment = self.segments.get(list_id, {}).get(int(segment_id))
+        if segment is None:
+            raise FakeMailchimpError(404, "Resource Not Found", f"Segment {segment_id} does not exist")
+        return segment
+
+    def _campaign(self, campaign_id: str) -> Dict:
+        campaign = self.campaigns.get(campaign_id)
+        if campaign is None:
+            raise FakeMailchimpError(404, "Resource Not Found", f"Campaign {campaign_id} does not exist")
+        return campaign
+
+    @staticmethod
+    def _public_segment(segment: Dict) -> Dict:
+        return {key: value for key, value in segment.items() if key != 'members'} | {
+            'member_count': len(segment['members'])}
+
+    # -----------------------------
+    # Endpoints: (method, path regex) -> handler(match, query, body) -> (status, body)
+    # -----------------------------
+    def get_template(self, match, query, body):
+        template = self.template(match['template_id'])
+        return 200, {key: value for key, value in template.items() if key != 'html'}
+
+    def list_segments(self, match, query, body):
+        segments = [self._public_segment(segment) for segment in self.segments.get(match['list_id'], {}).values()
+                    if query.get('type') in (None, segment['type'])]
+        offset = int(query.get('offset', 0))
+        count = int(query.get('count', 10))
+        return 200, {'segments': segments[offset:offset + count], 'total_items': len(segments)}
+
+    def create_segment(self, match, query, body):
+        segment = {'id': self.next_id(), 'name': body['name'], 'type': 'static', 'created_at': _now(),
+                   'updated_at': _now(), 'members': {email.lower() for email in body.get('static_segment', [])}}
+        with self.lock:
+            self.segments.setdefault(match['list_id'], {})[segment['id']] = segment
+        return 200, self._public_segment(segment)
+
+    def update_segment(self, match, query, body):
+        segment = self._segment(match['list_id'], match['segment_id'])
+        with self.lock:
+            segment['name'] = body.get('name', segment['name'])
+            if 'static_segment' in body:
+                segment['members'] = {email.lower() for email in body['static_segment']}
+            segment['updated_at'] = _now()
+        return 200, self._public_segment(segment)
+
+    def batch_segment_members(self, match, query, body):
+        segment = self._segment(match['list_id'], match['segment_id'])
+        to_add = [email.lower() for email in body.get('members_to_add', [])]
+        to_remove = [email.lower() for email in body.get('members_to_remove', [])]
+        with self.lock:
+            segment['members'].update(to_add)
+            segment['members'].difference_update(to_remove)
+            segment['updated_at'] = _now()
+        return 200, {'total_added': len(to_add), 'total_removed': len(to_remove), 'error_count': 0,
+                     'errors': []}
+
+    def delete_segment(self, match, query, body):
+        self._segment(match['list_id'], match['segment_id'])
+        with self.lock:
+            del self.segments[match['list_id']][int(match['segment_id'])]
+        return 204, None
+
+    def segment_members(self, match, query, body):
+        members = sorted(self._segment(match['list_id'], match['segment_id'])['members'])
+        offset = int(query.get('offset', 0))
+        count = int(query.get('count', 10))
+        return 200, {'members': [{'email_address': email} for email in members[offset:offset + count]],
+                     'total_items': len(members)}
+
+    def create_campaign(self, match, query, body):
+        settings = body.get('settings', {})
+        for field in ('subject_line', 'from_name', 'reply_to'):
+            if not settings.get(field):
+                raise FakeMailchimpError(400, "Invalid Resource", f"settings.{field} is required")
+        campaign_id = f"c{self.next_id()}"
+        html = self.template(str(settings['template_id']))['html'] if settings.get('template_id') else ""
+        campaign = {'id': campaign_id, 'type': body.get('type', 'regular'), 'status': 'save',
+                    'recipients': body.get('recipients', {}), 'settings': settings, 'html': html}
+        with self.lock:
+            self.campaigns[campaign_id] = campaign
+        return 200, {key: value for key, value in campaign.items() if key != 'html'}
+
+    def get_campaign(self, match, query, body):
+        campaign = self._campaign(match['campaign_id'])
+        return 200, {key: value for key, value in campaign.items() if key != 'html'}
+
+    def delete_campaign(self, match, query, body):
+        self._campaign(match['campaign_id'])
+        with self.lock:
+            del self.campaigns[match['campaign_id']]
+        return 204, None
+
+    def get_content(self, match, query, body):
+        return 200, {'html': self._campaign(match['campaign_id'])['html']}
+
+    def set_content(self, match, query, body):
+        campaign = self._campaign(match['campaign_id'])
+        campaign['html'] = body.get('html', '')
+        return 200, {'html': campaign['html']}
+
+    def send_campaign(self, match, query, body):
+        campaign = self._campaign(match['campaign_id'])
+        if campaign['status'] != 'save':
+            raise FakeMailchimpError(400, "Bad Request", "Campaign has already been sent")
+        if not campaign['html']:
+            raise FakeMailchimpError(400, "Bad Request", "Campaign has no content")
+        with self.lock:
+            campaign['status'] = 'sent'
+            self.sent_campaigns += 1
+        return 204, None
+
+    def start_batch(self, match, query, body):
+        batch_id = f"b{self.next_id()}"
+        operations = body.get('operations', [])
+        batch = {'id': batch_id, 'status': 'pending', 'total_operations': len(operations),
+                 'finished_operations': 0, 'errored_operations': 0, 'submitted_at': _now(),
+                 'response_body_url': '', 'results': []}
+        with self.lock:
+            self.batches[batch_id] = batch
+            self.batched_operations += len(operations)
+        threading.Thread(target=self._run_batch, args=(batch, operations), daemon=True).start()
+        return 200, self._public_batch(batch)
+
+    def batch_status(self, match, query, body):
+        batch = self.batches.get(match['batch_id'])
+        if batch is None:
+            raise FakeMailchimpError(404, "Resource Not Found", f"Batch {match['batch_id']} does not exist")
+        return 200, self._public_batch(batch)
+
+    @staticmethod
+    def _public_batch(batch: Dict) -> Dict:
+        return {key: value for key, value in batch.items() if key != 'results'}
+
+    def _run_batch(self, batch: Dict, operations) -> None:
+        batch['status'] = 'started'
+        for operation in operations:
+            time.sleep(self.batch_seconds_per_operation)
+            path = urlparse(operation.get('path', ''))
+            body = json.loads(operation['body']) if operation.get('body') else {}
+            if random.random() < self.operation_failure_rate:
+                status, response = 500, {'title': "Internal Server Error", 'status': 500, 'detail': "Injected failure"}
+            else:
+                status, response = self.dispatch(operation.get('method', 'GET'), '/3.0' + path.path,
+                                                 {key: values[0] for key, values in parse_qs(path.query).items()},
+                                                 body)
+            batch['results'].append({'status_code': status, 'operation_id': operation.get('operation_id'),
+                                     'response': json.dumps(response or {})})
+            batch['finished_operations'] += 1
+            if status >= 400:
+                batch['errored_operations'] += 1
+        batch['response_body_url'] = f"{self.base_url}/batch-results/{batch['id']}.tar.gz"
+        batch['completed_at'] = _now()
+        batch['status'] = 'finished'
+
+    def batch_archive(self, batch_id: str) -> bytes:
+        payload = json.dumps(self.batches[batch_id]['results']).encode('utf-8')
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+            info = tarfile.TarInfo(name=f"{batch_id}/results.json")
+            info.size = len(payload)
+            archive.addfile(info, io.BytesIO(payload))
+        return buffer.getvalue()
+
+    ROUTES = [
+        ('GET', r'/3\.0/templates/(?P<template_id>\d+)', 'get_template'),
+        ('GET', r'/3\.0/lists/(?P<list_id>[^/]+)/segments', 'list_segments'),
+        ('POST', r'/3\.0/lists/(?P<list_id>[^/]+)/segments', 'create_segment'),
+        ('PATCH', r'/3\.0/lists/(?P<list_id>[^/]+)/segments/(?P<segment_id>\d+)', 'update_segment'),
+        ('POST', r'/3\.0/lists/(?P<list_id>[^/]+)/segments/(?P<segment_id>\d+)', 'batch_segment_members'),
+        ('DELETE', r'/3\.0/lists/(?P<list_id>[^/]+)/segments/(?P<segment_id>\d+)', 'delete_segment'),
+        ('GET', r'/3\.0/lists/(?P<list_id>[^/]+)/segments/(?P<segment_id>\d+)/members', 'segment_members'),
+        ('POST', r'/3\.0/campaigns', 'create_campaign'),
+        ('GET', r'/3\.0/campaigns/(?P<campaign_id>[^/]+)', 'get_campaign'),
+        ('DELETE', r'/3\.0/campaigns/(?P<campaign_id>[^/]+)', 'delete_campaign'),
+        ('GET', r'/3\.0/campaigns/(?P<campaign_id>[^/]+)/content', 'get_content'),
+        ('PUT', r'/3\.0/campaigns/(?P<campaign_id>[^/]+)/content', 'set_content'),
+        ('POST', r'/3\.0/campaigns/(?P<campaign_id>[^/]+)/actions/send', 'send_campaign'),
+        ('POST', r'/3\.0/batches', 'start_batch'),
+        ('GET', r'/3\.0/batches/(?P<batch_id>[^/]+)', 'batch_status'),
+    ]
+
+    base_url = ""
+
+    def dispatch(self, method: str, path: str, query: Dict, body: Optional[Dict]) -> Tuple[int, Optional[Dict]]:
+        for route_method, pattern, handler in self.ROUTES:
+            match = re.fullmatch(pattern, path)
+            if match and route_method == method:
+                try:
+                    return getattr(self, handler)(match.groupdict(), query, body or {})
+                except FakeMailchimpError as error:
+                    return error.status, {'title': error.title, 'status': error.status, 'detail': error.detail}
+                except (KeyError, ValueError, TypeError) as error:
+                    return 400, {'title': "Invalid Resource", 'status': 400, 'detail': str(error)}
+        return 404, {'title': "Resource Not Found", 'status': 404, 'detail': f"No route for {method} {path}"}
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # The client opens a new connection per request; the default backlog of 5 drops SYNs under load
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class FakeMailchimpServer:
+    """Threaded HTTP server around FakeMailchimpState, with fault injection"""
+
+    def __init__(self, port: int = 0, latency: float = 0.05, latency_jitter: float = 0.5,
+                 rate_429: float = 0.0, failure_rate: float = 0.0, batch_seconds_per_operation: float = 0.001,
+                 seed: Optional[int] = None):
+        """
+        Initialize the fake server
+
+        Args:
+            port: Port on 127.0.0.1 (0 picks a free one)
+            latency: Mean added response time in seconds
+            latency_jitter: Fraction of `latency` randomized either way
+            rate_429: Share of requests rejected with 429 Too Many Requests
+            failure_rate: Share of requests failing with 500 (the request has no effect)
+            batch_seconds_per_operation: Processing time per /batches operation
+            seed: Random seed for reproducible fault injection
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.rate_429 = rate_429
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.state = FakeMailchimpState(batch_seconds_per_operation, operation_failure_rate=failure_rate)
+        self.requests: Counter = Counter()
+        self.injected: Counter = Counter()
+        self._stats_lock = threading.Lock()
+
+        self.httpd = _HTTPServer(('127.0.0.1', port), self._handler_class())
+        self.port = self.httpd.server_address[1]
+        # Mailchimp's client substitutes "server" anywhere in the URL, so stay clear of that word
+        self.state.base_url = f"http://127.0.0.1:{self.port}"
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def api_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/3.0"
+
+    def _fault(self) -> Optional[Tuple[int, Dict]]:
+        with self._stats_lock:
+            roll = self.random.random()
+            delay = self.latency * (1 + self.latency_jitter * (2 * self.random.random() - 1))
+        time.sleep(max(0.0, delay))
+        if roll < self.rate_429:
+            self.injected['429'] += 1
+            return 429, {'title': "Too Many Requests", 'status': 429, 'detail': "Injected throttling"}
+        if roll < self.rate_429 + self.failure_rate:
+            self.injected['500'] += 1
+            return 500, {'title': "Internal Server Error", 'status': 500, 'detail': "Injected failure"}
+        return None
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _reply(self, status: int, body: Optional[Dict], content_type: str = "application/json",
+                       raw: bytes = None):
+                payload = raw if raw is not None else (json.dumps(body).encode('utf-8') if body is not None else b"")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _handle(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                raw_body = self.rfile.read(length) if length else b""
+
+                archive = re.fullmatch(r'/batch-results/(?P<batch_id>[^/]+)\.tar\.gz', url.path)
+                if archive and self.command == 'GET':
+                    self._reply(200, None, "application/x-gzip", server.state.batch_archive(archive['batch_id']))
+                    return
+
+                with server._stats_lock:
+                    server.requests[f"{self.command} {ID_SEGMENT.sub('/{id}', url.path)}"] += 1
+                fault = server._fault()
+                if fault:
+                    self._reply(*fault)
+                    return
+                try:
+                    body = json.loads(raw_body) if raw_body else None
+                except ValueError:
+                    self._reply(400, {'title': "Invalid JSON", 'status': 400})
+                    return
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                self._reply(*server.state.dispatch(self.command, url.path, query, body))
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+        return Handler
+
+    def start(self) -> "FakeMailchimpServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-mailchimp", daemon=True)
+        self._thread.start()
+        logger.info(f"Fake Mailchimp listening on {self.api_url}")
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    fake = FakeMailchimpServer(port=int(os.getenv('FAKE_MAILCHIMP_PORT', 8765)),
+                               latency=float(os.getenv('FAKE_MAILCHIMP_LATENCY', 0.05)),
+                               rate_429=float(os.getenv('FAKE_MAILCHIMP_429_RATE', 0)),
+                               failure_rate=float(os.getenv('FAKE_MAILCHIMP_FAILURE_RATE', 0)))
+    fake.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
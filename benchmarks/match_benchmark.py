@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Subscriber matching benchmark
+Compares a verbatim copy of the original per-pair matching loop with the inverted index and the NumPy matcher
+on synthetic subscribers and listings, and checks that the engines return the same matches as the original loop with price bounds applied
+
+Usage: BENCH_SUBSCRIBERS=20000 BENCH_LISTINGS=100 python benchmarks/match_benchmark.py
+"""
+
+import logging
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mailchimp_notifier import MailchimpNotifier
+from helpers.subscriber_index import SubscriberIndex
+from helpers.vector_matcher import NUMPY_AVAILABLE, VectorMatcher
+
+logger = logging.getLogger(__name__)
+
+STATES = ['nevada', 'california', 'texas', 'florida', 'new york', 'utah', 'arizona', 'oregon']
+CITIES = ['las vegas', 'reno', 'henderson', 'austin', 'dallas', 'miami', 'los angeles', 'phoenix', 'portland']
+INDUSTRIES = ['Restaurants', 'Food', 'Retail', 'Online', 'Technology', 'Automotive', 'Beauty',
+              'Health Care', 'Fitness', 'Real Estate', 'Service Businesses', 'Manufacturing']
+
+
+def make_subscriber(i: int) -> dict:
+    subscriber = {'email': f'subscriber{i}@example.com'}
+    if random.random() < 0.7:
+        subscriber['price_min'] = random.choice([None, '100000', 250000, '$500,000'])
+    if random.random() < 0.7:
+        subscriber['price_max'] = random.choice([None, '1,000,000', 2000000, 750000])
+    if random.random() < 0.6:
+        subscriber['industries'] = ', '.join(random.sample(INDUSTRIES, random.randint(1, 3)))
+    if random.random() < 0.6:
+        subscriber['state'] = ', '.join(random.sample(STATES, random.randint(1, 2))).title()
+    if random.random() < 0.3:
+        subscriber['city'] = ', '.join(random.sample(CITIES, random.randint(1, 2)))
+    return subscriber
+
+
+def make_listing(i: int) -> dict:
+    return {
+        'url': f'https://www.bizbuysell.com/business-opportunity/listing-{i}/',
+        'asking_price': f"${random.randint(50, 3000) * 1000:,}" if random.random() < 0.95 else None,
+        'category': random.sample(INDUSTRIES, random.randint(0, 2)),
+        'state': random.choice(STATES + ['']),
+        'city': random.choice(CITIES + ['']),
+    }
+
+
+class OriginalMatcher:
+    """The matching code as it was before the index, copied verbatim from mailchimp_notifier.py"""
+
+    @staticmethod
+    def _normalize_price(value) -> Optional[float]:
+        """Normalize price value to float."""
+        if value is None:
+            return None
+        try:
+            s = str(value).replace(',', '').replace('$', '').strip()
+            return float(s)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _normalize_list_field(field_value: str) -> List[str]:
+        """Normalize comma-separated string to list."""
+        if not field_value:
+            return []
+        return [item.strip() for item in str(field_value).replace('\xa0', '').split(',')
+                if item and item.strip()]
+
+    def match_subscribers_to_listings_mongo(self, subscribers: List[Dict], listings: List[Dict]) -> Dict[str, List[Dict]]:
+        """Match subscribers from MongoDB to listings based on their preferences."""
+        matches = {}
+
+        for subscriber in subscribers:
+            email = subscriber.get('email')
+            if not email:
+                continue
+
+            # Get subscriber preferences directly from MongoDB document
+            min_price = subscriber.get('price_min')
+            max_price = subscriber.get('price_max')
+            subscriber_industries = set(i.lower() for i in self._normalize_list_field(subscriber.get('industries')))
+            subscriber_states = set(i.lower() for i in self._normalize_list_field(subscriber.get('state')))
+            subscriber_cities = set(i.lower() for i in self._normalize_list_field(subscriber.get('city')))
+
+            # Check each listing
+            matched_listings = []
+            for listing in listings:
+                if self._listing_matches_subscriber(listing, min_price, max_price,
+                                                    subscriber_industries, subscriber_states, subscriber_cities):
+                    matched_listings.append(listing)
+
+            if matched_listings:
+                matches[email] = matched_listings
+
+        return matches
+
+    def _listing_matches_subscriber(self, listing: Dict, min_price: Optional[float], max_price: Optional[float],
+                                    subscriber_industries: set, subscriber_states: set, subscriber_cities: set) -> bool:
+        """Check if a listing matches subscriber criteria."""
+        try:
+            # Price matching
+            price = self._normalize_price(listing.get('asking_price'))
+            logger.info('STARTING LISTING MATCHING...')
+            logger.info(f"PRICE: {price}")
+            logger.info(f"SUB MIN PRICE: {min_price}")
+            logger.info(f"SUB MAX PRICE: {max_price}")
+
+            if (min_price is None and (price is None)) and (int(price) >= int(min_price)):
+                return False
+            if (max_price is None and price is None) and (int(price) <= int(max_price)):
+                return False
+
+            # Industry matching
+            if subscriber_industries:
+                listing_categories = listing.get('category') or []
+
+                logger.info(f"LISTING CATEGORIES: {listing_categories}")
+                if not isinstance(listing_categories, list):
+                    listing_categories = [listing_categories]
+                listing_industries = set(str(cat).lower().strip() for cat in listing_categories if cat)
+                if not subscriber_industries.intersection(listing_industries):
+                    return False
+
+            logger.info(f"SUBSCRIBER STATES: {subscriber_states}")
+            # Location matching (states and cities)
+            if subscriber_states:
+                listing_state = {listing.get('state', '').lower()}
+                logger.info(f"LISTING STATES: {listing_state}")
+                if not subscriber_states.intersection(listing_state):
+                    return False
+
+            logger.info(f"SUBSCRIBER CITIES: {subscriber_cities}")
+            if subscriber_cities:
+                listing_city = {listing.get('city', '').lower()}
+                if not subscriber_cities.intersection(listing_city):
+                    return False
+                logger.info(f"LISTING CITIES: {listing_city}")
+
+            return True
+        except Exception as err:
+            logger.error(f"LISTING MATCHING ERROR: {err}")
+            return False
+
+
+class BoundedOriginalMatcher(OriginalMatcher):
+    """The original loop with the price bounds applied, i.e. the rule the index implements"""
+
+    def _listing_matches_subscriber(self, listing: Dict, min_price, max_price,
+                                    subscriber_industries: set, subscriber_states: set, subscriber_cities: set) -> bool:
+        price = self._normalize_price(listing.get('asking_price'))
+        low, high = self._normalize_price(min_price), self._normalize_price(max_price)
+        if price is None:
+            if low is not None or high is not None:
+                return False
+        elif (low is not None and price < low) or (high is not None and price > high):
+            return False
+        # The original price check never rejects a priced listing, so the rest of the checks decide
+        return super()._listing_matches_subscriber(dict(listing, asking_price=0), min_price, max_price,
+                                                   subscriber_industries, subscriber_states, subscriber_cities)
+
+
+def timed(label: str, fn):
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed:8.3f}s  ({len(result)} subscribers matched)")
+    return result
+
+
+def main():
+    subscriber_count = int(os.getenv('BENCH_SUBSCRIBERS', 20000))
+    listing_count = int(os.getenv('BENCH_LISTINGS', 100))
+    random.seed(int(os.getenv('BENCH_SEED', 7)))
+
+    # Keep the match summary lines and the original loop's per-pair error lines out of the timings
+    logging.disable(logging.ERROR)
+
+    subscribers = [make_subscriber(i) for i in range(subscriber_count)]
+    listings = [make_listing(i) for i in range(listing_count)]
+    notifier = MailchimpNotifier.__new__(MailchimpNotifier)
+    criteria = notifier._compile_subscribers(subscribers)
+
+    print(f"{subscriber_count} subscribers x {listing_count} listings")
+    original = timed("original loop", lambda: OriginalMatcher().match_subscribers_to_listings_mongo(subscribers, listings))
+    expected = BoundedOriginalMatcher().match_subscribers_to_listings_mongo(subscribers, listings)
+    results = {'index (build + match)': timed("index (build + match)", lambda: SubscriberIndex(criteria).match(listings))}
+    if NUMPY_AVAILABLE:
+        results['numpy (build + match)'] = timed("numpy (build + match)", lambda: VectorMatcher(criteria).match(listings))
+        matcher = VectorMatcher(criteria)
+        results['numpy (match only)'] = timed("numpy (match only)", lambda: matcher.match(listings))
+    else:
+        print("numpy is not installed, skipping the vectorized matcher")
+
+    # The original loop never applied the price bounds, so the engines are checked against the bounded loop
+    changed = sum(1 for email in set(original) | set(expected) if original.get(email) != expected.get(email))
+    print(f"{changed} subscribers get different listings under the price bounds than under the original loop")
+    for label, result in results.items():
+        status = "OK" if result == expected else "MISMATCH"
+        print(f"{label:<28} {status}")
+
+
+if __name__ == "__main__":
+    main()
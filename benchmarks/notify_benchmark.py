@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+MailchimpNotifier load benchmark
+Runs notify() end to end against the local fake Mailchimp server with synthetic subscribers and
+listings, and reports Mailchimp calls per group, wall time and call latency percentiles
+
+Usage: BENCH_SUBSCRIBERS=5000 BENCH_LISTINGS=200 BENCH_LATENCY=0.05 BENCH_429_RATE=0.02 \
+       MAILCHIMP_DISPATCH_MODE=parallel python benchmarks/notify_benchmark.py
+"""
+
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_mailchimp import FakeMailchimpServer
+from match_benchmark import make_listing, make_subscriber
+
+# The notifier only needs these to be set; nothing connects to MongoDB during the run
+os.environ.setdefault("MAILCHIMP_API_KEY", "benchmark-us1")
+os.environ.setdefault("MAILCHIMP_LIST_ID", "benchlist")
+os.environ.setdefault("MAILCHIMP_EMAIL_TEMPLATE_ID", "1")
+os.environ.setdefault("MONGO_DB_URI", "mongodb://127.0.0.1:27017")
+
+import mailchimp_notifier
+from mailchimp_notifier import MailchimpNotifier
+
+
+class StaticSubscribers:
+    """Stands in for the MongoDB-backed subscriber cache"""
+
+    def __init__(self, subscribers: list):
+        self.criteria = MailchimpNotifier._compile_subscribers(subscribers)
+
+    def refresh(self) -> list:
+        return self.criteria
+
+
+def percentile(values: list, share: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+def instrument(notifier: MailchimpNotifier) -> list:
+    """Record the duration of every HTTP request the Mailchimp client makes"""
+    latencies = []
+    lock = threading.Lock()
+    api_client = notifier.mailchimp_client.api_client
+    request = api_client.request
+
+    def timed_request(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return request(*args, **kwargs)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    api_client.request = timed_request
+    return latencies
+
+
+def main():
+    subscriber_count = int(os.getenv('BENCH_SUBSCRIBERS', 5000))
+    listing_count = int(os.getenv('BENCH_LISTINGS', 200))
+    runs = int(os.getenv('BENCH_RUNS', 2))
+    random.seed(int(os.getenv('BENCH_SEED', 7)))
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    fake = FakeMailchimpServer(latency=float(os.getenv('BENCH_LATENCY', 0.05)),
+                               rate_429=float(os.getenv('BENCH_429_RATE', 0)),
+                               failure_rate=float(os.getenv('BENCH_FAILURE_RATE', 0)),
+                               seed=int(os.getenv('BENCH_SEED', 7))).start()
+
+    subscribers = [make_subscriber(i) for i in range(subscriber_count)]
+    listings = [make_listing(i) for i in range(listing_count)]
+    mailchimp_notifier.get_subscriber_cache = lambda: StaticSubscribers(subscribers)
+
+    # Template and segment caches land in a scratch directory, not the working tree
+    os.chdir(tempfile.mkdtemp(prefix="notify-benchmark-"))
+
+    print(f"{subscriber_count} subscribers x {listing_count} listings, fake Mailchimp at {fake.api_url} "
+          f"(latency {fake.latency:g}s, 429 rate {fake.rate_429:g}, failure rate {fake.failure_rate:g})")
+    try:
+        for run in range(1, runs + 1):
+            fake.requests.clear()
+            fake.injected.clear()
+            fake.state.batched_operations = 0
+
+            notifier = MailchimpNotifier(os.environ["MAILCHIMP_API_KEY"])
+            notifier.mailchimp_client.api_client.host = fake.api_url
+            latencies = instrument(notifier)
+
+            started = time.perf_counter()
+            result = notifier.notify(listings, cleanup_segments=False)
+            elapsed = time.perf_counter() - started
+
+            groups = max(1, result.get('groups_created', 0))
+            calls = sum(fake.requests.values())
+            operations = fake.state.batched_operations
+            print(f"\nRun {run}: {result}")
+            print(f"  wall time            {elapsed:8.2f}s")
+            print(f"  Mailchimp calls      {calls:8d}  ({calls / groups:.2f} per sent group)")
+            print(f"  batched operations   {operations:8d}  ({operations / groups:.2f} per sent group)")
+            print(f"  call latency p50     {percentile(latencies, 0.50) * 1000:8.1f}ms")
+            print(f"  call latency p95     {percentile(latencies, 0.95) * 1000:8.1f}ms")
+            print(f"  injected             {dict(fake.injected) or 'none'}")
+            for endpoint, count in Counter(fake.requests).most_common():
+                print(f"    {count:6d}  {endpoint}")
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
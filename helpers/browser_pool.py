@@ -0,0 +1,110 @@
+"""
+Pool of long-lived Selenium drivers
+Each slot owns its own driver and proxy; slots are checked out per task and recycled after K pages or on a ban
+"""
+
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+from helpers.proxy_pool import Proxy, ProxyPool
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserSlot:
+    """One pooled driver plus the proxy it was started with"""
+
+    def __init__(self, slot_id: int):
+        self.slot_id = slot_id
+        self.driver = None
+        self.proxy: Optional[Proxy] = None
+        self.pages_served = 0
+
+
+class BrowserPool:
+    """Fixed-size pool of independent drivers, created lazily on first checkout"""
+
+    def __init__(self,
+                 create_driver: Callable[[Optional[Proxy]], object],
+                 proxy_pool: ProxyPool,
+                 size: int = 2,
+                 max_pages_per_driver: int = 25):
+        """
+        Initialize the browser pool
+
+        Args:
+            create_driver: Factory that starts a driver for the given proxy (returns None on failure)
+            proxy_pool: Pool each slot leases its proxy from
+            size: Number of drivers that may run at the same time
+            max_pages_per_driver: Pages a driver serves before it is recycled with a fresh proxy
+        """
+        self.create_driver = create_driver
+        self.proxy_pool = proxy_pool
+        self.size = max(1, size)
+        self.max_pages_per_driver = max_pages_per_driver
+
+        self._slots: List[BrowserSlot] = [BrowserSlot(i) for i in range(self.size)]
+        self._idle: "queue.Queue[BrowserSlot]" = queue.Queue()
+        for slot in self._slots:
+            self._idle.put(slot)
+        self._closed = threading.Event()
+
+    def _start(self, slot: BrowserSlot) -> None:
+        """Start the slot's driver with a newly leased proxy"""
+        exclude = {slot.proxy.key} if slot.proxy else None
+        slot.proxy = self.proxy_pool.lease(exclude=exclude)
+        slot.driver = self.create_driver(slot.proxy)
+        slot.pages_served = 0
+        if slot.driver:
+            logger.info(f"Started browser slot {slot.slot_id} via {slot.proxy.key if slot.proxy else 'direct'}")
+
+    def _stop(self, slot: BrowserSlot) -> None:
+        if slot.driver:
+            try:
+                slot.driver.quit()
+            except Exception:
+                pass
+        slot.driver = None
+
+    def ensure_driver(self, slot: BrowserSlot):
+        """Return the slot's driver, starting it if needed"""
+        if slot.driver is None:
+            self._start(slot)
+        return slot.driver
+
+    def recycle(self, slot: BrowserSlot, banned: bool = False) -> None:
+        """Drop a failing driver and report its proxy; a new one is started on next use"""
+        self.proxy_pool.report_failure(slot.proxy, banned=banned)
+        self._stop(slot)
+
+    @contextmanager
+    def checkout(self, timeout: float = None) -> Iterator[BrowserSlot]:
+        """Borrow a slot for one task; it is recycled on return once it has served K pages"""
+        if self._closed.is_set():
+            raise RuntimeError("Browser pool is closed")
+
+        slot = self._idle.get(timeout=timeout)
+        try:
+            yield slot
+        finally:
+            if slot.driver is not None:
+                slot.pages_served += 1
+                if slot.pages_served >= self.max_pages_per_driver:
+                    logger.info(f"Recycling browser slot {slot.slot_id} after {slot.pages_served} pages")
+                    self._stop(slot)
+            if self._closed.is_set():
+                self._stop(slot)
+            self._idle.put(slot)
+
+    def close(self) -> None:
+        """Quit every idle driver; drivers still checked out are quit when returned"""
+        self._closed.set()
+        while True:
+            try:
+                slot = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._stop(slot)
@@ -0,0 +1,92 @@
+"""
+Persistent cache for AI category classification
+Maps a normalized BizBuySell category to the validated category list, versioned by the taxonomy
+"""
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CategoryCache:
+    """SQLite-backed memoization of the enricher's category classifications"""
+
+    def __init__(self, categories: List[str], path: str = "category_cache.sqlite3",
+                 ttl_seconds: int = 90 * 24 * 3600):
+        """
+        Initialize the category cache
+
+        Args:
+            categories: The predefined category taxonomy; changing it invalidates every entry
+            path: SQLite file holding the cache
+            ttl_seconds: Age after which an entry is classified again
+        """
+        self.version = self.taxonomy_version(categories)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._memory: Dict[str, tuple] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS category_cache ("
+            " key TEXT NOT NULL,"
+            " version TEXT NOT NULL,"
+            " categories TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (key, version))"
+        )
+        # Entries from an older taxonomy can never be hit again
+        deleted = self._conn.execute("DELETE FROM category_cache WHERE version != ?", (self.version,)).rowcount
+        self._conn.commit()
+        if deleted:
+            logger.info(f"Dropped {deleted} category cache entries from an older taxonomy")
+
+    @staticmethod
+    def taxonomy_version(categories: List[str]) -> str:
+        return hashlib.sha1('\n'.join(sorted(categories)).encode('utf-8')).hexdigest()[:12]
+
+    @staticmethod
+    def normalize(category: str) -> str:
+        return re.sub(r'\s+', ' ', str(category or '')).strip().lower()
+
+    def get(self, category: str) -> Optional[List[str]]:
+        """Return the cached categories for an original category, or None on a miss"""
+        key = self.normalize(category)
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached and cached[1] > cutoff:
+                return list(cached[0])
+
+            row = self._conn.execute(
+                "SELECT categories, updated_at FROM category_cache WHERE key = ? AND version = ? AND updated_at > ?",
+                (key, self.version, cutoff)
+            ).fetchone()
+            if row is None:
+                return None
+
+            categories = json.loads(row[0])
+            self._memory[key] = (categories, row[1])
+            return list(categories)
+
+    def set(self, category: str, categories: List[str]) -> None:
+        key = self.normalize(category)
+        now = time.time()
+        with self._lock:
+            self._memory[key] = (list(categories), now)
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO category_cache (key, version, categories, updated_at) VALUES (?, ?, ?, ?)",
+                    (key, self.version, json.dumps(categories), now)
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Error writing category cache: {e}")
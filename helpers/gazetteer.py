@@ -0,0 +1,151 @@
+"""
+Offline gazetteer for listing locations
+Parses the common "City, ST" / "County, ST" shapes of span.f-l into a full state name and city
+"""
+
+import re
+import threading
+from typing import Dict, Optional
+
+# Output mirrors the LLM contract: lower-case, no abbreviations
+US_STATES = {
+    'AL': 'alabama', 'AK': 'alaska', 'AZ': 'arizona', 'AR': 'arkansas', 'CA': 'california',
+    'CO': 'colorado', 'CT': 'connecticut', 'DE': 'delaware', 'FL': 'florida', 'GA': 'georgia',
+    'HI': 'hawaii', 'ID': 'idaho', 'IL': 'illinois', 'IN': 'indiana', 'IA': 'iowa',
+    'KS': 'kansas', 'KY': 'kentucky', 'LA': 'louisiana', 'ME': 'maine', 'MD': 'maryland',
+    'MA': 'massachusetts', 'MI': 'michigan', 'MN': 'minnesota', 'MS': 'mississippi', 'MO': 'missouri',
+    'MT': 'montana', 'NE': 'nebraska', 'NV': 'nevada', 'NH': 'new hampshire', 'NJ': 'new jersey',
+    'NM': 'new mexico', 'NY': 'new york', 'NC': 'north carolina', 'ND': 'north dakota', 'OH': 'ohio',
+    'OK': 'oklahoma', 'OR': 'oregon', 'PA': 'pennsylvania', 'RI': 'rhode island', 'SC': 'south carolina',
+    'SD': 'south dakota', 'TN': 'tennessee', 'TX': 'texas', 'UT': 'utah', 'VT': 'vermont',
+    'VA': 'virginia', 'WA': 'washington', 'WV': 'west virginia', 'WI': 'wisconsin', 'WY': 'wyoming',
+    'DC': 'district of columbia', 'PR': 'puerto rico', 'VI': 'virgin islands', 'GU': 'guam',
+}
+
+CA_PROVINCES = {
+    'AB': 'alberta', 'BC': 'british columbia', 'MB': 'manitoba', 'NB': 'new brunswick',
+    'NL': 'newfoundland and labrador', 'NS': 'nova scotia', 'NT': 'northwest territories',
+    'NU': 'nunavut', 'ON': 'ontario', 'PE': 'prince edward island', 'QC': 'quebec',
+    'SK': 'saskatchewan', 'YT': 'yukon',
+}
+
+STATE_ABBREVIATIONS = {**US_STATES, **CA_PROVINCES}
+STATE_NAMES = {name: name for name in STATE_ABBREVIATIONS.values()}
+STATE_NAMES.update({'washington dc': 'district of columbia', 'washington d.c.': 'district of columbia'})
+
+# City index: nicknames and unambiguous large cities that show up without a state
+CITY_ALIASES = {
+    'nyc': 'new york', 'new york city': 'new york', 'la': 'los angeles', 'sf': 'san francisco',
+    'philly': 'philadelphia', 'vegas': 'las vegas', 'st louis': 'st. louis', 'saint louis': 'st. louis',
+    'st paul': 'st. paul', 'saint paul': 'st. paul', 'st petersburg': 'st. petersburg',
+    'saint petersburg': 'st. petersburg', 'ft lauderdale': 'fort lauderdale', 'ft. lauderdale': 'fort lauderdale',
+    'ft worth': 'fort worth', 'ft. worth': 'fort worth',
+}
+
+CITY_STATES = {
+    'new york': 'new york', 'los angeles': 'california', 'chicago': 'illinois', 'houston': 'texas',
+    'phoenix': 'arizona', 'philadelphia': 'pennsylvania', 'san antonio': 'texas', 'san diego': 'california',
+    'dallas': 'texas', 'san jose': 'california', 'austin': 'texas', 'jacksonville': 'florida',
+    'fort worth': 'texas', 'columbus': 'ohio', 'charlotte': 'north carolina', 'indianapolis': 'indiana',
+    'san francisco': 'california', 'seattle': 'washington', 'denver': 'colorado', 'nashville': 'tennessee',
+    'oklahoma city': 'oklahoma', 'el paso': 'texas', 'boston': 'massachusetts', 'las vegas': 'nevada',
+    'detroit': 'michigan', 'louisville': 'kentucky', 'memphis': 'tennessee', 'baltimore': 'maryland',
+    'milwaukee': 'wisconsin', 'albuquerque': 'new mexico', 'tucson': 'arizona', 'fresno': 'california',
+    'sacramento': 'california', 'mesa': 'arizona', 'atlanta': 'georgia', 'omaha': 'nebraska',
+    'colorado springs': 'colorado', 'raleigh': 'north carolina', 'miami': 'florida', 'minneapolis': 'minnesota',
+    'tulsa': 'oklahoma', 'tampa': 'florida', 'new orleans': 'louisiana', 'cleveland': 'ohio',
+    'honolulu': 'hawaii', 'henderson': 'nevada', 'reno': 'nevada', 'north las vegas': 'nevada',
+    'scottsdale': 'arizona', 'salt lake city': 'utah', 'boise': 'idaho', 'orlando': 'florida',
+    'pittsburgh': 'pennsylvania', 'cincinnati': 'ohio', 'st. louis': 'missouri', 'st. paul': 'minnesota',
+    'st. petersburg': 'florida', 'fort lauderdale': 'florida', 'portland': 'oregon',
+    'toronto': 'ontario', 'vancouver': 'british columbia', 'calgary': 'alberta', 'montreal': 'quebec',
+}
+
+_ZIP_RE = re.compile(r'\s*\b\d{5}(?:-\d{4})?\b\s*$')
+_CA_POSTAL_RE = re.compile(r'\s*\b[A-Za-z]\d[A-Za-z]\s?\d[A-Za-z]\d\b\s*$')
+_PAREN_RE = re.compile(r'\([^)]*\)')
+
+
+class Gazetteer:
+    """Deterministic parser for listing locations; returns None when the LLM is still needed"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._city_states = dict(CITY_STATES)
+        self._ambiguous_cities = set()
+
+    @staticmethod
+    def _resolve_state(token: str) -> Optional[str]:
+        token = token.strip().strip('.').strip()
+        if not token:
+            return None
+        if len(token) == 2 and token.upper() in STATE_ABBREVIATIONS:
+            return STATE_ABBREVIATIONS[token.upper()]
+        return STATE_NAMES.get(token.lower())
+
+    @staticmethod
+    def _clean_city(token: str) -> str:
+        city = re.sub(r'\s+', ' ', token).strip().strip(',').lower()
+        return CITY_ALIASES.get(city, city)
+
+    def learn(self, city: str, state: str) -> None:
+        """Remember a resolved city so later "City" strings without a state resolve offline"""
+        if not city or not state:
+            return
+        city, state = city.lower(), state.lower()
+        with self._lock:
+            known = self._city_states.get(city)
+            if known is None and city not in self._ambiguous_cities:
+                self._city_states[city] = state
+            elif known is not None and known != state and city not in CITY_STATES:
+                # Same name in two states (e.g. Springfield): never resolve it without a state
+                del self._city_states[city]
+                self._ambiguous_cities.add(city)
+
+    def parse(self, location: str) -> Optional[Dict]:
+        """Parse a location string into {"state": ..., "city": ...}, or None if unresolved"""
+        if not location:
+            return None
+
+        text = _PAREN_RE.sub(' ', str(location)).replace('\xa0', ' ')
+        text = _ZIP_RE.sub('', text)
+        text = _CA_POSTAL_RE.sub('', text)
+        text = re.sub(r'\s+', ' ', text).strip().strip(',').strip()
+        if not text:
+            return None
+
+        parts = [part.strip() for part in text.split(',') if part.strip()]
+
+        # "ST" / "State"
+        if len(parts) == 1:
+            state = self._resolve_state(parts[0])
+            if state:
+                return {'state': state, 'city': ''}
+
+            # "City ST" without the comma
+            head, _, tail = parts[0].rpartition(' ')
+            state = self._resolve_state(tail) if len(tail) == 2 and tail.isupper() else None
+            if head and state:
+                return {'state': state, 'city': self._clean_city(head)}
+
+            # Bare city from the index
+            city = self._clean_city(parts[0])
+            with self._lock:
+                state = self._city_states.get(city)
+            if state:
+                return {'state': state, 'city': city}
+            return None
+
+        # "City, ST" / "County, ST" / "Neighborhood, City, ST" / "City, ST, USA"
+        if parts[-1].lower() in ('usa', 'us', 'united states', 'canada'):
+            parts = parts[:-1]
+        if len(parts) < 2:
+            return self.parse(parts[0]) if parts else None
+
+        state = self._resolve_state(parts[-1])
+        if not state:
+            return None
+
+        city = self._clean_city(parts[-2])
+        self.learn(city, state)
+        return {'state': state, 'city': city}
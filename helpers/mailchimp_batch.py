@@ -0,0 +1,140 @@
+"""
+Mailchimp batch operations (/batches)
+Submits many API operations as one request, polls the batch until Mailchimp has run it and reads
+the per-operation results back from the gzipped result archive, keyed by operation_id
+"""
+
+import io
+import json
+import logging
+import tarfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Operations per submitted batch; larger sets are split and run side by side
+BATCH_MAX_OPERATIONS = 500
+
+BATCH_FINISHED_STATUS = "finished"
+
+
+class BatchError(Exception):
+    """A batch could not be submitted, did not finish in time or its results could not be read"""
+
+
+class MailchimpBatchRunner:
+    """Runs lists of /batches operations and returns {operation_id: (status_code, response)}"""
+
+    def __init__(self, client, api_call: Callable, poll_interval: float = 2.0, max_poll_interval: float = 15.0,
+                 timeout: float = 1800.0):
+        """
+        Initialize the batch runner
+
+        Args:
+            client: Configured mailchimp_marketing Client
+            api_call: Throttled call wrapper, api_call(description, fn, *args, idempotent=..., **kwargs)
+            poll_interval: First delay between status checks
+            max_poll_interval: Cap on the (growing) delay between status checks
+            timeout: Seconds to wait for one batch to finish
+        """
+        self.client = client
+        self.api_call = api_call
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="mailchimp-batch")
+
+    def submit(self, operations: List[Dict], idempotent: bool = False) -> str:
+        """
+        Start a batch; returns its id
+
+        A 429 is always retried. With idempotent (operations that are safe to run twice, e.g. PUT content,
+        or a campaign send that Mailchimp refuses to repeat) 5xx/network errors are retried as well
+        """
+        response = self.api_call("batches.start", self.client.batches.start, {"operations": operations},
+                                 idempotent=idempotent)
+        batch_id = response.get('id')
+        if not batch_id:
+            raise BatchError(f"Batch was not accepted: {response}")
+        logger.info(f"📦 Submitted batch {batch_id} with {len(operations)} operations")
+        return batch_id
+
+    def wait(self, batch_id: str) -> Dict:
+        """Poll until the batch is finished; returns its final status"""
+        started = time.monotonic()
+        delay = self.poll_interval
+        while True:
+            status = self.api_call("batches.status", self.client.batches.status, batch_id, idempotent=True)
+            if status.get('status') == BATCH_FINISHED_STATUS:
+                logger.info(f"📦 Batch {batch_id} finished: {status.get('finished_operations')} operations, "
+                            f"{status.get('errored_operations')} errored")
+                return status
+            if time.monotonic() - started + delay > self.timeout:
+                raise BatchError(f"Batch {batch_id} still {status.get('status')} after {self.timeout:g}s")
+            time.sleep(delay)
+            delay = min(self.max_poll_interval, delay * 1.5)
+
+    def _download_results(self, url: str) -> List[Dict]:
+        response = requests.get(url, timeout=120)
+        response.raise_for_status()
+        results = []
+        with tarfile.open(fileobj=io.BytesIO(response.content), mode="r:gz") as archive:
+            for member in archive.getmembers():
+                if member.isfile() and member.name.endswith(".json"):
+                    results.extend(json.load(archive.extractfile(member)))
+        return results
+
+    def _run_one(self, operations: List[Dict], idempotent: bool = False) -> Dict[str, Tuple[int, Dict]]:
+        status = self.wait(self.submit(operations, idempotent=idempotent))
+        url = status.get('response_body_url')
+        if not url:
+            raise BatchError(f"Batch {status.get('id')} has no results")
+
+        results = {}
+        for result in self._download_results(url):
+            try:
+                body = json.loads(result.get('response') or '{}')
+            except ValueError:
+                body = {}
+            results[result.get('operation_id')] = (int(result.get('status_code', 0)), body)
+        return results
+
+    def run(self, operations: List[Dict], idempotent: bool = False) -> Dict[str, Tuple[int, Dict]]:
+        """Run operations (split into batches of BATCH_MAX_OPERATIONS) and wait for all of them"""
+        return self.run_async(operations, idempotent=idempotent).result()
+
+    def run_async(self, operations: List[Dict], idempotent: bool = False) -> Future:
+        """Submit now, poll in the background; the future resolves to {operation_id: (status, response)}"""
+        chunks = [operations[start:start + BATCH_MAX_OPERATIONS]
+                  for start in range(0, len(operations), BATCH_MAX_OPERATIONS)]
+        futures = [self._executor.submit(self._run_one, chunk, idempotent) for chunk in chunks]
+
+        combined: Future = Future()
+        lock = threading.Lock()
+
+        def collect(_):
+            with lock:
+                if combined.done() or not all(future.done() for future in futures):
+                    return
+                errors = [future.exception() for future in futures if future.exception() is not None]
+                if errors:
+                    combined.set_exception(errors[0])
+                    return
+                results = {}
+                for future in futures:
+                    results.update(future.result())
+                combined.set_result(results)
+
+        if not futures:
+            combined.set_result({})
+        for future in futures:
+            future.add_done_callback(collect)
+        return combined
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,89 @@
+"""
+Structured trace for subscriber matching
+Summary counters (pairs, matches, rejections by reason) are always kept; the per-pair trace is
+opt-in for specific emails or a sampled share of subscribers, so matching does no formatting when off
+"""
+
+import hashlib
+import logging
+import os
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MatchTrace:
+    """Counters for one matching run plus an optional per-subscriber trace"""
+
+    REASONS = ('price', 'industry', 'state', 'city')
+
+    def __init__(self, trace_emails: Optional[Iterable[str]] = None, sample_rate: float = 0.0,
+                 max_trace_lines: int = 500):
+        """
+        Initialize the match trace
+
+        Args:
+            trace_emails: Subscribers whose every listing decision is logged
+            sample_rate: Share of all subscribers (0-1) traced as well, chosen by a stable email hash
+            max_trace_lines: Cap on trace lines per run
+        """
+        self.trace_emails = {email.strip().lower() for email in trace_emails or [] if email.strip()}
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.max_trace_lines = max_trace_lines
+        self.counters: Counter = Counter()
+        self._trace_lines = 0
+
+    @classmethod
+    def from_env(cls) -> "MatchTrace":
+        """MATCH_TRACE_EMAILS (comma-separated) and MATCH_TRACE_SAMPLE_RATE (0-1)"""
+        emails = os.getenv('MATCH_TRACE_EMAILS', '').split(',')
+        try:
+            sample_rate = float(os.getenv('MATCH_TRACE_SAMPLE_RATE', 0) or 0)
+        except ValueError:
+            sample_rate = 0.0
+        return cls(emails, sample_rate)
+
+    @property
+    def tracing(self) -> bool:
+        return bool(self.trace_emails) or self.sample_rate > 0
+
+    def wants(self, email: str) -> bool:
+        """Whether this subscriber's decisions should be traced"""
+        if not email:
+            return False
+        email = email.lower()
+        if email in self.trace_emails:
+            return True
+        if self.sample_rate <= 0:
+            return False
+        bucket = int(hashlib.md5(email.encode('utf-8')).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return bucket < self.sample_rate
+
+    def count_pairs(self, pairs: int, matched: int) -> None:
+        self.counters['pairs'] += pairs
+        self.counters['matched'] += matched
+
+    def count_rejections(self, **reasons: int) -> None:
+        """Add subscriber-listing pairs excluded per criterion (a pair can fail several criteria)"""
+        for reason, count in reasons.items():
+            self.counters[f'rejected_{reason}'] += count
+
+    def record(self, email: str, listing: Dict, reasons: List[str]) -> None:
+        """Trace one decision for a traced subscriber"""
+        if self._trace_lines >= self.max_trace_lines:
+            return
+        self._trace_lines += 1
+        verdict = "match" if not reasons else f"rejected ({', '.join(reasons)})"
+        logger.info(f"🔎 {email} x {listing.get('url') or listing.get('title', '')}: {verdict} "
+                    f"[price={listing.get('asking_price')}, state={listing.get('state')}, "
+                    f"city={listing.get('city')}, category={listing.get('category')}]")
+
+    def summary(self) -> Dict[str, int]:
+        return dict(self.counters)
+
+    def log_summary(self) -> None:
+        pairs = self.counters['pairs']
+        rejected = ', '.join(f"{reason}={self.counters[f'rejected_{reason}']}" for reason in self.REASONS)
+        logger.info(f"📊 Matching: {self.counters['matched']}/{pairs} subscriber-listing pairs matched; "
+                    f"excluded by {rejected}")
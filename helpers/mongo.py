@@ -0,0 +1,196 @@
+"""
+Shared MongoDB connection factory
+One pooled, lazily connected MongoClient per process for the scrapers, notifier and entry points
+"""
+
+import importlib.util
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.collection import Collection
+from pymongo.database import Database
+from pymongo.errors import OperationFailure, PyMongoError
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MONGO_DB_NAME = "business-broker-las-vegas-db"
+LISTINGS_COLLECTION = "bizbuysell-data"
+SUBSCRIBERS_COLLECTION = "users"
+
+# Keys of the listings collection: (name, keys, unique, partial filter)
+LISTING_INDEXES = [
+    # Upsert key for string and numeric ids; listings without an id leave the field unset and are
+    # keyed by url instead
+    ('listing_id_unique', [('listing_id', ASCENDING)], True, {'listing_id': {'$exists': True}}),
+    # Dedupe lookups ({'url': {'$in': [...]}}) and the url upsert fallback
+    ('url_unique', [('url', ASCENDING)], True, None),
+    # 24h notification window and "latest" stats
+    ('scraped_date_desc', [('scraped_date', DESCENDING)], False, None),
+]
+
+DUPLICATE_KEY_ERROR_CODES = (11000, 11001)
+
+# IndexOptionsConflict / IndexKeySpecsConflict: an index of that name exists with other options
+INDEX_CONFLICT_ERROR_CODES = (85, 86)
+
+_client: Optional[MongoClient] = None
+_client_lock = threading.Lock()
+
+
+def _available_compressors() -> List[str]:
+    """Wire compressors in order of preference, skipping the ones whose package is not installed"""
+    try:
+        # Same checks pymongo runs itself (the zstd backend module differs between versions)
+        from pymongo.compression_support import _have_snappy, _have_zstd
+    except ImportError:
+        def _have_zstd():
+            return importlib.util.find_spec('zstandard') is not None
+
+        def _have_snappy():
+            return importlib.util.find_spec('snappy') is not None
+
+    compressors = []
+    if _have_zstd():
+        compressors.append('zstd')
+    if _have_snappy():
+        compressors.append('snappy')
+    compressors.append('zlib')
+    return compressors
+
+
+def get_mongo_client() -> MongoClient:
+    """Return the process-wide MongoClient, creating it on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            mongo_uri = os.getenv('MONGO_DB_URI')
+            if not mongo_uri:
+                raise RuntimeError("MONGO_DB_URI is not set.")
+
+            compressors = _available_compressors()
+            _client = MongoClient(
+                mongo_uri,
+                appname="bizbuysell-scraper",
+                # Threads of the scraper, enricher and notifier share these sockets
+                maxPoolSize=int(os.getenv('MONGO_MAX_POOL_SIZE', 20)),
+                minPoolSize=0,
+                maxIdleTimeMS=5 * 60 * 1000,
+                connectTimeoutMS=10000,
+                serverSelectionTimeoutMS=15000,
+                socketTimeoutMS=60000,
+                retryWrites=True,
+                # scraped_date is stored as a BSON datetime; hand it back as aware UTC
+                tz_aware=True,
+                tzinfo=timezone.utc,
+                compressors=compressors,
+                # Do not pay the SRV lookup + TLS handshake until the first operation
+                connect=False,
+            )
+            logger.info(f"Created shared MongoClient (compressors: {', '.join(compressors)})")
+        return _client
+
+
+def get_database(db_name: str = MONGO_DB_NAME) -> Database:
+    return get_mongo_client()[db_name]
+
+
+def get_collection(collection_name: str, db_name: str = MONGO_DB_NAME) -> Collection:
+    return get_database(db_name)[collection_name]
+
+
+def close_mongo_client() -> None:
+    """Close the shared client (e.g. at process exit)"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def _create_index(col: Collection, name: str, keys: List, unique: bool, partial_filter: Optional[Dict]) -> None:
+    options = {'name': name}
+    if partial_filter:
+        options['partialFilterExpression'] = partial_filter
+    try:
+        try:
+            col.create_index(keys, unique=unique, **options)
+        except OperationFailure as e:
+            if e.code not in INDEX_CONFLICT_ERROR_CODES:
+                raise
+            # Built by an older release (e.g. a different partial filter); rebuild it with the current spec
+            logger.warning(f"⚠️ Index {name} on {col.name} has outdated options, rebuilding it")
+            col.drop_index(name)
+            col.create_index(keys, unique=unique, **options)
+    except OperationFailure as e:
+        if not unique or e.code not in DUPLICATE_KEY_ERROR_CODES:
+            raise
+        # Existing duplicates block the unique build; a plain index still keeps lookups off COLLSCAN
+        logger.warning(f"⚠️ Duplicate values for {keys[0][0]} in {col.name}, creating a non-unique index instead: {e}")
+        options['name'] = f"{keys[0][0]}_nonunique"
+        col.create_index(keys, **options)
+
+
+def _plan_stages(plan: Dict) -> List[str]:
+    """Every stage name of an explain() plan tree"""
+    stages = [plan.get('stage', '')]
+    for child_key in ('inputStage', 'queryPlan'):
+        if isinstance(plan.get(child_key), dict):
+            stages.extend(_plan_stages(plan[child_key]))
+    for child in plan.get('inputStages', []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+def check_query_plans(col: Collection) -> Dict[str, List[str]]:
+    """Explain the hot listing queries and warn about any that would scan the whole collection"""
+    hot_queries = {
+        'url dedupe': {'url': {'$in': ['https://www.bizbuysell.com/__plan_check__/']}},
+        # Ids are stored as strings or numbers; both must hit the partial index
+        'listing_id upsert': {'listing_id': '__plan_check__'},
+        'numeric listing_id upsert': {'listing_id': -1},
+        'scraped_date window': {'scraped_date': {'$gte': datetime(1970, 1, 1, tzinfo=timezone.utc)}},
+    }
+
+    plans = {}
+    for label, query in hot_queries.items():
+        try:
+            winning_plan = col.find(query).explain().get('queryPlanner', {}).get('winningPlan', {})
+        except PyMongoError as e:
+            logger.warning(f"Could not explain {label} query: {e}")
+            continue
+        stages = _plan_stages(winning_plan)
+        plans[label] = stages
+        if 'COLLSCAN' in stages:
+            logger.warning(f"⚠️ {label} query on {col.name} runs a collection scan: {' -> '.join(stages)}")
+        else:
+            logger.info(f"✅ {label} query uses an index: {' -> '.join(stages)}")
+    return plans
+
+
+def ensure_indexes(col: Optional[Collection] = None) -> Dict[str, List[str]]:
+    """Create the listings indexes (idempotent) and verify the hot queries use them"""
+    if col is None:
+        col = get_collection(LISTINGS_COLLECTION)
+
+    try:
+        # Older saves stored a missing id as ''; unset it so those listings stay out of the unique index
+        cleared = col.update_many({'listing_id': {'$in': ['', None]}}, {'$unset': {'listing_id': ''}})
+        if cleared.modified_count:
+            logger.info(f"Cleared empty listing_id on {cleared.modified_count} listings in {col.name}")
+    except PyMongoError as e:
+        logger.warning(f"Could not clear empty listing ids on {col.name}: {e}")
+
+    for name, keys, unique, partial_filter in LISTING_INDEXES:
+        try:
+            _create_index(col, name, keys, unique, partial_filter)
+        except PyMongoError as e:
+            logger.warning(f"Could not create index {name} on {col.name}: {e}")
+
+    return check_query_plans(col)
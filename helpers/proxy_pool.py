@@ -0,0 +1,245 @@
+"""
+Shared Webshare proxy pool
+Fetches the proxy list once, caches it on disk and scores proxies by latency and success/ban rate
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+import requests
+from dotenv import load_dotenv
+
+from helpers.retry import CircuitBreaker
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WEBSHARE_PROXY_LIST_URL = "https://proxy.webshare.io/api/v2/proxy/list/?mode=direct&page=1&valid=true&page_size={page_size}"
+
+
+class Proxy:
+    """A single proxy endpoint plus its health statistics"""
+
+    def __init__(self, username: str, password: str, host: str, port, breaker: CircuitBreaker = None):
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+
+        self.successes = 0
+        self.failures = 0
+        self.bans = 0
+        self.latency_ewma = None
+        self.last_failure_at = 0.0
+        self.breaker = breaker or CircuitBreaker()
+
+    @property
+    def key(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    @property
+    def url(self) -> str:
+        """Proxy URL for requests sessions"""
+        return f"http://{self.username}:{self.password}@{self.host}:{self.port}"
+
+    @property
+    def auth_address(self) -> str:
+        """user:pwd@host:port form used by seleniumbase"""
+        return f"{self.username}:{self.password}@{self.host}:{self.port}"
+
+    def score(self) -> float:
+        """Higher is better: smoothed success rate (bans weigh triple) divided by latency"""
+        success_rate = (self.successes + 1) / (self.successes + self.failures + 3 * self.bans + 2)
+        latency = self.latency_ewma if self.latency_ewma is not None else 1.0
+        return success_rate / (1.0 + latency)
+
+    def to_dict(self) -> Dict:
+        return {
+            'username': self.username,
+            'password': self.password,
+            'proxy_address': self.host,
+            'port': self.port,
+        }
+
+    def __repr__(self) -> str:
+        return f"Proxy({self.key}, score={self.score():.3f})"
+
+
+class ProxyPool:
+    """Thread-safe pool of Webshare proxies shared by the URL and detail scrapers"""
+
+    def __init__(self,
+                 token: str = None,
+                 cache_file: str = ".proxy_cache.json",
+                 ttl_seconds: int = 6 * 3600,
+                 page_size: int = 25,
+                 max_consecutive_failures: int = 3,
+                 dead_cooldown_seconds: int = 15 * 60,
+                 top_k: int = 5):
+        """
+        Initialize the proxy pool
+
+        Args:
+            token: Webshare API token (defaults to WEBSHARE_TOKEN)
+            cache_file: Where the fetched proxy list is cached
+            ttl_seconds: How long the cached proxy list stays valid
+            page_size: Number of proxies requested from Webshare
+            max_consecutive_failures: Failures in a row that open a proxy's circuit breaker
+            dead_cooldown_seconds: How long an open breaker skips the proxy before a trial request
+            top_k: Leases are spread randomly over the k best scoring proxies
+        """
+        self.token = token or os.getenv('WEBSHARE_TOKEN')
+        self.cache_file = cache_file
+        self.ttl_seconds = ttl_seconds
+        self.page_size = page_size
+        self.max_consecutive_failures = max_consecutive_failures
+        self.dead_cooldown_seconds = dead_cooldown_seconds
+        self.top_k = top_k
+
+        self._lock = threading.Lock()
+        self._proxies: Dict[str, Proxy] = {}
+        self._loaded_at = 0.0
+
+    # -----------------------------
+    # Proxy list loading
+    # -----------------------------
+    def _read_cache(self) -> Optional[List[Dict]]:
+        """Return the cached proxy list if it exists and is still fresh"""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if time.time() - cached.get('fetched_at', 0) > self.ttl_seconds:
+                return None
+            return cached.get('results') or None
+        except Exception as e:
+            logger.warning(f"Error reading proxy cache: {str(e)}")
+            return None
+
+    def _write_cache(self, results: List[Dict]) -> None:
+        if not self.cache_file:
+            return
+        try:
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump({'fetched_at': time.time(), 'results': results}, f)
+        except Exception as e:
+            logger.warning(f"Error writing proxy cache: {str(e)}")
+
+    def _fetch_from_webshare(self) -> List[Dict]:
+        response = requests.get(
+            WEBSHARE_PROXY_LIST_URL.format(page_size=self.page_size),
+            headers={"Authorization": f"Token {self.token}"},
+            timeout=15
+        )
+        response.raise_for_status()
+        return response.json().get('results', [])
+
+    def _ensure_loaded(self, force: bool = False) -> None:
+        """Load the proxy list from disk or Webshare (caller holds the lock)"""
+        # An empty pool (e.g. Webshare unreachable) is retried after a minute instead of on every lease
+        max_age = self.ttl_seconds if self._proxies else 60
+        if self._loaded_at and not force and time.time() - self._loaded_at < max_age:
+            return
+
+        results = None if force else self._read_cache()
+        if results is None:
+            try:
+                results = self._fetch_from_webshare()
+                self._write_cache(results)
+                logger.info(f"Fetched {len(results)} proxies from Webshare")
+            except Exception as e:
+                logger.error(f"Error fetching proxy list from Webshare: {str(e)}")
+                results = []
+
+        # Keep health statistics for proxies that survive a refresh
+        proxies = {}
+        for item in results:
+            try:
+                proxy = Proxy(item['username'], item['password'], item['proxy_address'], item['port'],
+                              breaker=CircuitBreaker(self.max_consecutive_failures, self.dead_cooldown_seconds))
+            except KeyError:
+                continue
+            proxies[proxy.key] = self._proxies.get(proxy.key, proxy)
+
+        if proxies or force:
+            self._proxies = proxies
+        self._loaded_at = time.time()
+
+    def refresh(self) -> None:
+        """Force a new proxy list fetch from Webshare"""
+        with self._lock:
+            self._ensure_loaded(force=True)
+
+    # -----------------------------
+    # Leasing and health reporting
+    # -----------------------------
+    def lease(self, exclude: Optional[set] = None) -> Optional[Proxy]:
+        """Lease a healthy proxy; returns None when the pool is empty"""
+        with self._lock:
+            self._ensure_loaded()
+
+            candidates = [p for p in self._proxies.values()
+                          if p.breaker.allow() and not (exclude and p.key in exclude)]
+            if not candidates:
+                # Every proxy looks dead: fall back to the least recently failed one
+                candidates = sorted(self._proxies.values(), key=lambda p: p.last_failure_at)[:1]
+            if not candidates:
+                return None
+
+            candidates.sort(key=lambda p: p.score(), reverse=True)
+            return random.choice(candidates[:self.top_k])
+
+    def report_success(self, proxy: Optional[Proxy], latency: float = None) -> None:
+        if proxy is None:
+            return
+        with self._lock:
+            proxy.successes += 1
+            proxy.breaker.record_success()
+            if latency is not None:
+                proxy.latency_ewma = latency if proxy.latency_ewma is None \
+                    else 0.7 * proxy.latency_ewma + 0.3 * latency
+
+    def report_failure(self, proxy: Optional[Proxy], banned: bool = False) -> None:
+        if proxy is None:
+            return
+        with self._lock:
+            proxy.failures += 1
+            proxy.last_failure_at = time.time()
+            if banned:
+                proxy.bans += 1
+        # A ban means the exit IP is burned for this site; open its breaker right away
+        proxy.breaker.record_failure(trip=banned)
+
+    def get_stats(self) -> List[Dict]:
+        """Health snapshot of every proxy, best first"""
+        with self._lock:
+            proxies = sorted(self._proxies.values(), key=lambda p: p.score(), reverse=True)
+            return [{
+                'proxy': p.key,
+                'score': round(p.score(), 4),
+                'successes': p.successes,
+                'failures': p.failures,
+                'bans': p.bans,
+                'breaker': p.breaker.state,
+                'latency': round(p.latency_ewma, 3) if p.latency_ewma is not None else None,
+            } for p in proxies]
+
+
+_shared_pool: Optional[ProxyPool] = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_proxy_pool() -> ProxyPool:
+    """Return the process-wide proxy pool"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ProxyPool()
+        return _shared_pool
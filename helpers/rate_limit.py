@@ -0,0 +1,80 @@
+"""
+Client-side rate limiting for third-party APIs
+Token bucket for the request rate plus a connection cap, shared by every thread of the process
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Initialize the token bucket
+
+        Args:
+            rate: Tokens added per second (sustained requests per second)
+            capacity: Maximum burst size (defaults to one second worth of tokens)
+        """
+        self.rate = max(rate, 0.001)
+        self.capacity = max(1.0, capacity if capacity is not None else rate)
+
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until `tokens` are available; returns the time spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait = max(self._paused_until - now, (tokens - self._tokens) / self.rate)
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for a while (e.g. after a 429), for every caller"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class ApiThrottle:
+    """At most `max_connections` requests in flight and `rate` requests per second"""
+
+    def __init__(self, max_connections: int = 10, rate: float = 10.0, burst: float = None):
+        """
+        Initialize the API throttle
+
+        Args:
+            max_connections: Simultaneous requests allowed
+            rate: Sustained requests per second
+            burst: Requests that may start back to back before `rate` applies
+        """
+        self.max_connections = max(1, max_connections)
+        self.bucket = TokenBucket(rate, burst)
+        self._connections = threading.BoundedSemaphore(self.max_connections)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold one connection slot and one token for the duration of a request"""
+        with self._connections:
+            self.bucket.acquire()
+            yield
+
+    def back_off(self, seconds: float) -> None:
+        self.bucket.pause(seconds)
@@ -0,0 +1,110 @@
+"""
+Retry policy and circuit breaker shared by the scrapers
+Capped exponential backoff with jitter, bounded by an attempt count and a total deadline
+"""
+
+import random
+import threading
+import time
+from typing import Iterator
+
+
+class RetryPolicy:
+    """Capped exponential backoff with jitter and a total deadline per operation"""
+
+    def __init__(self,
+                 max_attempts: int = 5,
+                 base_delay: float = 1.0,
+                 max_delay: float = 30.0,
+                 multiplier: float = 2.0,
+                 jitter: float = 0.5,
+                 deadline: float = 120.0):
+        """
+        Initialize the retry policy
+
+        Args:
+            max_attempts: Maximum number of attempts (including the first one)
+            base_delay: Delay in seconds before the second attempt
+            max_delay: Upper bound for a single delay
+            multiplier: Growth factor of the delay between attempts
+            jitter: Fraction of each delay that is randomized (0 = none, 1 = full jitter)
+            deadline: Total time budget in seconds for all attempts
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+
+    def backoff(self, retry_number: int) -> float:
+        """Delay before retry number `retry_number` (1 = first retry)"""
+        delay = min(self.max_delay, self.base_delay * (self.multiplier ** (retry_number - 1)))
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+    def attempts(self) -> Iterator[int]:
+        """
+        Yield attempt numbers, sleeping between them
+
+        Stops after max_attempts, or earlier when the next sleep would overrun the deadline.
+        Callers break/return on success:
+
+            for attempt in policy.attempts():
+                ...
+        """
+        started = time.monotonic()
+        for attempt in range(1, self.max_attempts + 1):
+            if attempt > 1:
+                delay = self.backoff(attempt - 1)
+                if time.monotonic() - started + delay >= self.deadline:
+                    return
+                time.sleep(delay)
+            yield attempt
+
+
+class CircuitBreaker:
+    """Per-resource circuit breaker: opens after repeated failures, half-opens after a cool-down"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 300.0):
+        """
+        Initialize the circuit breaker
+
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a trial request is allowed
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """Whether a request may go through (closed, or half-open trial)"""
+        return self.state != self.OPEN
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self, trip: bool = False) -> None:
+        """Record a failure; `trip` opens the circuit immediately (e.g. on a ban)"""
+        with self._lock:
+            was_half_open = self.state == self.HALF_OPEN
+            self._failures += 1
+            if trip or was_half_open or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
@@ -0,0 +1,307 @@
+"""
+Reusable Mailchimp static segments for alert groups
+Segments are named after the group's listings hash and recycled across runs: membership changes go
+through the batch members endpoint, idle segments are re-pointed at new groups, and stale ones are
+deleted in a background pass so the list does not pile up segments
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from mailchimp_marketing.api_client import ApiClientError
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "alerts-group-"
+
+# Mailchimp caps members_to_add / members_to_remove at 500 emails per request
+BATCH_MEMBERS_LIMIT = 500
+
+
+class SegmentManager:
+    """Maps listings hashes to static segments on one list, reusing them across runs"""
+
+    def __init__(self, client, list_id: str, api_call: Callable, path: str = ".mailchimp_segments.json",
+                 stale_after_seconds: float = 7 * 24 * 3600, max_spare: int = 50,
+                 recycle_after_seconds: float = 3600):
+        """
+        Initialize the segment manager
+
+        Args:
+            client: Configured mailchimp_marketing Client
+            list_id: Audience the segments belong to
+            api_call: Throttled call wrapper, api_call(description, fn, *args, idempotent=..., **kwargs)
+            path: JSON file remembering each segment's hash, members and last use
+            stale_after_seconds: Idle time after which a segment is deleted
+            max_spare: Idle segments kept for recycling; the oldest beyond this are deleted
+            recycle_after_seconds: Idle time before a segment may be re-pointed (its campaign has gone out)
+        """
+        self.client = client
+        self.list_id = list_id
+        self.api_call = api_call
+        self.path = path
+        self.stale_after_seconds = stale_after_seconds
+        self.max_spare = max_spare
+        self.recycle_after_seconds = recycle_after_seconds
+
+        self._lock = threading.Lock()
+        self._state: Dict[str, Dict] = {}
+        self._segments: Dict[str, Dict] = {}
+        self._assignments: Dict[str, Optional[str]] = {}
+        self._used: set = set()
+        self._gc_thread: Optional[threading.Thread] = None
+        self._load_state()
+
+    # -----------------------------
+    # Local state
+    # -----------------------------
+    def _load_state(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._state = data.get(self.list_id, {})
+        except Exception as e:
+            logger.warning(f"Error reading segment state: {e}")
+
+    def save(self) -> None:
+        with self._lock:
+            data = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except Exception:
+                    data = {}
+            data[self.list_id] = self._state
+            try:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.warning(f"Error writing segment state: {e}")
+
+    # -----------------------------
+    # Planning
+    # -----------------------------
+    @staticmethod
+    def _parse_time(value: Optional[str]) -> float:
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except (TypeError, ValueError):
+            return 0.0
+
+    def _last_used(self, segment: Dict) -> float:
+        state = self._state.get(str(segment['id']))
+        if state and state.get('last_used'):
+            return state['last_used']
+        return self._parse_time(segment.get('updated_at') or segment.get('created_at'))
+
+    def load_segments(self) -> Dict[str, Dict]:
+        """Fetch this tool's static segments from Mailchimp, keyed by segment id"""
+        segments = {}
+        offset = 0
+        while True:
+            response = self.api_call(
+                "lists.list_segments", self.client.lists.list_segments, self.list_id,
+                type="static", count=1000, offset=offset, idempotent=True,
+                fields=["segments.id", "segments.name", "segments.created_at", "segments.updated_at",
+                        "total_items"])
+            page = response.get('segments', [])
+            for segment in page:
+                if segment.get('name', '').startswith(SEGMENT_PREFIX):
+                    segments[str(segment['id'])] = segment
+            offset += len(page)
+            if not page or offset >= response.get('total_items', 0):
+                break
+
+        # Forget segments deleted elsewhere
+        self._state = {segment_id: state for segment_id, state in self._state.items() if segment_id in segments}
+        return segments
+
+    def plan(self, listings_hashes: Iterable[str]) -> None:
+        """Decide up front which segment each group gets: same hash, a recycled idle one, or a new one"""
+        try:
+            self._segments = self.load_segments()
+        except ApiClientError as error:
+            logger.warning(f"Could not list segments, creating new ones: {error.text}")
+            self._segments = {}
+        by_hash = {}
+        for segment_id, segment in self._segments.items():
+            listings_hash = self._state.get(segment_id, {}).get('hash') or segment['name'][len(SEGMENT_PREFIX):]
+            by_hash.setdefault(listings_hash, segment_id)
+
+        self._assignments = {}
+        pending = []
+        for listings_hash in listings_hashes:
+            segment_id = by_hash.get(listings_hash)
+            self._assignments[listings_hash] = segment_id
+            if segment_id is None:
+                pending.append(listings_hash)
+
+        taken = set(self._assignments.values())
+        now = time.time()
+        idle = sorted((segment for segment_id, segment in self._segments.items()
+                       if segment_id not in taken and now - self._last_used(segment) >= self.recycle_after_seconds),
+                      key=self._last_used)
+        for listings_hash, segment in zip(pending, idle):
+            self._assignments[listings_hash] = str(segment['id'])
+
+        reused = len(self._assignments) - len(pending)
+        recycled = min(len(pending), len(idle))
+        logger.info(f"Segments: {reused} reused, {recycled} recycled, {len(pending) - recycled} to create "
+                    f"({len(self._segments)} on the list)")
+
+    # -----------------------------
+    # Membership
+    # -----------------------------
+    def _segment_members(self, segment_id: str) -> List[str]:
+        members = []
+        offset = 0
+        while True:
+            response = self.api_call(
+                "lists.get_segment_members_list", self.client.lists.get_segment_members_list,
+                self.list_id, segment_id, count=1000, offset=offset, idempotent=True,
+                fields=["members.email_address", "total_items"])
+            page = response.get('members', [])
+            members.extend(member['email_address'].lower() for member in page)
+            offset += len(page)
+            if not page or offset >= response.get('total_items', 0):
+                return members
+
+    @staticmethod
+    def _member_chunks(to_add: List[str], to_remove: List[str]) -> List[Dict]:
+        return [{"members_to_add": to_add[start:start + BATCH_MEMBERS_LIMIT],
+                 "members_to_remove": to_remove[start:start + BATCH_MEMBERS_LIMIT]}
+                for start in range(0, max(len(to_add), len(to_remove)), BATCH_MEMBERS_LIMIT)]
+
+    def _change_for_group(self, listings_hash: str, emails: List[str]) -> Tuple[str, Optional[str], List[Dict]]:
+        """("create" | "recycle" | "update", segment id, member chunks for "update")"""
+        segment_id = self._assignments.get(listings_hash)
+        if segment_id is None:
+            return "create", None, []
+        if self._segments[segment_id]['name'] != f"{SEGMENT_PREFIX}{listings_hash}":
+            return "recycle", segment_id, []
+        known = self._state.get(segment_id, {}).get('members')
+        current = set(known) if known is not None else set(self._segment_members(segment_id))
+        return "update", segment_id, self._member_chunks(sorted(set(emails) - current),
+                                                         sorted(current - set(emails)))
+
+    def record_segment(self, listings_hash: str, segment_id, emails: List[str]) -> int:
+        """Remember that `segment_id` now holds exactly `emails`; returns the numeric id campaigns expect"""
+        segment_id = str(segment_id)
+        with self._lock:
+            self._state[segment_id] = {'hash': listings_hash, 'members': emails, 'last_used': time.time()}
+            self._used.add(segment_id)
+            # A later segment_for_group for this hash (e.g. a fallback after a failed batch) is then a no-op
+            self._assignments[listings_hash] = segment_id
+            self._segments.setdefault(segment_id, {'id': segment_id})['name'] = f"{SEGMENT_PREFIX}{listings_hash}"
+        return int(segment_id)
+
+    def forget_segment(self, segment_id) -> None:
+        """Membership is unknown after a failed update; re-read it next time"""
+        with self._lock:
+            self._state.pop(str(segment_id), None)
+
+    def segment_for_group(self, listings_hash: str, group_emails: List[str]) -> Optional[int]:
+        """Return a segment holding exactly `group_emails`, reusing one from an earlier run when possible"""
+        name = f"{SEGMENT_PREFIX}{listings_hash}"
+        emails = sorted({email.lower() for email in group_emails})
+        segment_id = self._assignments.get(listings_hash)
+
+        try:
+            action, segment_id, chunks = self._change_for_group(listings_hash, emails)
+            if action == "create":
+                response = self.api_call("lists.create_segment", self.client.lists.create_segment,
+                                         self.list_id, {"name": name, "static_segment": emails})
+                segment_id = str(response.get('id'))
+                logger.info(f"Created segment '{name}' with {len(emails)} subscribers")
+            elif action == "recycle":
+                # Rename and replace the membership in one call
+                self.api_call("lists.update_segment", self.client.lists.update_segment,
+                              self.list_id, segment_id, {"name": name, "static_segment": emails}, idempotent=True)
+                logger.info(f"Recycled segment {segment_id} as '{name}' with {len(emails)} subscribers")
+            else:
+                for body in chunks:
+                    response = self.api_call("lists.batch_segment_members", self.client.lists.batch_segment_members,
+                                             body, self.list_id, segment_id, idempotent=True)
+                    if response.get('error_count'):
+                        logger.warning(f"Segment {segment_id}: {response['error_count']} members could not be updated")
+                added = sum(len(body['members_to_add']) for body in chunks)
+                removed = sum(len(body['members_to_remove']) for body in chunks)
+                logger.info(f"Reused segment '{name}' (+{added} / -{removed} members)")
+        except ApiClientError as error:
+            logger.error(f"Error preparing segment for group {listings_hash}: {error.text}")
+            if segment_id is not None:
+                self.forget_segment(segment_id)
+            return None
+
+        return self.record_segment(listings_hash, segment_id, emails)
+
+    def segment_operations(self, listings_hash: str, group_emails: List[str]) -> Tuple[Optional[str], List[Dict]]:
+        """
+        The same change as segment_for_group, as /batches operations
+
+        Returns the segment id when it is already known (recycle / update) and the operations to run;
+        a "create" operation's response carries the new id. Operation ids are "segment:<hash>" and
+        "members:<hash>:<n>".
+        """
+        name = f"{SEGMENT_PREFIX}{listings_hash}"
+        emails = sorted({email.lower() for email in group_emails})
+        action, segment_id, chunks = self._change_for_group(listings_hash, emails)
+        path = f"/lists/{self.list_id}/segments"
+        if action == "create":
+            return None, [{"method": "POST", "path": path, "operation_id": f"segment:{listings_hash}",
+                           "body": json.dumps({"name": name, "static_segment": emails})}]
+        if action == "recycle":
+            return segment_id, [{"method": "PATCH", "path": f"{path}/{segment_id}",
+                                 "operation_id": f"segment:{listings_hash}",
+                                 "body": json.dumps({"name": name, "static_segment": emails})}]
+        return segment_id, [{"method": "POST", "path": f"{path}/{segment_id}",
+                             "operation_id": f"members:{listings_hash}:{number}", "body": json.dumps(body)}
+                            for number, body in enumerate(chunks)]
+
+    # -----------------------------
+    # Garbage collection
+    # -----------------------------
+    def _stale_segments(self) -> List[str]:
+        now = time.time()
+        idle = sorted((segment for segment_id, segment in self._segments.items() if segment_id not in self._used),
+                      key=self._last_used, reverse=True)
+        stale = []
+        for position, segment in enumerate(idle):
+            if position >= self.max_spare or now - self._last_used(segment) > self.stale_after_seconds:
+                stale.append(str(segment['id']))
+        return stale
+
+    def _collect_garbage(self, segment_ids: List[str], max_deletions: int) -> None:
+        deleted = 0
+        for segment_id in segment_ids[:max_deletions]:
+            try:
+                self.api_call("lists.delete_segment", self.client.lists.delete_segment,
+                              self.list_id, segment_id, idempotent=True)
+                deleted += 1
+            except ApiClientError as error:
+                if getattr(error, 'status_code', None) != 404:
+                    logger.warning(f"Could not delete segment {segment_id}: {error.text}")
+            with self._lock:
+                self._state.pop(segment_id, None)
+        self.save()
+        logger.info(f"🧹 Deleted {deleted} stale segments ({max(0, len(segment_ids) - max_deletions)} left for later)")
+
+    def collect_garbage_async(self, max_deletions: int = 200) -> Optional[threading.Thread]:
+        """Delete stale segments in a background thread; bounded per run so a backlog drains over a few runs"""
+        stale = self._stale_segments()
+        if not stale:
+            return None
+        self._gc_thread = threading.Thread(target=self._collect_garbage, args=(stale, max_deletions),
+                                           name="segment-gc")
+        self._gc_thread.start()
+        return self._gc_thread
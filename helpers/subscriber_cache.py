@@ -0,0 +1,246 @@
+"""
+Compiled subscriber preference cache
+Keeps parsed SubscriberCriteria for the `users` collection in memory and on disk, and catches up
+incrementally from a MongoDB change stream (or an updated_at watermark) instead of re-reading everyone
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from bson import ObjectId, json_util
+from bson.json_util import JSONOptions
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure, PyMongoError
+
+from helpers.mongo import SUBSCRIBERS_COLLECTION, get_collection
+from helpers.subscriber_index import SubscriberCriteria
+
+logger = logging.getLogger(__name__)
+
+# Bump when SubscriberCriteria parsing changes; older cache files are rebuilt
+CACHE_FORMAT_VERSION = 1
+
+# The shared client is tz_aware, so the watermark read back from disk must be aware too
+CACHE_JSON_OPTIONS = JSONOptions(tz_aware=True, tzinfo=timezone.utc)
+
+# The resume token is gone from the oplog (or the stream cannot resume)
+CHANGE_STREAM_LOST_CODES = (136, 260, 280, 286)
+
+
+class SubscriberCache:
+    """Parsed subscriber criteria keyed by _id, synced from MongoDB incrementally"""
+
+    def __init__(self, collection: Collection = None, path: str = "subscriber_cache.json",
+                 watermark_field: str = "updated_at", full_reload_seconds: int = 7 * 24 * 3600):
+        """
+        Initialize the subscriber cache
+
+        Args:
+            collection: Subscribers collection (defaults to the shared `users` collection)
+            path: JSON file holding the compiled criteria, resume token and watermark
+            watermark_field: Timestamp field used when change streams are not available
+            full_reload_seconds: Age after which the cache is rebuilt from scratch anyway
+        """
+        self.collection = collection if collection is not None else get_collection(SUBSCRIBERS_COLLECTION)
+        self.path = path
+        self.watermark_field = watermark_field
+        self.full_reload_seconds = full_reload_seconds
+
+        self._lock = threading.Lock()
+        self._criteria: Dict[str, SubscriberCriteria] = {}
+        self._resume_token = None
+        self._watermark = None
+        self._loaded_at = 0.0
+        self._load_from_disk()
+
+    # -----------------------------
+    # Disk persistence
+    # -----------------------------
+    @staticmethod
+    def _to_record(criteria: SubscriberCriteria) -> Dict:
+        return {'email': criteria.email, 'min_price': criteria.min_price, 'max_price': criteria.max_price,
+                'industries': sorted(criteria.industries), 'states': sorted(criteria.states),
+                'cities': sorted(criteria.cities)}
+
+    @staticmethod
+    def _from_record(record: Dict) -> SubscriberCriteria:
+        return SubscriberCriteria(record['email'], record['min_price'], record['max_price'],
+                                  record['industries'], record['states'], record['cities'])
+
+    def _load_from_disk(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json_util.loads(f.read(), json_options=CACHE_JSON_OPTIONS)
+            if data.get('version') != CACHE_FORMAT_VERSION:
+                logger.info("Subscriber cache format changed, rebuilding")
+                return
+            self._criteria = {key: self._from_record(record) for key, record in data['subscribers'].items()}
+            self._resume_token = data.get('resume_token')
+            self._watermark = self._as_utc(data.get('watermark'))
+            self._loaded_at = data.get('loaded_at', 0.0)
+            logger.info(f"Loaded {len(self._criteria)} compiled subscribers from {self.path}")
+        except Exception as e:
+            logger.warning(f"Error reading subscriber cache, rebuilding: {e}")
+            self._criteria = {}
+
+    def _save_to_disk(self) -> None:
+        data = {
+            'version': CACHE_FORMAT_VERSION,
+            'loaded_at': self._loaded_at,
+            'resume_token': self._resume_token,
+            'watermark': self._as_utc(self._watermark),
+            'subscribers': {key: self._to_record(c) for key, c in self._criteria.items()},
+        }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json_util.dumps(data, json_options=CACHE_JSON_OPTIONS))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Error writing subscriber cache: {e}")
+
+    # -----------------------------
+    # Sync
+    # -----------------------------
+    @staticmethod
+    def _as_utc(stamp):
+        """Naive datetimes (older cache files, other clients) are taken as UTC"""
+        if isinstance(stamp, datetime) and stamp.tzinfo is None:
+            return stamp.replace(tzinfo=timezone.utc)
+        return stamp
+
+    def _apply_document(self, doc: Dict) -> bool:
+        """Compile one subscriber; a malformed document is skipped rather than failing the whole sync"""
+        try:
+            key = str(doc['_id'])
+            criteria = SubscriberCriteria.from_document(doc)
+            if criteria is None:
+                self._criteria.pop(key, None)
+            else:
+                self._criteria[key] = criteria
+
+            stamp = self._as_utc(doc.get(self.watermark_field))
+            if isinstance(stamp, datetime) and (self._watermark is None or stamp > self._watermark):
+                self._watermark = stamp
+            return True
+        except Exception as e:
+            logger.warning(f"Skipping subscriber {doc.get('_id')}: {e}")
+            return False
+
+    def _open_change_stream(self, resume_after=None):
+        return self.collection.watch(full_document='updateLookup', resume_after=resume_after)
+
+    def _full_reload(self) -> None:
+        """Read and compile every subscriber; the change stream is opened first so nothing is missed"""
+        self._resume_token = None
+        try:
+            with self._open_change_stream() as stream:
+                stream.try_next()
+                self._resume_token = stream.resume_token
+        except PyMongoError as e:
+            logger.info(f"Change streams unavailable, using the {self.watermark_field} watermark: {e}")
+
+        self._criteria = {}
+        self._watermark = None
+        for doc in self.collection.find({}):
+            self._apply_document(doc)
+        self._loaded_at = time.time()
+        logger.info(f"Compiled {len(self._criteria)} subscribers from MongoDB (full reload)")
+
+    def _sync_change_stream(self) -> int:
+        """Drain the changes since the stored resume token without blocking"""
+        changes = 0
+        with self._open_change_stream(resume_after=self._resume_token) as stream:
+            while True:
+                change = stream.try_next()
+                if change is None:
+                    break
+                changes += 1
+                operation = change.get('operationType')
+                if operation in ('insert', 'update', 'replace'):
+                    if change.get('fullDocument'):
+                        self._apply_document(change['fullDocument'])
+                    else:
+                        # Deleted again before the lookup ran
+                        self._criteria.pop(str(change['documentKey']['_id']), None)
+                elif operation == 'delete':
+                    self._criteria.pop(str(change['documentKey']['_id']), None)
+                elif operation in ('drop', 'rename', 'dropDatabase', 'invalidate'):
+                    raise OperationFailure(f"Change stream invalidated by {operation}", code=260)
+            self._resume_token = stream.resume_token
+        return changes
+
+    def _sync_watermark(self) -> int:
+        """Re-read documents changed after the watermark; deletions are found by comparing _ids"""
+        changes = 0
+        if self._watermark is not None:
+            for doc in self.collection.find({self.watermark_field: {'$gte': self._watermark}}):
+                self._apply_document(doc)
+                changes += 1
+        else:
+            # No timestamps to go by: re-read everyone, still cheaper than keeping raw documents
+            self._full_reload()
+            return len(self._criteria)
+
+        # _id-only scan is covered by the _id index
+        live_ids = {str(doc['_id']) for doc in self.collection.find({}, {'_id': 1})}
+        for key in set(self._criteria) - live_ids:
+            del self._criteria[key]
+            changes += 1
+        missing = live_ids - set(self._criteria)
+        if missing:
+            # Inserted without a watermark value
+            for doc in self.collection.find({'_id': {'$in': [self._object_id(key) for key in missing]}}):
+                self._apply_document(doc)
+                changes += 1
+        return changes
+
+    @staticmethod
+    def _object_id(key: str):
+        return ObjectId(key) if ObjectId.is_valid(key) else key
+
+    def refresh(self) -> List[SubscriberCriteria]:
+        """Bring the cache up to date and return the compiled criteria"""
+        with self._lock:
+            try:
+                stale = time.time() - self._loaded_at > self.full_reload_seconds
+                if not self._criteria or stale:
+                    self._full_reload()
+                elif self._resume_token is not None:
+                    try:
+                        changes = self._sync_change_stream()
+                        logger.info(f"Applied {changes} subscriber changes from the change stream")
+                    except OperationFailure as e:
+                        if e.code not in CHANGE_STREAM_LOST_CODES:
+                            raise
+                        logger.warning(f"Subscriber change stream cannot resume ({e}), reloading")
+                        self._full_reload()
+                else:
+                    changes = self._sync_watermark()
+                    logger.info(f"Applied {changes} subscriber changes since the {self.watermark_field} watermark")
+                self._save_to_disk()
+            except PyMongoError as e:
+                # Better to match against slightly stale preferences than to skip the send
+                if not self._criteria:
+                    raise
+                logger.warning(f"Error syncing subscribers, using the cached preferences: {e}")
+            return list(self._criteria.values())
+
+
+_shared_cache: Optional[SubscriberCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_subscriber_cache() -> SubscriberCache:
+    """Return the process-wide subscriber cache"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SubscriberCache()
+        return _shared_cache
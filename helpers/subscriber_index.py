@@ -0,0 +1,193 @@
+"""
+Inverted index over subscriber preferences
+Subscribers are bucketed by state, city and industry, with a sorted price structure, so each listing
+finds its candidate subscribers through set intersections instead of a scan over every subscriber
+"""
+
+import bisect
+from typing import Dict, Iterable, List, Optional, Set
+
+from helpers.match_trace import MatchTrace
+
+
+def normalize_price(value) -> Optional[float]:
+    """Normalize a price ("$1,250,000", 1250000, None) to a float"""
+    if value is None:
+        return None
+    try:
+        return float(str(value).replace(',', '').replace('$', '').strip())
+    except Exception:
+        return None
+
+
+def normalize_list_field(field_value) -> List[str]:
+    """Normalize a comma-separated string (or list) to a list of lower-cased values"""
+    if not field_value:
+        return []
+    if isinstance(field_value, (list, tuple, set)):
+        field_value = ','.join(str(item) for item in field_value)
+    return [item.strip().lower() for item in str(field_value).replace('\xa0', '').split(',')
+            if item and item.strip()]
+
+
+class SubscriberCriteria:
+    """A subscriber's preferences, parsed once: lower-cased sets and numeric price bounds"""
+
+    __slots__ = ('email', 'min_price', 'max_price', 'industries', 'states', 'cities')
+
+    def __init__(self, email: str, min_price: Optional[float], max_price: Optional[float],
+                 industries: Iterable[str] = (), states: Iterable[str] = (), cities: Iterable[str] = ()):
+        self.email = email
+        self.min_price = min_price
+        self.max_price = max_price
+        self.industries = frozenset(industries)
+        self.states = frozenset(states)
+        self.cities = frozenset(cities)
+
+    @classmethod
+    def from_document(cls, doc: Dict, state_field: str = 'state', city_field: str = 'city') -> Optional["SubscriberCriteria"]:
+        """Compile a subscriber document (MongoDB `users` or Mailchimp member); None without an email"""
+        email = doc.get('email')
+        if not email:
+            return None
+        return cls(email,
+                   normalize_price(doc.get('price_min')),
+                   normalize_price(doc.get('price_max')),
+                   normalize_list_field(doc.get('industries')),
+                   normalize_list_field(doc.get(state_field)),
+                   normalize_list_field(doc.get(city_field)))
+
+    def price_matches(self, price: Optional[float]) -> bool:
+        """min_price <= price <= max_price; a listing without a price only matches unbounded subscribers"""
+        if price is None:
+            return self.min_price is None and self.max_price is None
+        if self.min_price is not None and price < self.min_price:
+            return False
+        if self.max_price is not None and price > self.max_price:
+            return False
+        return True
+
+    def rejection_reasons(self, key: "ListingKey") -> List[str]:
+        """Every criterion the listing fails (empty list = match)"""
+        reasons = []
+        if not self.price_matches(key.price):
+            reasons.append('price')
+        if self.industries and not self.industries & key.industries:
+            reasons.append('industry')
+        if self.states and key.state not in self.states:
+            reasons.append('state')
+        if self.cities and key.city not in self.cities:
+            reasons.append('city')
+        return reasons
+
+
+class ListingKey:
+    """The fields of a listing the matchers look at, normalized the same way as subscriber criteria"""
+
+    __slots__ = ('price', 'industries', 'state', 'city')
+
+    def __init__(self, listing: Dict):
+        self.price = normalize_price(listing.get('asking_price'))
+        categories = listing.get('category') or []
+        if not isinstance(categories, list):
+            categories = [categories]
+        self.industries = frozenset(str(cat).lower().strip() for cat in categories if cat)
+        self.state = str(listing.get('state') or '').lower()
+        self.city = str(listing.get('city') or '').lower()
+
+
+class SubscriberIndex:
+    """Precompiled matching index; build once per run, then call match() per listing batch"""
+
+    def __init__(self, subscribers: Iterable[SubscriberCriteria]):
+        self.subscribers: List[SubscriberCriteria] = list(subscribers)
+        self._all: Set[int] = set(range(len(self.subscribers)))
+
+        # value -> subscriber ids, plus the ids that accept any value of that dimension
+        self._by_state: Dict[str, Set[int]] = {}
+        self._by_city: Dict[str, Set[int]] = {}
+        self._by_industry: Dict[str, Set[int]] = {}
+        self._any_state: Set[int] = set()
+        self._any_city: Set[int] = set()
+        self._any_industry: Set[int] = set()
+
+        for sid, criteria in enumerate(self.subscribers):
+            self._add(sid, criteria.states, self._by_state, self._any_state)
+            self._add(sid, criteria.cities, self._by_city, self._any_city)
+            self._add(sid, criteria.industries, self._by_industry, self._any_industry)
+
+        # Sorted lower bounds: bisect gives every subscriber whose min_price <= price in O(log n)
+        by_min = sorted(self._all, key=lambda sid: self._min_bound(self.subscribers[sid]))
+        self._min_ids = by_min
+        self._min_values = [self._min_bound(self.subscribers[sid]) for sid in by_min]
+        self._unbounded = {sid for sid, c in enumerate(self.subscribers) if c.min_price is None and c.max_price is None}
+        # Sorted upper bounds, only used to count price rejections for the match trace
+        self._max_values = sorted(c.max_price if c.max_price is not None else float('inf') for c in self.subscribers)
+
+    @staticmethod
+    def _add(sid: int, values: frozenset, buckets: Dict[str, Set[int]], wildcard: Set[int]) -> None:
+        if not values:
+            wildcard.add(sid)
+        for value in values:
+            buckets.setdefault(value, set()).add(sid)
+
+    @staticmethod
+    def _min_bound(criteria: SubscriberCriteria) -> float:
+        return criteria.min_price if criteria.min_price is not None else float('-inf')
+
+    def __len__(self) -> int:
+        return len(self.subscribers)
+
+    def _price_candidates(self, price: Optional[float]) -> Set[int]:
+        if price is None:
+            return set(self._unbounded)
+        prefix = self._min_ids[:bisect.bisect_right(self._min_values, price)]
+        return {sid for sid in prefix if self.subscribers[sid].max_price is None
+                or price <= self.subscribers[sid].max_price}
+
+    def _count_price_rejections(self, price: Optional[float]) -> int:
+        if price is None:
+            return len(self.subscribers) - len(self._unbounded)
+        above_min = len(self._min_values) - bisect.bisect_right(self._min_values, price)
+        below_max = bisect.bisect_left(self._max_values, price)
+        return above_min + below_max
+
+    def candidates(self, listing: Dict, trace: MatchTrace = None) -> Set[int]:
+        """Ids of the subscribers matching one listing"""
+        key = listing if isinstance(listing, ListingKey) else ListingKey(listing)
+
+        # Subscribers who either accept any value or listed this exact one
+        state_ids = self._any_state | self._by_state.get(key.state, set())
+        city_ids = self._any_city | self._by_city.get(key.city, set())
+        industry_ids = set(self._any_industry)
+        for industry in key.industries:
+            industry_ids |= self._by_industry.get(industry, set())
+
+        if trace is not None:
+            total = len(self.subscribers)
+            trace.count_rejections(price=self._count_price_rejections(key.price),
+                                   industry=total - len(industry_ids),
+                                   state=total - len(state_ids),
+                                   city=total - len(city_ids))
+
+        # Intersect smallest first
+        candidates = None
+        for ids in sorted((state_ids, city_ids, industry_ids), key=len):
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return set()
+
+        # Few candidates left: check their bounds directly rather than materializing the price slice
+        if len(candidates) < len(self._all) // 4:
+            return {sid for sid in candidates if self.subscribers[sid].price_matches(key.price)}
+        return candidates & self._price_candidates(key.price)
+
+    def match(self, listings: List[Dict], trace: MatchTrace = None) -> Dict[str, List[Dict]]:
+        """Build the email -> matched listings dict consumed by group_subscribers_by_matches"""
+        matched: Dict[int, List[Dict]] = {}
+        for listing in listings:
+            for sid in self.candidates(listing, trace):
+                matched.setdefault(sid, []).append(listing)
+        if trace is not None:
+            trace.count_pairs(len(self.subscribers) * len(listings), sum(len(m) for m in matched.values()))
+        return {self.subscribers[sid].email: matched[sid] for sid in sorted(matched)}
@@ -0,0 +1,71 @@
+"""
+Cache of rendered Mailchimp template HTML
+Keyed by template id and the template's date_edited, kept in memory and on disk so the HTML is
+fetched once per template version instead of once per campaign
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateHtmlCache:
+    """template id -> (version, html), persisted as JSON"""
+
+    def __init__(self, path: str = ".mailchimp_template_cache.json"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except Exception as e:
+                logger.warning(f"Error reading template cache: {e}")
+
+    def get(self, template_id, version: Optional[str]) -> Optional[str]:
+        """Cached HTML for this template version; any cached version when the current one is unknown"""
+        with self._lock:
+            entry = self._entries.get(str(template_id))
+            if not entry:
+                return None
+            if version is not None and entry.get('version') != version:
+                return None
+            html = entry.get('html', '')
+            # Guard against a truncated/hand-edited cache file
+            if hashlib.sha1(html.encode('utf-8')).hexdigest() != entry.get('sha1'):
+                return None
+            return html
+
+    def set(self, template_id, version: Optional[str], html: str) -> None:
+        with self._lock:
+            self._entries[str(template_id)] = {
+                'version': version,
+                'sha1': hashlib.sha1(html.encode('utf-8')).hexdigest(),
+                'html': html,
+            }
+            try:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._entries, f)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.warning(f"Error writing template cache: {e}")
+
+
+_shared_cache: Optional[TemplateHtmlCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_template_cache() -> TemplateHtmlCache:
+    """Return the process-wide template cache"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = TemplateHtmlCache()
+        return _shared_cache
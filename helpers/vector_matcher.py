@@ -0,0 +1,138 @@
+"""
+Columnar NumPy matcher for large sends
+Subscriber price bounds become arrays and states/cities/industries become bitsets over interned
+vocabularies; the whole subscriber x listing match matrix is computed with broadcast comparisons
+"""
+
+from typing import Dict, Iterable, List
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from helpers.match_trace import MatchTrace
+from helpers.subscriber_index import ListingKey, SubscriberCriteria
+
+
+class _Bitsets:
+    """One bitset row per subscriber over an interned vocabulary, plus a "matches anything" flag"""
+
+    def __init__(self, value_sets: List[frozenset]):
+        self.vocab: Dict[str, int] = {}
+        for values in value_sets:
+            for value in values:
+                self.vocab.setdefault(value, len(self.vocab))
+
+        self.words = max(1, (len(self.vocab) + 63) // 64)
+        self.bits = np.zeros((len(value_sets), self.words), dtype=np.uint64)
+        self.wildcard = np.array([not values for values in value_sets], dtype=bool)
+
+        rows, positions = [], []
+        for row, values in enumerate(value_sets):
+            for value in values:
+                rows.append(row)
+                positions.append(self.vocab[value])
+        if rows:
+            positions = np.array(positions, dtype=np.uint64)
+            np.bitwise_or.at(self.bits, (np.array(rows), (positions // 64).astype(np.intp)),
+                             np.left_shift(np.uint64(1), positions % np.uint64(64)))
+
+    def encode_one(self, values: List[str]):
+        """(word index, mask) per listing for single-valued fields; unknown values get mask 0"""
+        positions = np.array([self.vocab.get(value, -1) for value in values], dtype=np.int64)
+        known = positions >= 0
+        safe = np.where(known, positions, 0).astype(np.uint64)
+        masks = np.where(known, np.left_shift(np.uint64(1), safe % np.uint64(64)), np.uint64(0))
+        return (safe // np.uint64(64)).astype(np.intp), masks.astype(np.uint64)
+
+    def encode_many(self, value_sets: List[frozenset]):
+        """Full bitset rows for multi-valued listing fields"""
+        encoded = np.zeros((len(value_sets), self.words), dtype=np.uint64)
+        for row, values in enumerate(value_sets):
+            for value in values:
+                position = self.vocab.get(value)
+                if position is not None:
+                    encoded[row, position // 64] |= np.uint64(1) << np.uint64(position % 64)
+        return encoded
+
+
+class VectorMatcher:
+    """Drop-in alternative to SubscriberIndex.match() for big subscriber bases"""
+
+    def __init__(self, subscribers: Iterable[SubscriberCriteria], chunk_size: int = 4096):
+        """
+        Initialize the vectorized matcher
+
+        Args:
+            subscribers: Compiled subscriber criteria
+            chunk_size: Subscribers per broadcast block (bounds the temporary match matrix)
+        """
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy is not installed.")
+
+        self.subscribers: List[SubscriberCriteria] = list(subscribers)
+        self.chunk_size = max(1, chunk_size)
+
+        self.min_prices = np.array([c.min_price if c.min_price is not None else -np.inf
+                                    for c in self.subscribers], dtype=np.float64)
+        self.max_prices = np.array([c.max_price if c.max_price is not None else np.inf
+                                    for c in self.subscribers], dtype=np.float64)
+        self.unbounded = np.array([c.min_price is None and c.max_price is None for c in self.subscribers], dtype=bool)
+
+        self.states = _Bitsets([c.states for c in self.subscribers])
+        self.cities = _Bitsets([c.cities for c in self.subscribers])
+        self.industries = _Bitsets([c.industries for c in self.subscribers])
+
+    def __len__(self) -> int:
+        return len(self.subscribers)
+
+    def match_matrix(self, listings: List[Dict], trace: MatchTrace = None):
+        """Boolean (subscribers x listings) matrix, computed chunk by chunk"""
+        keys = [ListingKey(listing) for listing in listings]
+        matrix = np.zeros((len(self.subscribers), len(keys)), dtype=bool)
+        if not keys or not self.subscribers:
+            return matrix
+
+        prices = np.array([k.price if k.price is not None else np.nan for k in keys], dtype=np.float64)
+        priced = ~np.isnan(prices)
+        state_words, state_masks = self.states.encode_one([k.state for k in keys])
+        city_words, city_masks = self.cities.encode_one([k.city for k in keys])
+        industry_bits = self.industries.encode_many([k.industries for k in keys])
+
+        for start in range(0, len(self.subscribers), self.chunk_size):
+            rows = slice(start, start + self.chunk_size)
+
+            # NaN prices compare False, so unpriced listings only reach unbounded subscribers
+            price_ok = ((self.min_prices[rows, None] <= prices[None, :])
+                        & (prices[None, :] <= self.max_prices[rows, None]))
+            price_ok |= self.unbounded[rows, None] & ~priced[None, :]
+
+            # Single-valued listing fields: gather the listing's word and test its bit
+            state_ok = (self.states.bits[rows][:, state_words] & state_masks[None, :]) != 0
+            state_ok |= self.states.wildcard[rows, None]
+            city_ok = (self.cities.bits[rows][:, city_words] & city_masks[None, :]) != 0
+            city_ok |= self.cities.wildcard[rows, None]
+
+            # Multi-valued industries: broadcast AND over the bitset words
+            industry_ok = (self.industries.bits[rows][:, None, :] & industry_bits[None, :, :]).any(axis=2)
+            industry_ok |= self.industries.wildcard[rows, None]
+
+            matrix[rows] = price_ok & state_ok & city_ok & industry_ok
+            if trace is not None:
+                trace.count_rejections(price=int((~price_ok).sum()), industry=int((~industry_ok).sum()),
+                                       state=int((~state_ok).sum()), city=int((~city_ok).sum()))
+
+        return matrix
+
+    def match(self, listings: List[Dict], trace: MatchTrace = None) -> Dict[str, List[Dict]]:
+        """Build the email -> matched listings dict consumed by group_subscribers_by_matches"""
+        matrix = self.match_matrix(listings, trace)
+        if trace is not None:
+            trace.count_pairs(matrix.size, int(matrix.sum()))
+        matches = {}
+        for sid in np.flatnonzero(matrix.any(axis=1)):
+            matches[self.subscribers[sid].email] = [listings[i] for i in np.flatnonzero(matrix[sid])]
+        return matches
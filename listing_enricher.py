@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+BizBuySell Listing Enricher
+Fills in AI categories and city/state for scraped listings, batching the LLM calls that are still needed
+"""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+from helpers.category_cache import CategoryCache
+from helpers.gazetteer import Gazetteer
+
+
+class ListingEnricher:
+    """Enrichment stage: local cache/gazetteer first, then batched OpenAI requests for the rest"""
+
+    def __init__(self, openai_client, categories: List[str], category_cache: CategoryCache,
+                 gazetteer: Gazetteer, batch_size: int = 20, max_concurrent: int = 3, max_retries: int = 2):
+        """
+        Initialize the listing enricher
+
+        Args:
+            openai_client: OpenAI client used for the batched requests
+            categories: Predefined categories; LLM answers are validated against this list
+            category_cache: Persistent original-category -> categories cache
+            gazetteer: Offline location parser
+            batch_size: Listings sent in one OpenAI request
+            max_concurrent: Batches in flight at the same time
+            max_retries: Extra rounds for items the LLM failed to answer validly
+        """
+        self.logger = logging.getLogger(__name__)
+        self.openai_client = openai_client
+        self.categories = categories
+        self.category_cache = category_cache
+        self.gazetteer = gazetteer
+        self.batch_size = max(1, batch_size)
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_retries = max_retries
+
+    def resolve_locally(self, detail: Dict) -> bool:
+        """Fill category/city/state from the cache and gazetteer; True when nothing is left for the LLM"""
+        if detail.get('category') is None:
+            original_category = detail.get('original_category', '')
+            if not original_category:
+                # Nothing for the LLM to classify
+                detail['category'] = []
+            else:
+                cached = self.category_cache.get(original_category)
+                if cached is not None:
+                    detail['category'] = cached
+
+        if detail.get('state') is None:
+            location = detail.get('location', '')
+            parsed = self.gazetteer.parse(location) if location else None
+            if parsed:
+                detail['city'] = parsed.get('city', '')
+                detail['state'] = parsed.get('state', '')
+            elif not location:
+                detail['state'] = ''
+                detail['city'] = detail.get('city') or ''
+
+        return detail.get('category') is not None and detail.get('state') is not None
+
+    def enrich(self, details: List[Dict]) -> List[Dict]:
+        """Enrich details in place and return them"""
+        pending = {}
+        for detail in details:
+            if not self.resolve_locally(detail):
+                pending[str(len(pending))] = detail
+
+        if pending:
+            self.logger.info(f"🧠 Enriching {len(pending)}/{len(details)} listings with OpenAI "
+                             f"(batches of {self.batch_size})")
+
+        for round_number in range(self.max_retries + 1):
+            if not pending:
+                break
+            if round_number:
+                # Other batches may have cached the same original category meanwhile
+                pending = {i: d for i, d in pending.items() if not self.resolve_locally(d)}
+                if not pending:
+                    break
+                self.logger.info(f"Retrying enrichment for {len(pending)} failed listings (round {round_number})")
+            pending = self._run_round(pending)
+
+        # Same fallbacks as the single-listing path: keep the original category, leave location empty
+        for detail in pending.values():
+            self._apply_fallback(detail)
+
+        return details
+
+    def _run_round(self, pending: Dict[str, Dict]) -> Dict[str, Dict]:
+        """Send all pending items in concurrent batches; return the ones that still failed"""
+        item_ids = list(pending)
+        batches = [item_ids[i:i + self.batch_size] for i in range(0, len(item_ids), self.batch_size)]
+        failed = {}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrent, len(batches))) as executor:
+            future_to_batch = {executor.submit(self._enrich_batch, {i: pending[i] for i in batch}): batch
+                               for batch in batches}
+            for future in as_completed(future_to_batch):
+                batch = future_to_batch[future]
+                try:
+                    failed_ids = future.result()
+                except Exception as e:
+                    self.logger.error(f"OpenAI enrichment batch failed: {str(e)}")
+                    failed_ids = batch
+                failed.update({i: pending[i] for i in failed_ids})
+
+        return failed
+
+    def _build_items(self, batch: Dict[str, Dict]) -> List[Dict]:
+        items = []
+        for item_id, detail in batch.items():
+            item = {'id': item_id}
+            if detail.get('category') is None:
+                item['original_category'] = detail.get('original_category', '')
+            if detail.get('state') is None:
+                item['location'] = detail.get('location', '')
+            items.append(item)
+        return items
+
+    def _enrich_batch(self, batch: Dict[str, Dict]) -> List[str]:
+        """Enrich one batch with a single OpenAI request; return ids that need another try"""
+        items = self._build_items(batch)
+
+        prompt = f"""
+        For every item below:
+        - if it has "original_category", categorize it using ONLY these predefined categories
+          (you can select multiple categories if applicable): {', '.join(self.categories)}
+        - if it has "location", extract the state and city. Do not return abbreviations.
+
+        Items:
+        {json.dumps(items)}
+
+        Return ONLY a JSON response with one result per item id, like this:
+        {{"results": [{{"id": "0", "category": ["Category1", "Category2"], "state": "oklahoma", "city": "oklahoma city"}}]}}
+        """
+
+        response = self.openai_client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system",
+                 "content": "You are a business categorization and location extraction expert. "
+                            "Return only valid JSON with a 'results' array containing one object per item id."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.3,
+            max_tokens=200 + 80 * len(items),
+            response_format={"type": "json_object"}
+        )
+
+        response_text = response.choices[0].message.content.strip()
+        try:
+            results = json.loads(response_text).get('results', [])
+        except json.JSONDecodeError:
+            self.logger.error(f"Failed to parse OpenAI batch response as JSON: {response_text[:200]}")
+            return list(batch)
+
+        results_by_id = {str(r.get('id')): r for r in results if isinstance(r, dict)}
+        failed_ids = []
+        for item_id, detail in batch.items():
+            if not self._apply_result(detail, results_by_id.get(item_id)):
+                failed_ids.append(item_id)
+        return failed_ids
+
+    def _apply_result(self, detail: Dict, result) -> bool:
+        """Validate one LLM result and copy it onto the detail; False if anything is still missing"""
+        if not result:
+            return False
+
+        if detail.get('category') is None:
+            categories = result.get('category') or []
+            if not isinstance(categories, list):
+                categories = [categories]
+            valid_categories = [cat for cat in categories if cat in self.categories]
+            if valid_categories:
+                detail['category'] = valid_categories
+                self.category_cache.set(detail.get('original_category', ''), valid_categories)
+
+        if detail.get('state') is None and result.get('state'):
+            detail['state'] = str(result.get('state', '')).strip().lower()
+            detail['city'] = str(result.get('city') or '').strip().lower()
+            self.gazetteer.learn(detail['city'], detail['state'])
+
+        return detail.get('category') is not None and detail.get('state') is not None
+
+    def _apply_fallback(self, detail: Dict) -> None:
+        if detail.get('category') is None:
+            original_category = detail.get('original_category', '')
+            detail['category'] = [original_category] if original_category else []
+            self.logger.warning(f"No valid categories found for: {original_category}")
+        if detail.get('state') is None:
+            detail['state'] = ''
+            detail['city'] = detail.get('city') or ''
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+BizBuySell Listing Pipeline
+Streams listings through fetch → extract → enrich → persist → match stages connected by bounded queues
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterator, List
+
+from pymongo.errors import BulkWriteError
+
+from listing_detail_scraper import ListingDetailScraper
+
+# End-of-stream marker passed down every queue
+_DONE = object()
+
+
+class ListingPipeline:
+    """Producer/consumer pipeline: each listing is persisted and matched shortly after it is scraped"""
+
+    def __init__(self,
+                 detail_scraper: ListingDetailScraper,
+                 on_listings: Callable[[List[Dict]], object] = None,
+                 queue_size: int = 50,
+                 flush_size: int = 20,
+                 flush_interval: float = 5.0,
+                 notify_size: int = 100,
+                 notify_interval: float = 60.0):
+        """
+        Initialize the listing pipeline
+
+        Args:
+            detail_scraper: Scraper providing the fetch/extract tier, the enricher and the MongoDB writes
+            on_listings: Match stage callback, called with each micro-batch of persisted listings
+            queue_size: Capacity of every inter-stage queue (backpressure on the fetch workers)
+            flush_size: Listings enriched and written to MongoDB in one micro-batch
+            flush_interval: Seconds after which a partial micro-batch is flushed anyway
+            notify_size: Persisted listings handed to on_listings at once
+            notify_interval: Seconds after which a partial batch is handed to on_listings anyway (how far
+                the match stage may lag behind the writes; when emails go out is up to the callback)
+        """
+        self.logger = logging.getLogger(__name__)
+        self.scraper = detail_scraper
+        self.on_listings = on_listings
+        self.workers = max(1, detail_scraper.max_concurrent)
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.notify_size = max(1, notify_size)
+        self.notify_interval = notify_interval
+
+        self._urls: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._extracted: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._enriched: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size // self.flush_size))
+        self._persisted: "queue.Queue" = queue.Queue(maxsize=queue_size)
+
+        self._stats_lock = threading.Lock()
+        self.stats = {'scraped': 0, 'failed': 0, 'persisted': 0, 'notified': 0, 'flushes': 0}
+        # Per-status tally of the ScrapeOutcome records (success, ban, timeout, parse_miss, ...)
+        self.outcomes: Dict[str, int] = {}
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    @staticmethod
+    def _micro_batches(source: "queue.Queue", size: int, interval: float) -> Iterator[List]:
+        """Group queue items into batches of `size`, flushing early once the oldest item waited `interval`"""
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = source.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _DONE:
+                if batch:
+                    yield batch
+                return
+            if item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + interval
+
+            if batch and (len(batch) >= size or time.monotonic() >= deadline):
+                yield batch
+                batch = []
+                deadline = None
+
+    def _fetch_stage(self) -> None:
+        """Fetch + extract: the tiered fetch needs the parse result to decide on the browser fallback"""
+        while True:
+            url_data = self._urls.get()
+            if url_data is _DONE:
+                return
+            outcome = self.scraper.scrape_listing(url_data)
+            with self._stats_lock:
+                self.outcomes[outcome.status] = self.outcomes.get(outcome.status, 0) + 1
+
+            if outcome.detail:
+                self._count('scraped')
+                self._extracted.put(outcome.detail)
+            else:
+                self._count('failed')
+                self.logger.info(f"{outcome.status} in {outcome.elapsed:.1f}s: {outcome.url}"
+                                 + (f" ({outcome.error})" if outcome.error else ""))
+
+    def _enrich_stage(self) -> None:
+        try:
+            for batch in self._micro_batches(self._extracted, self.flush_size, self.flush_interval):
+                try:
+                    self.scraper.enricher.enrich(batch)
+                except Exception as e:
+                    # Persist un-enriched rather than lose the listings
+                    self.logger.error(f"Enrichment failed for a batch of {len(batch)} listings: {e}")
+                self._enriched.put(batch)
+        finally:
+            self._enriched.put(_DONE)
+
+    def _write(self, batch: List[Dict]) -> List[Dict]:
+        """Upsert a micro-batch; returns the listings that were actually written"""
+        try:
+            self.scraper._save_details_to_mongo(batch, raise_errors=True)
+            return batch
+        except BulkWriteError as e:
+            if e.details.get('writeConcernErrors'):
+                # Durability of the whole batch is unknown
+                return []
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+            return [detail for index, detail in enumerate(batch) if index not in failed]
+        except Exception:
+            return []
+
+    def _persist_stage(self) -> None:
+        try:
+            while True:
+                batch = self._enriched.get()
+                if batch is _DONE:
+                    return
+                written = self._write(batch)
+                self._count('persisted', len(written))
+                self._count('failed', len(batch) - len(written))
+                self._count('flushes')
+                self.logger.info(f"💾 Flushed {len(written)}/{len(batch)} listings to MongoDB "
+                                 f"({self.stats['persisted']} so far)")
+                # Only stored listings are matched and remembered as known
+                for detail in written:
+                    self._persisted.put(detail)
+        finally:
+            self._persisted.put(_DONE)
+
+    def _match_stage(self) -> None:
+        for batch in self._micro_batches(self._persisted, self.notify_size, self.notify_interval):
+            if not self.on_listings:
+                continue
+            try:
+                self.on_listings(batch)
+                self._count('notified', len(batch))
+            except Exception as e:
+                self.logger.error(f"Match/notify failed for a batch of {len(batch)} listings: {e}")
+
+    def run(self, urls_to_process: List[Dict]) -> Dict[str, int]:
+        """Stream every URL through the pipeline; blocks until the last batch is matched"""
+        self.logger.info(f"🚀 Streaming {len(urls_to_process)} URLs through the listing pipeline "
+                         f"({self.workers} fetch workers, flush every {self.flush_size} listings "
+                         f"or {self.flush_interval:g}s)")
+        self.scraper.recent_scrapped_listings_urls = set()
+
+        fetchers = [threading.Thread(target=self._fetch_stage, name=f"pipeline-fetch-{i}", daemon=True)
+                    for i in range(self.workers)]
+        stages = [threading.Thread(target=target, name=f"pipeline-{name}", daemon=True)
+                  for name, target in (('enrich', self._enrich_stage),
+                                       ('persist', self._persist_stage),
+                                       ('match', self._match_stage))]
+        for thread in fetchers + stages:
+            thread.start()
+
+        try:
+            # Blocks while the fetch workers are busy, so only queue_size URLs wait in memory
+            for url_data in urls_to_process:
+                self._urls.put(url_data)
+        finally:
+            for _ in fetchers:
+                self._urls.put(_DONE)
+            for thread in fetchers:
+                thread.join()
+            # Fetch is drained; the sentinel ripples through enrich → persist → match
+            self._extracted.put(_DONE)
+            for thread in stages:
+                thread.join()
+
+        self.logger.info(f"🎉 Pipeline completed: {self.stats['scraped']} scraped, {self.stats['failed']} failed, "
+                         f"{self.stats['persisted']} persisted in {self.stats['flushes']} flushes, "
+                         f"{self.stats['notified']} matched")
+        self.logger.info(f"   Outcomes: {', '.join(f'{k}={v}' for k, v in sorted(self.outcomes.items()))}")
+        return dict(self.stats)
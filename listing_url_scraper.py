@@ -8,10 +8,11 @@ import csv
 import json
 import logging
 import os
-import random
+import threading
 
 from fake_useragent import UserAgent
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from typing import Dict, List, Optional
 from bs4 import BeautifulSoup
@@ -19,17 +20,51 @@ import requests
 
 from dotenv import load_dotenv
 
+from helpers.proxy_pool import ProxyPool, get_proxy_pool
+from helpers.retry import RetryPolicy
+
 load_dotenv()
 
 
 class ListingURLScraper:
     """Scrapes listing URLs from BizBuySell's main listing pages"""
 
-    def __init__(self):
-        """Initialize the listing URL scraper"""
-        self.url = "https://www.bizbuysell.com/businesses-for-sale/"
+    def __init__(self, start_page: int = 1, max_pages: int = 1, max_concurrent: int = 4,
+                 base_url: str = None, use_proxies: bool = True, incremental: bool = False,
+                 known_urls_collection=None, known_urls_cache: str = "known_listing_urls.txt",
+                 attempted_urls_cache: str = "attempted_listing_urls.txt", proxy_pool: ProxyPool = None, retry_policy: RetryPolicy = None):
+        """
+        Initialize the listing URL scraper
+
+        Args:
+            start_page: First search results page to crawl
+            max_pages: Page budget for one run (pages start_page .. start_page + max_pages - 1)
+            max_concurrent: Maximum number of pages fetched at the same time
+            base_url: Override for the search results URL (e.g. a local stand-in server)
+            use_proxies: Route requests through Webshare proxies
+            incremental: Walk pages newest-first and stop at the first page made only of known URLs
+            known_urls_collection: MongoDB collection holding already scraped listings (``url`` field)
+            known_urls_cache: Local file of already scraped URLs, used alongside/instead of MongoDB
+            attempted_urls_cache: Local file of URLs handed to the detail scraper but not stored (failed or
+                skipped); they count as known for the frontier so they do not keep the crawl going
+            proxy_pool: Proxy pool to lease proxies from (defaults to the shared pool)
+            retry_policy: Backoff/deadline policy applied to every page fetch
+        """
+        self.url = base_url or "https://www.bizbuysell.com/businesses-for-sale/"
         self.logger = logging.getLogger(__name__)
         self.ua = UserAgent()
+        self._thread_local = threading.local()
+
+        self.start_page = max(1, start_page)
+        self.max_pages = max(0, max_pages)
+        self.max_concurrent = max(1, max_concurrent)
+        self.use_proxies = use_proxies
+        self.proxy_pool = proxy_pool or get_proxy_pool()
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=6, base_delay=1.0, max_delay=20.0, deadline=90.0)
+        self.incremental = incremental
+        self.known_urls_collection = known_urls_collection
+        self.known_urls_cache = known_urls_cache
+        self.attempted_urls_cache = attempted_urls_cache
 
         timestamp = datetime.now().strftime("%Y%m%d")
         self.csv_filename = f"listing_urls_{timestamp}.csv"
@@ -37,96 +72,229 @@ class ListingURLScraper:
         self.csv_headers = [
             'title', 'url', 'listing_id', 'scraped_date'
         ]
-        self.recent_scrapped_listings_urls = []
+        self.recent_scrapped_listings_urls = set()
+        self.attempted_urls = set()
+        self.reached_known_frontier = False
+        if self.incremental:
+            self._load_known_urls_cache()
+
+    def _get_session(self) -> requests.Session:
+        """Return this worker thread's session so connections are reused across pages"""
+        session = getattr(self._thread_local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                'User-Agent': self.ua.chrome
+            })
+            self._thread_local.session = session
+        return session
+
+    def _fetch_page_html(self, page_num: int) -> str:
+        """Fetch the HTML of a single search results page, failing over between proxies"""
+        session = self._get_session()
+        tried_proxies = set()
+
+        for attempt in self.retry_policy.attempts():
+            proxy = None
+            try:
+                if self.use_proxies:
+                    # Prefer a proxy that has not failed on this page yet
+                    proxy = self.proxy_pool.lease(exclude=tried_proxies) or self.proxy_pool.lease()
+                    if not proxy:
+                        raise RuntimeError("No proxies available from Webshare")
+                    tried_proxies.add(proxy.key)
+
+                    # Apply proxy to session
+                    session.proxies.update({
+                        "http": proxy.url,
+                        "https": proxy.url
+                    })
+
+                # Quick attempt with short timeout
+                started = time.monotonic()
+                response = session.get(self.url + f"{page_num}", timeout=15)
+                if response.status_code == 200:
+                    self.proxy_pool.report_success(proxy, time.monotonic() - started)
+                    return response.text
+
+                self.proxy_pool.report_failure(proxy, banned=response.status_code in (403, 429))
+                self.logger.error(f"retrying failed request to {self.url} (page {page_num}, "
+                                  f"attempt {attempt}, status {response.status_code})")
+            except RuntimeError:
+                raise
+            except requests.RequestException as e:
+                self.proxy_pool.report_failure(proxy)
+                self.logger.error(f"retrying failed request to {self.url} (page {page_num}, attempt {attempt}): {e}")
+
+        raise RuntimeError(f"Giving up on page {page_num}: retry budget exhausted")
+
+    def _parse_search_page(self, html: str) -> List[Dict]:
+        """Extract listing URLs from the JSON-LD SearchResultsPage block"""
+        listings = []
+
+        soup = BeautifulSoup(html, 'lxml')
+
+        # Look for JSON-LD data
+        scripts = soup.find_all('script', type='application/ld+json')
+        for script in scripts:
+            try:
+                data = json.loads(script.string)
+
+                if data.get('@type') == 'SearchResultsPage' and data.get('about'):
+                    for item in data['about']:
+                        if (item.get('@type') == 'ListItem' and
+                                item.get('item') and
+                                item['item'].get('@type') == 'Product'):
+                            listing = self._parse_listing_url(item['item'])
+                            if listing:
+                                listings.append(listing)
+            except Exception:
+                continue
+
+        return listings
+
+    def _scrape_page(self, page_num: int) -> List[Dict]:
+        """Fetch and parse a single search results page"""
+        self.logger.info(f"Scraping page {page_num}...")
 
+        html = self._fetch_page_html(page_num)
+        self.logger.info(f"Real scraping successful! Got {len(html)} characters from page {page_num}")
+
+        listings = self._parse_search_page(html)
+        if listings:
+            self.logger.info(f"Extracted {len(listings)} listing URLs from page {page_num}")
+        return listings
+
+    def _scrape_pages(self, pages: List[int]) -> Dict[int, List[Dict]]:
+        """Scrape a batch of pages concurrently, keyed by page number"""
+        results_by_page = {}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrent, len(pages))) as executor:
+            future_to_page = {executor.submit(self._scrape_page, page_num): page_num for page_num in pages}
+
+            for future in as_completed(future_to_page):
+                page_num = future_to_page[future]
+                try:
+                    results_by_page[page_num] = future.result()
+                except Exception as e:
+                    self.logger.warning(f"Real scraping failed for page {page_num}: {str(e)}")
+
+        return results_by_page
 
     def _try_real_scraping(self) -> List[Dict]:
-        """Try to scrape real listing URLs from BizBuySell"""
+        """Scrape the configured page range concurrently and merge results in page order"""
+        pages = list(range(self.start_page, self.start_page + self.max_pages))
+        if not pages:
+            return []
+
+        # In incremental mode pages are fetched in growing waves (1, 2, 4, ... up to max_concurrent)
+        # so a run that hits the known frontier on page 1 or 2 does not pay for a full wave
+        wave_size = 1 if self.incremental else len(pages)
 
         listings = []
-        PAGE_NUM = 1
+        seen_urls = set()
+        pages_scraped = 0
+        wave_start = 0
+        self.reached_known_frontier = False
+
+        while wave_start < len(pages):
+            wave = pages[wave_start:wave_start + wave_size]
+            wave_start += len(wave)
+            wave_size = min(wave_size * 2, self.max_concurrent) if self.incremental else wave_size
+
+            results_by_page = self._scrape_pages(wave)
+            pages_scraped += len(results_by_page)
+
+            # Merge in page order; a listing can shift onto the next page while we crawl
+            for page_num in wave:
+                page_listings = results_by_page.get(page_num, [])
+
+                if self.incremental and page_num in results_by_page:
+                    if not page_listings:
+                        # An empty results page is usually a block/captcha page, not the frontier
+                        page_listings = self._scrape_pages([page_num]).get(page_num, [])
+                        if not page_listings:
+                            self.logger.warning(f"⚠️ Page {page_num} came back empty twice, stopping crawl "
+                                                f"before the known frontier")
+                            self.logger.info(f"Scraped {pages_scraped} pages, {len(listings)} unique listing URLs")
+                            return listings
+
+                    page_urls = [listing['url'] for listing in page_listings]
+                    known_urls = self._known_urls_among(page_urls)
+                    if len(known_urls) == len(set(page_urls)):
+                        self.logger.info(f"🛑 Reached known frontier at page {page_num}, stopping crawl")
+                        self.reached_known_frontier = True
+                        self.logger.info(f"Scraped {pages_scraped} pages, {len(listings)} unique listing URLs")
+                        return listings
+
+                for listing in page_listings:
+                    if listing['url'] in seen_urls:
+                        continue
+                    seen_urls.add(listing['url'])
+                    listings.append(listing)
 
-        while PAGE_NUM < 2:
+        self.logger.info(f"Scraped {pages_scraped}/{len(pages)} pages, {len(listings)} unique listing URLs")
+        return listings
+
+    def _known_urls_among(self, urls: List[str]) -> set:
+        """Return the subset of urls already stored (MongoDB or the local cache) or already attempted"""
+        known = set(url for url in urls
+                    if url in self.recent_scrapped_listings_urls or url in self.attempted_urls)
+
+        unknown = [url for url in urls if url not in known]
+        if unknown and self.known_urls_collection is not None:
             try:
-                self.logger.info(f"Scraping page {PAGE_NUM}...")
-
-                session = requests.Session()
-                response = requests.get(
-                    "https://proxy.webshare.io/api/v2/proxy/list/?mode=direct&page=1&page_size=25",
-                    headers={"Authorization": f"Token {os.getenv('WEBSHARE_TOKEN')}"}
-                )
-
-                proxy_data = response.json()
-                while True:
-                    try:
-                        # Extract a random proxy from the list
-                        proxy_list = proxy_data.get("results", [])
-                        if not proxy_list:
-                            raise RuntimeError("No proxies returned from Webshare API")
-
-                        proxy = random.choice(proxy_list)
-                        proxy_url = f"http://{proxy['username']}:{proxy['password']}@{proxy['proxy_address']}:{proxy['port']}"
-
-                        # Apply proxy to session
-                        session.proxies.update({
-                            "http": proxy_url,
-                            "https": proxy_url
-                        })
-
-                        session.headers.update({
-                            'User-Agent': self.ua.chrome
-                        })
-
-                        # Quick attempt with short timeout
-                        response = session.get(self.url + f"{PAGE_NUM}", timeout=15)
-                        if response.status_code != 200:
-                            self.logger.error("retrying failed request to bizbuysell.com")
-                            time.sleep(10)
-                            continue
-                        else:
-                            break
-                    except:
-                        self.logger.error("retrying failed request to bizbuysell.com")
-                        time.sleep(10)
-                        continue
-                response.raise_for_status()
-
-                self.logger.info(f"Real scraping successful! Got {len(response.text)} characters")
-
-                # Parse with BeautifulSoup
-                soup = BeautifulSoup(response.text, 'lxml')
-
-                # Look for JSON-LD data
-                scripts = soup.find_all('script', type='application/ld+json')
-                for script in scripts:
-                    try:
-                        data = json.loads(script.string)
-
-                        if data.get('@type') == 'SearchResultsPage' and data.get('about'):
-                            for item in data['about']:
-                                if (item.get('@type') == 'ListItem' and
-                                        item.get('item') and
-                                        item['item'].get('@type') == 'Product'):
-                                    listing = self._parse_listing_url(item['item'])
-                                    if listing:
-                                        listings.append(listing)
-                    except InterruptedError as Ierr:
-                        self.logger.error(f"❌ STOPPING SCRIPT: {Ierr}")
-                        raise InterruptedError(Ierr)
-                    except Exception as err:
-                        continue
+                cursor = self.known_urls_collection.find({'url': {'$in': unknown}}, {'_id': 0, 'url': 1})
+                stored = set(d.get('url') for d in cursor)
+                self.recent_scrapped_listings_urls.update(stored)
+                known.update(stored)
+            except Exception as e:
+                self.logger.warning(f"Error checking known URLs in MongoDB: {str(e)}")
 
-                if listings:
-                    self.logger.info(f"Extracted {len(listings)} listing URLs from page {PAGE_NUM}")
+        return known
 
-                PAGE_NUM += 1
-            except InterruptedError as Ierr:
-                self.logger.error(f"❌ STOPPING SCRIPT: {Ierr}")
-                raise InterruptedError(Ierr)
+    def _load_known_urls_cache(self) -> None:
+        """Load the local caches of already scraped and already attempted URLs"""
+        for path, urls_set, label in ((self.known_urls_cache, self.recent_scrapped_listings_urls, "known"),
+                                      (self.attempted_urls_cache, self.attempted_urls, "attempted")):
+            if not path or not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as cache_file:
+                    urls = [line.strip() for line in cache_file if line.strip()]
+                urls_set.update(urls)
+                self.logger.info(f"Loaded {len(urls)} {label} URLs from {path}")
             except Exception as e:
-                self.logger.warning(f"Real scraping failed: {str(e)}")
-                break
-        return listings
+                self.logger.warning(f"Error loading {label} URLs cache: {str(e)}")
+
+    def _append_to_cache(self, path: str, urls: List[str]) -> None:
+        if not path:
+            return
+        try:
+            with open(path, 'a', encoding='utf-8') as cache_file:
+                for url in urls:
+                    cache_file.write(url + '\n')
+        except Exception as e:
+            self.logger.warning(f"Error saving URLs cache {path}: {str(e)}")
+
+    def remember_urls(self, urls: List[str]) -> None:
+        """Add URLs that were stored downstream to the known frontier and the local cache"""
+        new_urls = [url for url in urls if url and url not in self.recent_scrapped_listings_urls]
+        if not new_urls:
+            return
+
+        self.recent_scrapped_listings_urls.update(new_urls)
+        self._append_to_cache(self.known_urls_cache, new_urls)
+
+    def remember_attempted_urls(self, urls: List[str]) -> None:
+        """Record URLs the detail scraper was given; the ones not stored still count toward the frontier"""
+        new_urls = [url for url in urls
+                    if url and url not in self.recent_scrapped_listings_urls and url not in self.attempted_urls]
+        if not new_urls:
+            return
+
+        self.attempted_urls.update(new_urls)
+        self._append_to_cache(self.attempted_urls_cache, new_urls)
 
     def get_urls_only(self) -> List[Dict]:
         """Get URLs without saving to CSV or checking duplicates"""
@@ -140,9 +308,6 @@ class ListingURLScraper:
             url = item.get('url', '')
             product_id = item.get('productId', '')
 
-            if url in self.recent_scrapped_listings_urls:
-                raise InterruptedError(f"URL {url} has been scrapped recently")
-
             if title and url:
                 return {
                     'title': title.strip() if title else '',
@@ -150,9 +315,6 @@ class ListingURLScraper:
                     'listing_id': product_id,
                     'scraped_date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 }
-        except InterruptedError as Ierr:
-            self.logger.error(f"❌ STOPPING SCRIPT: {Ierr}")
-            raise InterruptedError(Ierr)
         except Exception as err:
             self.logger.info(f"ERROR PARSING LISTING URL: {err}")
 
@@ -175,7 +337,7 @@ class ListingURLScraper:
             except Exception as e:
                 self.logger.warning(f"Error loading existing URLs: {str(e)}")
 
-        self.recent_scrapped_listings_urls = set(row.get('url') for row in rows)
+        self.recent_scrapped_listings_urls.update(row.get('url') for row in rows if row.get('url'))
 
     def _save_listings_to_csv(self, listings: List[Dict]) -> int:
         """Save new listing URLs to CSV"""
@@ -216,6 +378,8 @@ class ListingURLScraper:
         all_listings = []
 
         real_listings = self._try_real_scraping()
+        real_listings = [listing for listing in real_listings
+                         if listing['url'] not in self.recent_scrapped_listings_urls]
         if real_listings:
             all_listings.extend(real_listings)
             self.logger.info(f"✅ Got {len(real_listings)} listing URLs")
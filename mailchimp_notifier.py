@@ -1,13 +1,27 @@
 #!/usr/bin/env python3
 
 import os
+import json
 import logging
 import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
-from pymongo import MongoClient
 from dotenv import load_dotenv
 
+from helpers.mongo import LISTINGS_COLLECTION, MONGO_DB_NAME, SUBSCRIBERS_COLLECTION, get_database, get_mongo_client
+from helpers.mailchimp_batch import MailchimpBatchRunner
+from helpers.match_trace import MatchTrace
+from helpers.rate_limit import ApiThrottle
+from helpers.retry import RetryPolicy
+from helpers.segment_manager import SegmentManager
+from helpers.subscriber_cache import get_subscriber_cache
+from helpers.subscriber_index import ListingKey, SubscriberCriteria, SubscriberIndex
+from helpers.template_cache import get_template_cache
+from helpers.vector_matcher import NUMPY_AVAILABLE, VectorMatcher
+from templates.listing_card import ListingCardRenderer, render_listing_card
+
 import mailchimp_marketing as MailchimpMarketing
 from mailchimp_marketing.api_client import ApiClientError
 
@@ -15,30 +29,74 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Subscriber x listing pairs above which the "auto" engine switches to the NumPy matcher
+VECTOR_MATCH_MIN_PAIRS = 500_000
+
+# 429 means the request was rejected before doing anything, so it is always safe to retry;
+# 5xx / network errors are retried only for idempotent calls
+MAILCHIMP_THROTTLED_STATUS = 429
+MAILCHIMP_TRANSIENT_STATUS = (500, 502, 503, 504)
+
+# Dispatch modes: one group is sent inline, up to BATCH_DISPATCH_MIN_GROUPS in parallel, more through /batches
+DISPATCH_MODES = ("sync", "parallel", "batch")
+BATCH_DISPATCH_MIN_GROUPS = 100
+
+_throttle: Optional[ApiThrottle] = None
+_throttle_lock = threading.Lock()
+
+
+def get_mailchimp_throttle() -> ApiThrottle:
+    """Process-wide throttle: Mailchimp counts simultaneous connections per account, not per client"""
+    global _throttle
+    with _throttle_lock:
+        if _throttle is None:
+            _throttle = ApiThrottle(max_connections=int(os.getenv("MAILCHIMP_MAX_CONNECTIONS", 10)),
+                                    rate=float(os.getenv("MAILCHIMP_REQUESTS_PER_SECOND", 20)))
+        return _throttle
+
 
 class MailchimpNotifier:
     def __init__(self,
                  mailchimp_api_key: str,
-                 mongo_db: str = "business-broker-las-vegas-db",
-                 mongo_collection: str = "bizbuysell-data",
-                 subscribers_collection: str = "users") -> None:
+                 mongo_db: str = MONGO_DB_NAME,
+                 mongo_collection: str = LISTINGS_COLLECTION,
+                 subscribers_collection: str = SUBSCRIBERS_COLLECTION) -> None:
         self.api_key = mailchimp_api_key
         self.list_id = os.getenv("MAILCHIMP_LIST_ID")
         self.template_id = int(os.getenv("MAILCHIMP_EMAIL_TEMPLATE_ID"))
 
-        self.mongo_uri = os.getenv('MONGO_DB_URI')
         self.mongo_db = mongo_db
         self.mongo_collection = mongo_collection
         self.subscribers_collection = subscribers_collection
 
-        # Initialize MongoDB client
-        self.mongo_client = MongoClient(self.mongo_uri)
-        self.db = self.mongo_client[self.mongo_db]
+        # Shared MongoDB client (one pool per process)
+        self.mongo_client = get_mongo_client()
+        self.db = get_database(self.mongo_db)
         self.subscribers_db = self.db[self.subscribers_collection]
 
+        # "index" (inverted index), "numpy" (vectorized) or "auto" (numpy for big sends when installed)
+        self.match_engine = os.getenv("MATCH_ENGINE", "auto").lower()
+
         self.mailchimp_client = MailchimpMarketing.Client()
         self.__initialize_mailchimp_client()
 
+        # Groups are dispatched concurrently within the account's connection limit
+        self.throttle = get_mailchimp_throttle()
+        self.max_connections = self.throttle.max_connections
+        self.api_retry_policy = RetryPolicy(max_attempts=4, base_delay=2.0, max_delay=30.0, deadline=120.0)
+
+        # "sync", "parallel", "batch" or "auto" (chosen by group count)
+        self.dispatch_mode = os.getenv("MAILCHIMP_DISPATCH_MODE", "auto").lower()
+        self.batch_min_groups = int(os.getenv("MAILCHIMP_BATCH_MIN_GROUPS", BATCH_DISPATCH_MIN_GROUPS))
+
+        # Listing cards are rendered once per run, whatever the number of groups they appear in
+        self.card_renderer = ListingCardRenderer()
+
+        # Matches collected batch by batch while a run streams in, sent once by notify_collected()
+        self._collect_lock = threading.Lock()
+        self._collected_matches: Dict[str, List[Dict]] = {}
+        self._collected_listings: List[Dict] = []
+
     def __initialize_mailchimp_client(self):
         try:
             self.mailchimp_client.set_config({
@@ -48,77 +106,34 @@ class MailchimpNotifier:
         except ApiClientError as error:
             logger.error(f"Mailchimp client initialization error: {error.text}")
 
+    def _api_call(self, description: str, fn, *args, idempotent: bool = False, **kwargs):
+        """Run one Mailchimp call through the throttle, retrying only this call when it is throttled."""
+        last_error = None
+        for attempt in self.api_retry_policy.attempts():
+            try:
+                with self.throttle.slot():
+                    return fn(*args, **kwargs)
+            except ApiClientError as error:
+                last_error = error
+                status = getattr(error, 'status_code', None)
+                if status == MAILCHIMP_THROTTLED_STATUS:
+                    # Slow every worker down, not just this one
+                    self.throttle.back_off(self.api_retry_policy.backoff(attempt))
+                elif not (idempotent and (status is None or status in MAILCHIMP_TRANSIENT_STATUS)):
+                    raise
+                logger.warning(f"Mailchimp {description} failed (attempt {attempt}, status {status}), retrying")
+        raise last_error
+
     # -----------------------------
     # HTML Generation for Template
     # -----------------------------
     def _format_single_listing_html(self, listing: Dict) -> str:
         """Format a single listing as HTML."""
-        title = listing.get('title', 'N/A')
-        asking_price = listing.get('asking_price', 'N/A')
-        broker_name = listing.get('broker_name', 'N/A')
-        cash_flow = listing.get('cashflow', 'N/A')
-        broker_phone = listing.get('broker_phone', 'N/A')
-        description = listing.get('description', 'N/A')
-        listing_url = listing.get('url') or listing.get('listing_url', '#')
-
-        # Truncate description if too long
-        if len(str(description)) > 300:
-            description = str(description)[:300] + "..."
-
-        return f"""
-        <div style="margin-bottom: 30px; padding: 20px; border: 2px solid #e0e0e0; border-radius: 8px; background-color: #fafafa;">
-            <div style="margin-bottom: 15px;">
-                <p style="text-align: left; margin: 0 0 5px 0; font-weight: bold; color: #007cba; font-size: 16px;">TITLE</p>
-                <p style="text-align: left; margin: 0 0 15px 0; font-size: 18px; font-weight: bold; color: #333;">{title}</p>
-            </div>
-            <div style="margin-bottom: 15px;">
-                <p style="text-align: left; margin: 0 0 5px 0; font-weight: bold; color: #007cba; font-size: 16px;">ASKING PRICE</p>
-                <p style="text-align: left; margin: 0 0 15px 0; font-size: 16px; color: #333; font-weight: bold;">{asking_price}</p>
-            </div>
-            <div style="margin-bottom: 15px;">
-                <p style="text-align: left; margin: 0 0 5px 0; font-weight: bold; color: #007cba; font-size: 16px;">Sellers Discretionary Earnings (SDE):</p>
-                <p style="text-align: left; margin: 0 0 15px 0; font-size: 16px; color: #333;">{cash_flow}</p>
-            </div>
-            <div style="margin-bottom: 15px;">
-                <p style="text-align: left; margin: 0 0 5px 0; font-weight: bold; color: #007cba; font-size: 16px;">BROKER'S NAME</p>
-                <p style="text-align: left; margin: 0 0 15px 0; font-size: 16px; color: #333;">{broker_name}</p>
-            </div>
-            <div style="margin-bottom: 15px;">
-                <p style="text-align: left; margin: 0 0 5px 0; font-weight: bold; color: #007cba; font-size: 16px;">BROKER'S PHONE</p>
-                <p style="text-align: left; margin: 0 0 15px 0; font-size: 16px; color: #333;">{broker_phone}</p>
-            </div>
-            <div style="margin-bottom: 15px;">
-                <p style="text-align: left; margin: 0 0 5px 0; font-weight: bold; color: #007cba; font-size: 16px;">DESCRIPTION</p>
-                <p style="text-align: left; margin: 0 0 15px 0; font-size: 14px; color: #333; line-height: 1.4;">{description}</p>
-            </div>
-            <div style="margin-bottom: 0;">
-                <p style="text-align: left; margin: 0; font-size: 16px;">
-                    <a href="{listing_url}" target="_blank" style="color: #007cba; text-decoration: none; font-weight: bold;">View Full Details →</a>
-                </p>
-            </div>
-        </div>
-        """
+        return render_listing_card(listing)
 
     def _generate_listings_html(self, listings: List[Dict]) -> str:
-        """Generate HTML for all listings."""
-        if not listings:
-            return """
-            <div style="text-align: center; padding: 20px; background-color: #f9f9f9; border-radius: 5px;">
-                <p style="color: #666; font-size: 16px; margin: 0;">No new listings match your criteria at this time.</p>
-                <p style="color: #666; font-size: 14px; margin: 10px 0 0 0;">We'll notify you when new opportunities become available!</p>
-            </div>
-            """
-
-        html_parts = []
-        for i, listing in enumerate(listings, 1):
-            html_parts.append(f"""
-            <div style="margin-bottom: 20px;">
-                <h2 style="color: #007cba; font-size: 20px; margin: 0 0 10px 0;">Business Opportunity #{i}</h2>
-                {self._format_single_listing_html(listing)}
-            </div>
-            """)
-
-        return "".join(html_parts)
+        """Generate HTML for all listings from the cached cards."""
+        return self.card_renderer.render(listings)
 
     # -----------------------------
     # Data fetchers
@@ -163,106 +178,68 @@ class MailchimpNotifier:
         return [item.strip() for item in str(field_value).replace('\xa0', '').split(',')
                 if item and item.strip()]
 
-    def match_subscribers_to_listings_mongo(self, subscribers: List[Dict], listings: List[Dict]) -> Dict[str, List[Dict]]:
-        """Match subscribers from MongoDB to listings based on their preferences."""
-        matches = {}
-
-        for subscriber in subscribers:
-            email = subscriber.get('email')
-            if not email:
-                continue
-
-            # Get subscriber preferences directly from MongoDB document
-            min_price = subscriber.get('price_min')
-            max_price = subscriber.get('price_max')
-            subscriber_industries = set(i.lower() for i in self._normalize_list_field(subscriber.get('industries')))
-            subscriber_states = set(i.lower() for i in self._normalize_list_field(subscriber.get('state')))
-            subscriber_cities = set(i.lower() for i in self._normalize_list_field(subscriber.get('city')))
-
-            # Check each listing
-            matched_listings = []
-            for listing in listings:
-                if self._listing_matches_subscriber(listing, min_price, max_price,
-                                                    subscriber_industries, subscriber_states, subscriber_cities):
-                    matched_listings.append(listing)
-
-            if matched_listings:
-                matches[email] = matched_listings
+    def build_subscriber_index(self, subscribers: List[Dict], state_field: str = 'state',
+                               city_field: str = 'city') -> SubscriberIndex:
+        """Parse every subscriber once and bucket them by state, city, industry and price."""
+        return SubscriberIndex(self._compile_subscribers(subscribers, state_field, city_field))
 
+    @staticmethod
+    def _compile_subscribers(subscribers: List[Dict], state_field: str = 'state',
+                             city_field: str = 'city') -> List[SubscriberCriteria]:
+        compiled = (SubscriberCriteria.from_document(sub, state_field, city_field) for sub in subscribers)
+        return [c for c in compiled if c is not None]
+
+    def _build_matcher(self, criteria: List[SubscriberCriteria], listing_count: int):
+        """Pick the matching engine; both return the same email -> listings dict from match()."""
+        engine = self.match_engine
+        if engine == "auto":
+            engine = "numpy" if NUMPY_AVAILABLE and len(criteria) * listing_count >= VECTOR_MATCH_MIN_PAIRS else "index"
+        if engine == "numpy" and not NUMPY_AVAILABLE:
+            logger.warning("MATCH_ENGINE=numpy but numpy is not installed, using the inverted index")
+            engine = "index"
+        return VectorMatcher(criteria) if engine == "numpy" else SubscriberIndex(criteria)
+
+    def _match_with_trace(self, criteria: List[SubscriberCriteria], listings: List[Dict],
+                          trace: Optional[MatchTrace] = None) -> Dict[str, List[Dict]]:
+        """Run the matcher, then log the summary counters and the opt-in per-subscriber trace."""
+        trace = trace or MatchTrace.from_env()
+        matches = self._build_matcher(criteria, len(listings)).match(listings, trace=trace)
+
+        if trace.tracing:
+            keys = [ListingKey(listing) for listing in listings]
+            for c in criteria:
+                if trace.wants(c.email):
+                    for listing, key in zip(listings, keys):
+                        trace.record(c.email, listing, c.rejection_reasons(key))
+        trace.log_summary()
         return matches
 
-    def match_subscribers_to_listings(self, subs: List[Dict], listings: List[Dict]) -> Dict[str, List[Dict]]:
-        """Match subscribers to listings based on their preferences"""
-        matches = {}
-
-        for sub in subs:
-            email = sub.get('email')
-            if not email:
-                continue
-
-            # Get subscriber preferences
-            min_price = sub.get('price_min')
-            max_price = sub.get('price_max')
-
-            subscriber_industries = set(i.lower() for i in self._normalize_list_field(sub.get('industries')))
-            subscriber_states = set(i.lower() for i in self._normalize_list_field(sub.get('states')))
-            subscriber_cities = set(i.lower() for i in self._normalize_list_field(sub.get('cities')))
-
-            # Check each listing
-            matched_listings = []
-            for listing in listings:
-                if self._listing_matches_subscriber(listing, min_price, max_price,
-                                                    subscriber_industries, subscriber_states, subscriber_cities):
-                    matched_listings.append(listing)
-
-            if matched_listings:
-                matches[email] = matched_listings
+    def match_subscribers_to_listings_mongo(self, subscribers: List[Dict], listings: List[Dict],
+                                            trace: Optional[MatchTrace] = None) -> Dict[str, List[Dict]]:
+        """Match subscribers from MongoDB to listings based on their preferences."""
+        return self._match_with_trace(self._compile_subscribers(subscribers), listings, trace)
 
-        return matches
+    def match_subscribers_to_listings(self, subs: List[Dict], listings: List[Dict],
+                                      trace: Optional[MatchTrace] = None) -> Dict[str, List[Dict]]:
+        """Match subscribers to listings based on their preferences"""
+        # Mailchimp member documents use plural location fields
+        criteria = self._compile_subscribers(subs, state_field='states', city_field='cities')
+        return self._match_with_trace(criteria, listings, trace)
 
     def _listing_matches_subscriber(self, listing: Dict, min_price: Optional[float], max_price: Optional[float],
-                                    subscriber_industries: set, subscriber_states: set, subscriber_cities: set) -> bool:
+                                    subscriber_industries: set, subscriber_states: set, subscriber_cities: set,
+                                    trace: Optional[MatchTrace] = None, email: str = None) -> bool:
         """Check if a listing matches subscriber criteria."""
         try:
-            # Price matching
-            price = self._normalize_price(listing.get('asking_price'))
-            logger.info('STARTING LISTING MATCHING...')
-            logger.info(f"PRICE: {price}")
-            logger.info(f"SUB MIN PRICE: {min_price}")
-            logger.info(f"SUB MAX PRICE: {max_price}")
-
-            if (min_price is None and (price is None)) and (int(price) >= int(min_price)):
-                return False
-            if (max_price is None and price is None) and (int(price) <= int(max_price)):
-                return False
-
-            # Industry matching
-            if subscriber_industries:
-                listing_categories = listing.get('category') or []
-
-                logger.info(f"LISTING CATEGORIES: {listing_categories}")
-                if not isinstance(listing_categories, list):
-                    listing_categories = [listing_categories]
-                listing_industries = set(str(cat).lower().strip() for cat in listing_categories if cat)
-                if not subscriber_industries.intersection(listing_industries):
-                    return False
-
-            logger.info(f"SUBSCRIBER STATES: {subscriber_states}")
-            # Location matching (states and cities)
-            if subscriber_states:
-                listing_state = {listing.get('state', '').lower()}
-                logger.info(f"LISTING STATES: {listing_state}")
-                if not subscriber_states.intersection(listing_state):
-                    return False
-
-            logger.info(f"SUBSCRIBER CITIES: {subscriber_cities}")
-            if subscriber_cities:
-                listing_city = {listing.get('city', '').lower()}
-                if not subscriber_cities.intersection(listing_city):
-                    return False
-                logger.info(f"LISTING CITIES: {listing_city}")
-
-            return True
+            criteria = SubscriberCriteria(email, self._normalize_price(min_price), self._normalize_price(max_price),
+                                          subscriber_industries, subscriber_states, subscriber_cities)
+            reasons = criteria.rejection_reasons(ListingKey(listing))
+            if trace is not None:
+                trace.count_pairs(1, 0 if reasons else 1)
+                trace.count_rejections(**{reason: 1 for reason in reasons})
+                if email and trace.wants(email):
+                    trace.record(email, listing, reasons)
+            return not reasons
         except Exception as err:
             logger.error(f"LISTING MATCHING ERROR: {err}")
             return False
@@ -292,99 +269,374 @@ class MailchimpNotifier:
 
         return groups
 
-    def _create_segment_for_group(self, group_emails: List[str], listings_hash: str) -> Optional[str]:
-        """Create a static segment for a group of subscribers with identical matches."""
-        segment_name = f"alerts-group-{listings_hash}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    def _campaign_payload(self, segment_id: Optional[str], subject: str, title: str,
+                          from_name: str, reply_to: str) -> Dict:
+        """Regular campaign addressed to a saved segment (or the whole list)."""
+        recipients = {"list_id": self.list_id}
+        if segment_id:
+            recipients["segment_opts"] = {"saved_segment_id": segment_id}
+        return {
+            "type": "regular",
+            "recipients": recipients,
+            "settings": {
+                "subject_line": subject,
+                "title": title,
+                "from_name": from_name,
+                "reply_to": reply_to,
+            }
+        }
+
+    def _load_template_html(self, from_name: str, reply_to: str) -> Optional[str]:
+        """Template HTML with the *|TEMP_HTML|* placeholder, fetched once per template version."""
+        cache = get_template_cache()
 
+        # Cheap version check; GET /templates does not return the HTML itself
+        version = None
         try:
-            # Create static segment
-            response = self.mailchimp_client.lists.create_segment(
-                self.list_id,
-                {"name": segment_name, "static_segment": group_emails}
-            )
-            segment_id = response.get('id')
-            logger.info(f"Created segment '{segment_name}' with {len(group_emails)} subscribers")
-            return segment_id
+            template = self._api_call("templates.get_template", self.mailchimp_client.templates.get_template,
+                                      self.template_id, fields=["id", "date_edited"], idempotent=True)
+            version = template.get("date_edited")
+        except ApiClientError as error:
+            logger.warning(f"Could not check template {self.template_id} version, using the cached HTML: {error.text}")
 
+        template_html = cache.get(self.template_id, version)
+        if template_html is not None:
+            logger.info(f"Using cached HTML for template {self.template_id} (edited {version})")
+            return template_html
+
+        # Render the template once through a throwaway draft campaign
+        try:
+            payload = self._campaign_payload(None, "Template render", "Template render", from_name, reply_to)
+            payload["settings"]["template_id"] = self.template_id
+            response = self._api_call("campaigns.create", self.mailchimp_client.campaigns.create, payload)
+            campaign_id = response.get('id')
+            try:
+                content = self._api_call("campaigns.get_content", self.mailchimp_client.campaigns.get_content,
+                                         campaign_id, idempotent=True)
+            finally:
+                self._api_call("campaigns.remove", self.mailchimp_client.campaigns.remove, campaign_id,
+                               idempotent=True)
         except ApiClientError as error:
-            logger.error(f"Error creating segment for group {listings_hash}: {error.text}")
+            logger.error(f"❌ Could not render template {self.template_id}: {error.text}")
             return None
 
+        template_html = content.get("html", "")
+        if "*|TEMP_HTML|*" not in template_html:
+            logger.warning(f"Template {self.template_id} has no *|TEMP_HTML|* placeholder")
+        cache.set(self.template_id, version, template_html)
+        logger.info(f"Cached HTML for template {self.template_id} (edited {version})")
+        return template_html
+
     def _send_campaign_to_segment(self, segment_id: str, listings: List[Dict], subject: str,
-                                  from_name: str, reply_to: str, group_emails: list[str], group_size: int) -> bool:
-        """Send a campaign to a specific segment using the template."""
+                                  from_name: str, reply_to: str, group_emails: list[str], group_size: int,
+                                  template_html: str) -> Optional[bool]:
+        """
+        Send a campaign to a specific segment: create, upload the filled-in template, send.
+
+        Returns True when sent, False when nothing went out (a draft left behind is removed), None when
+        the send failed and the campaign status could not be confirmed.
+        """
+        listing_count = len(listings)
+        html = template_html.replace("*|TEMP_HTML|*", self._generate_listings_html(listings))
+
+        campaign_payload = self._campaign_payload(
+            segment_id,
+            f"{subject} - {listing_count} New Listing{'s' if listing_count != 1 else ''}",
+            f"Business Alerts Group - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ({group_size} recipients)",
+            from_name, reply_to)
+
         try:
-            # Generate HTML for the matched listings
-            listings_html = self._generate_listings_html(listings)
-            listing_count = len(listings)
-
-            # Create campaign
-            campaign_payload = {
-                "type": "regular",
-                "recipients": {
-                    "list_id": self.list_id,
-                    "segment_opts": {"saved_segment_id": segment_id}
-                },
-                "settings": {
-                    "subject_line": f"{subject} - {listing_count} New Listing{'s' if listing_count != 1 else ''}",
-                    "title": f"Business Alerts Group - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ({group_size} recipients)",
-                    "from_name": from_name,
-                    "reply_to": reply_to,
-                    "template_id": self.template_id
-                }
-            }
+            response = self._api_call("campaigns.create", self.mailchimp_client.campaigns.create, campaign_payload)
+        except ApiClientError as error:
+            logger.error(f"❌ Campaign error for segment {segment_id}: {self._error_detail(error)}")
+            return False
+        campaign_id = response.get('id') if isinstance(response, dict) else None
+        if not campaign_id:
+            logger.error(f"❌ Campaign error for segment {segment_id}: no campaign id in {response}")
+            return False
 
-            response = self.mailchimp_client.campaigns.create(campaign_payload)
-            campaign_id = response.get('id')
+        if not self._set_campaign_content(campaign_id, html):
+            self._remove_campaign(campaign_id)
+            return False
 
-            existing_content = self.mailchimp_client.campaigns.get_content(campaign_id)
-            template_html = existing_content.get("html", "")
+        sent = self._send_prepared_campaign(campaign_id)
+        if sent:
+            logger.info(f"✅ Sent campaign {campaign_id} to segment {segment_id} ({group_size} recipients)")
+        return sent
 
-            # Step B: replace placeholder
-            updated_html = template_html.replace("*|TEMP_HTML|*", listings_html)
-            self.mailchimp_client.campaigns.remove(campaign_id)
+    def _dispatch_group(self, segments: SegmentManager, listings_hash: str, group_emails: List[str],
+                        group_listings: List[Dict], subject: str, from_name: str, reply_to: str,
+                        template_html: str) -> Tuple[Optional[str], Optional[int]]:
+        """
+        Prepare the group's segment and send its campaign; returns (segment id, emails sent).
 
-            campaign_payload['settings'].pop('template_id')
+        Emails sent is 0 when nothing went out (safe to retry) and None when the outcome is unknown.
+        """
+        logger.info(
+            f"Processing group {listings_hash}: {len(group_emails)} subscribers, {len(group_listings)} listings")
+
+        # Reused, recycled or new segment holding exactly this group
+        segment_id = segments.segment_for_group(listings_hash, group_emails)
+        if not segment_id:
+            return None, 0
+
+        # Send campaign to segment
+        sent = self._send_campaign_to_segment(segment_id, group_listings, subject,
+                                              from_name, reply_to, group_emails, len(group_emails), template_html)
+        if sent is None:
+            return segment_id, None
+        return segment_id, len(group_emails) if sent else 0
+
+    def _choose_dispatch_mode(self, group_count: int) -> str:
+        if self.dispatch_mode in DISPATCH_MODES:
+            return self.dispatch_mode
+        if group_count <= 1:
+            return "sync"
+        if group_count < self.batch_min_groups:
+            return "parallel"
+        return "batch"
+
+    def _dispatch_parallel(self, segments: SegmentManager, groups: Dict[str, Tuple[List[str], List[Dict]]],
+                           subject: str, from_name: str, reply_to: str, template_html: str,
+                           workers: int) -> Tuple[int, int, Dict[str, Tuple[List[str], List[Dict]]]]:
+        """
+        Send the groups on `workers` threads; the shared throttle keeps us inside Mailchimp's limits.
 
-            print(f"new campaign_payload: {campaign_payload}")
+        Returns (emails sent, groups sent, groups nothing was sent to, which the caller may retry).
+        """
+        emails_sent = 0
+        groups_processed = 0
+        failed = {}
 
-            response = self.mailchimp_client.campaigns.create(campaign_payload)
-            campaign_id = response.get('id')
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(groups)))) as executor:
+            future_to_group = {
+                executor.submit(self._dispatch_group, segments, listings_hash, group_emails, group_listings,
+                                subject, from_name, reply_to, template_html): listings_hash
+                for listings_hash, (group_emails, group_listings) in groups.items()
+            }
+            for future in as_completed(future_to_group):
+                listings_hash = future_to_group[future]
+                try:
+                    _, sent = future.result()
+                except Exception as error:
+                    logger.error(f"Dispatch failed for group {listings_hash}: {self._error_detail(error)}")
+                    sent = 0
+                if sent:
+                    emails_sent += sent
+                    groups_processed += 1
+                elif sent is None:
+                    logger.error(f"❌ Group {listings_hash} may not have been sent, check its campaign in Mailchimp")
+                else:
+                    failed[listings_hash] = groups[listings_hash]
+        return emails_sent, groups_processed, failed
 
-            # Step C: upload updated HTML
-            self.mailchimp_client.campaigns.set_content(campaign_id, {"html": updated_html})
-
-            # Set content using template
-            # content_payload = {
-            #     "template": {
-            #         "id": self.template_id,
-            #         "sections": {
-            #             "temp_html": listings_html,
-            #         }
-            #     }
-            # }
-            #
-            # self.mailchimp_client.campaigns.set_content(campaign_id, content_payload)
-            self.mailchimp_client.campaigns.send(campaign_id)
+    @staticmethod
+    def _error_detail(error: Exception) -> str:
+        """Loggable detail; str() of an ApiClientError is empty"""
+        if isinstance(error, ApiClientError):
+            return f"{getattr(error, 'status_code', None)} {getattr(error, 'text', '')}"
+        return str(error) or error.__class__.__name__
 
-            logger.info(f"✅ Sent campaign {campaign_id} to segment {segment_id} ({group_size} recipients)")
+    def _set_campaign_content(self, campaign_id: str, html: str) -> bool:
+        try:
+            self._api_call("campaigns.set_content", self.mailchimp_client.campaigns.set_content,
+                           campaign_id, {"html": html}, idempotent=True)
             return True
-
         except ApiClientError as error:
-            logger.error(f"❌ Campaign error for segment {segment_id}: {error.text}")
+            logger.error(f"❌ Content error for campaign {campaign_id}: {self._error_detail(error)}")
             return False
 
-    def _cleanup_segment(self, segment_id: str) -> None:
-        """Clean up segment after campaign is sent."""
+    def _remove_campaign(self, campaign_id: str) -> None:
         try:
-            # Wait a bit before cleanup to ensure campaign is processed
-            import time
-            time.sleep(2)
+            self._api_call("campaigns.remove", self.mailchimp_client.campaigns.remove, campaign_id, idempotent=True)
+        except ApiClientError as error:
+            logger.warning(f"Could not remove draft campaign {campaign_id}: {self._error_detail(error)}")
+
+    def _send_prepared_campaign(self, campaign_id: str) -> Optional[bool]:
+        """
+        Send a campaign that already has its content
 
-            self.mailchimp_client.lists.delete_segment(self.list_id, segment_id)
-            logger.info(f"Cleaned up segment {segment_id}")
+        Mailchimp sends a campaign at most once, so the send is retried like an idempotent call; when it
+        is still refused, the campaign status tells whether an earlier attempt went out after all.
+        Returns True when sent, False when it is still a draft (the draft is removed), None when the
+        status could not be read.
+        """
+        try:
+            self._api_call("campaigns.send", self.mailchimp_client.campaigns.send, campaign_id, idempotent=True)
+            return True
         except ApiClientError as error:
-            logger.warning(f"Could not cleanup segment {segment_id}: {error.text}")
+            send_error = self._error_detail(error)
+        try:
+            campaign = self._api_call("campaigns.get", self.mailchimp_client.campaigns.get, campaign_id,
+                                      fields=["id", "status"], idempotent=True)
+        except ApiClientError as error:
+            logger.error(f"❌ Send error for campaign {campaign_id}: {send_error}; status unknown: "
+                         f"{self._error_detail(error)}")
+            return None
+        if campaign.get('status') in ('sending', 'sent'):
+            return True
+        logger.error(f"❌ Send error for campaign {campaign_id}: {send_error}")
+        if campaign.get('status') == 'save':
+            self._remove_campaign(campaign_id)
+            return False
+        return None
+
+    @staticmethod
+    def _batch_failures(results: Dict[str, Tuple[int, Dict]], prefix: str) -> Dict[str, str]:
+        """listings hash -> error detail for the failed operations of one phase"""
+        failures = {}
+        for operation_id, (status, body) in results.items():
+            if operation_id.startswith(prefix) and not 200 <= status < 300:
+                failures[operation_id.split(':')[1]] = f"{status} {body.get('detail') or body.get('title', '')}"
+        return failures
+
+    def _dispatch_batch(self, segments: SegmentManager, groups: Dict[str, Tuple[List[str], List[Dict]]],
+                        subject: str, from_name: str, reply_to: str,
+                        template_html: str) -> Tuple[int, int, Dict[str, Tuple[List[str], List[Dict]]]]:
+        """
+        Send the groups through /batches in four phases: segments, campaigns, content, send.
+
+        Each phase needs ids from the one before, so phases run one after the other; the email bodies
+        are rendered while the segment batch runs. Content uploads and sends that fail in the batch are
+        retried one by one. Returns (emails sent, groups sent, groups left for another backend: nothing
+        was sent to them because the batch pipeline broke down early or their operations failed before
+        the send).
+        """
+        runner = MailchimpBatchRunner(self.mailchimp_client, self._api_call,
+                                      timeout=float(os.getenv("MAILCHIMP_BATCH_TIMEOUT", 1800)))
+        # Groups nothing was sent to, for the caller to send another way
+        remaining = {}
+        try:
+            # Phase 1: segments
+            segment_ids: Dict[str, Optional[str]] = {}
+            operations = []
+            for listings_hash, (group_emails, _) in groups.items():
+                try:
+                    segment_ids[listings_hash], group_operations = segments.segment_operations(listings_hash,
+                                                                                               group_emails)
+                    operations.extend(group_operations)
+                except ApiClientError as error:
+                    logger.error(f"Error preparing segment for group {listings_hash}: {self._error_detail(error)}")
+                    remaining[listings_hash] = groups[listings_hash]
+            pending_segments = runner.run_async(operations)
+
+            # Render while Mailchimp works through the segments
+            bodies = {listings_hash: template_html.replace("*|TEMP_HTML|*", self._generate_listings_html(listings))
+                      for listings_hash, (_, listings) in groups.items()}
+
+            results = pending_segments.result()
+            for listings_hash, detail in self._batch_failures(results, "segment:").items():
+                logger.warning(f"Segment error for group {listings_hash}: {detail}")
+                segment_ids.pop(listings_hash, None)
+                remaining[listings_hash] = groups[listings_hash]
+            for listings_hash, detail in self._batch_failures(results, "members:").items():
+                logger.warning(f"Segment members error for group {listings_hash}: {detail}")
+                if segment_ids.get(listings_hash):
+                    segments.forget_segment(segment_ids[listings_hash])
+                segment_ids.pop(listings_hash, None)
+                remaining[listings_hash] = groups[listings_hash]
+
+            ready = {}
+            for listings_hash, segment_id in segment_ids.items():
+                if segment_id is None:
+                    _, body = results.get(f"segment:{listings_hash}", (0, {}))
+                    segment_id = body.get('id')
+                    if not segment_id:
+                        remaining[listings_hash] = groups[listings_hash]
+                        continue
+                group_emails = sorted({email.lower() for email in groups[listings_hash][0]})
+                ready[listings_hash] = segments.record_segment(listings_hash, segment_id, group_emails)
+        except Exception as error:
+            logger.error(f"❌ Segment batch failed: {self._error_detail(error)}")
+            runner.close()
+            return 0, 0, groups
+
+        try:
+            # Phase 2: campaigns
+            campaign_ids = {}
+            operations = []
+            for listings_hash, segment_id in ready.items():
+                group_emails, listings = groups[listings_hash]
+                listing_count = len(listings)
+                payload = self._campaign_payload(
+                    segment_id,
+                    f"{subject} - {listing_count} New Listing{'s' if listing_count != 1 else ''}",
+                    f"Business Alerts Group - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} "
+                    f"({len(group_emails)} recipients)",
+                    from_name, reply_to)
+                operations.append({"method": "POST", "path": "/campaigns",
+                                   "operation_id": f"campaign:{listings_hash}", "body": json.dumps(payload)})
+            results = runner.run(operations)
+            for listings_hash in ready:
+                status, body = results.get(f"campaign:{listings_hash}", (0, {}))
+                if 200 <= status < 300 and body.get('id'):
+                    campaign_ids[listings_hash] = body['id']
+                else:
+                    logger.warning(f"Campaign error for group {listings_hash}: {status} "
+                                   f"{body.get('detail') or body.get('title', '')}")
+                    remaining[listings_hash] = groups[listings_hash]
+
+            # Phase 3: content; PUT is idempotent, so the batch submit and failed uploads are retried
+            operations = [{"method": "PUT", "path": f"/campaigns/{campaign_id}/content",
+                           "operation_id": f"content:{listings_hash}",
+                           "body": json.dumps({"html": bodies[listings_hash]})}
+                          for listings_hash, campaign_id in campaign_ids.items()]
+            results = runner.run(operations, idempotent=True)
+        except Exception as error:
+            # Nothing has been sent yet; drop the drafts so the fallback's campaigns are the only ones
+            logger.error(f"❌ Campaign batch failed: {self._error_detail(error)}")
+            runner.close()
+            for campaign_id in campaign_ids.values():
+                self._remove_campaign(campaign_id)
+            return 0, 0, groups
+
+        for listings_hash, detail in self._batch_failures(results, "content:").items():
+            logger.warning(f"Content error for group {listings_hash}: {detail}, retrying directly")
+            if not self._set_campaign_content(campaign_ids[listings_hash], bodies[listings_hash]):
+                # Nothing was sent to this group; drop the draft and let the caller send it another way
+                self._remove_campaign(campaign_ids.pop(listings_hash))
+                remaining[listings_hash] = groups[listings_hash]
+
+        # Phase 4: send. Mailchimp never sends a campaign twice, so a failed submit or send operation is
+        # retried per campaign; a group is never handed back once its campaign may have gone out
+        emails_sent = 0
+        groups_processed = 0
+        unsent = dict(campaign_ids)
+        try:
+            operations = [{"method": "POST", "path": f"/campaigns/{campaign_id}/actions/send",
+                           "operation_id": f"send:{listings_hash}"}
+                          for listings_hash, campaign_id in campaign_ids.items()]
+            results = runner.run(operations, idempotent=True)
+            for listings_hash, campaign_id in campaign_ids.items():
+                status, body = results.get(f"send:{listings_hash}", (0, {}))
+                if 200 <= status < 300:
+                    unsent.pop(listings_hash)
+                    emails_sent += len(groups[listings_hash][0])
+                    groups_processed += 1
+                    logger.info(f"✅ Sent campaign {campaign_id} to segment {ready[listings_hash]}")
+                else:
+                    logger.warning(f"Send error for group {listings_hash}: {status} "
+                                   f"{body.get('detail') or body.get('title', '')}, retrying directly")
+        except Exception as error:
+            logger.warning(f"Send batch failed, sending {len(unsent)} campaigns directly: {self._error_detail(error)}")
+        finally:
+            runner.close()
+
+        if unsent:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_connections, len(unsent)))) as executor:
+                future_to_group = {executor.submit(self._send_prepared_campaign, campaign_id): listings_hash
+                                   for listings_hash, campaign_id in unsent.items()}
+                for future in as_completed(future_to_group):
+                    listings_hash = future_to_group[future]
+                    sent = future.result()
+                    if sent:
+                        emails_sent += len(groups[listings_hash][0])
+                        groups_processed += 1
+                        logger.info(f"✅ Sent campaign {unsent[listings_hash]} to segment {ready[listings_hash]}")
+                    elif sent is False:
+                        # Its draft was removed; nothing went out, so another backend may send it
+                        remaining[listings_hash] = groups[listings_hash]
+        return emails_sent, groups_processed, remaining
 
     # -----------------------------
     # Main notification method
@@ -398,18 +650,56 @@ class MailchimpNotifier:
                cleanup_segments: bool = True,
                use_mongo_subscribers: bool = True) -> Dict[str, int]:
         """Send notifications by grouping subscribers with identical matches into segments."""
+        self._check_config(list_id)
+        listings = filtered_listing_details or []
+        return self._send_matches(self._match_listings(listings), listings, subject, from_name, reply_to,
+                                  cleanup_segments)
+
+    def collect(self, listings: List[Dict]) -> int:
+        """
+        Match one batch of a streamed run now and hold the matches for notify_collected()
+
+        Lets the match stage keep up with the crawl while every subscriber still gets a single campaign
+        for the whole run. Returns the number of subscribers the batch matched.
+        """
+        matches = self._match_listings(listings)
+        with self._collect_lock:
+            for email, matched in matches.items():
+                self._collected_matches.setdefault(email, []).extend(matched)
+            self._collected_listings.extend(listings)
+        return len(matches)
+
+    def notify_collected(self,
+                         list_id: Optional[str] = None,
+                         subject: str = "New BizBuySell Listings",
+                         from_name: str = "BizBuySell Alerts",
+                         reply_to: str = "trent@fcbb.com",
+                         cleanup_segments: bool = True) -> Dict[str, int]:
+        """Send one campaign per subscriber group for everything collect() matched, then start over."""
+        self._check_config(list_id)
+        with self._collect_lock:
+            matches, listings = self._collected_matches, self._collected_listings
+            self._collected_matches, self._collected_listings = {}, []
+        return self._send_matches(matches, listings, subject, from_name, reply_to, cleanup_segments)
+
+    def _check_config(self, list_id: Optional[str]) -> None:
         if not self.api_key:
             raise RuntimeError("MAILCHIMP_API_KEY is not set.")
-
-        list_id = list_id or self.list_id
-        if not list_id:
+        if not (list_id or self.list_id):
             raise RuntimeError("MAILCHIMP_LIST_ID is not set.")
 
-        # Get subscribers and find matches
-
-        subscribers = self.fetch_subscribers_from_mongo()
-        matches = self.match_subscribers_to_listings_mongo(subscribers, filtered_listing_details)
+    def _match_listings(self, listings: List[Dict]) -> Dict[str, List[Dict]]:
+        # Compiled subscriber preferences, caught up from the change stream / watermark
+        try:
+            criteria = get_subscriber_cache().refresh()
+        except Exception as error:
+            logger.error(f"Error loading subscribers from MongoDB: {error}")
+            criteria = []
+        logger.info(f"Matching {len(listings)} listings against {len(criteria)} subscribers")
+        return self._match_with_trace(criteria, listings)
 
+    def _send_matches(self, matches: Dict[str, List[Dict]], listings: List[Dict], subject: str, from_name: str,
+                      reply_to: str, cleanup_segments: bool) -> Dict[str, int]:
         if not matches:
             logger.info("No matched subscribers for recent listings.")
             return {"matched_subscribers": 0, "emails_sent": 0, "groups_created": 0}
@@ -420,39 +710,55 @@ class MailchimpNotifier:
         groups = self.group_subscribers_by_matches(matches)
         logger.info(f"Grouped subscribers into {len(groups)} segments based on identical matches")
 
-        # Send campaigns to each group
-        emails_sent = 0
-        groups_processed = 0
-        created_segments = []
-
-        for listings_hash, (group_emails, group_listings) in groups.items():
-            logger.info(
-                f"Processing group {listings_hash}: {len(group_emails)} subscribers, {len(group_listings)} listings")
-
-            # Create segment for this group
-            segment_id = self._create_segment_for_group(group_emails, listings_hash)
-            if not segment_id:
-                continue
-
-            created_segments.append(segment_id)
-
-            # Send campaign to segment
-            if self._send_campaign_to_segment(segment_id, group_listings, subject,
-                                              from_name, reply_to, group_emails, len(group_emails)):
-                emails_sent += len(group_emails)
-                groups_processed += 1
-
-        # Optional cleanup of segments
-        # if cleanup_segments:
-        #     logger.info("Cleaning up segments...")
-        #     for segment_id in created_segments:
-        #         self._cleanup_segment(segment_id)
+        self.card_renderer.prepare(listings)
+        template_html = self._load_template_html(from_name, reply_to)
+        if template_html is None:
+            return {"matched_subscribers": len(matches), "emails_sent": 0, "groups_created": 0}
+
+        segments = SegmentManager(self.mailchimp_client, self.list_id, self._api_call,
+                                  stale_after_seconds=float(os.getenv("SEGMENT_STALE_DAYS", 7)) * 24 * 3600,
+                                  max_spare=int(os.getenv("SEGMENT_MAX_SPARE", 50)))
+        segments.plan(groups.keys())
+
+        mode = self._choose_dispatch_mode(len(groups))
+        logger.info(f"Dispatching {len(groups)} groups in {mode} mode")
+        if mode == "batch":
+            emails_sent, groups_processed, remaining = self._dispatch_batch(segments, groups, subject, from_name,
+                                                                            reply_to, template_html)
+            failed = {}
+            if remaining:
+                logger.warning(f"Batch dispatch left {len(remaining)} groups unsent, sending them in parallel")
+                sent, processed, failed = self._dispatch_parallel(segments, remaining, subject, from_name, reply_to,
+                                                                  template_html, self.max_connections)
+                emails_sent += sent
+                groups_processed += processed
+            workers = self.max_connections
+        else:
+            workers = 1 if mode == "sync" else self.max_connections
+            emails_sent, groups_processed, failed = self._dispatch_parallel(segments, groups, subject, from_name,
+                                                                            reply_to, template_html, workers)
+
+        if failed:
+            # Nothing was sent to these groups (drafts were removed), so one more pass cannot double-send
+            logger.warning(f"Retrying {len(failed)} groups that were not sent")
+            sent, processed, failed = self._dispatch_parallel(segments, failed, subject, from_name, reply_to,
+                                                              template_html, workers)
+            emails_sent += sent
+            groups_processed += processed
+        if failed:
+            logger.error(f"❌ {len(failed)} groups were not sent: {', '.join(sorted(failed))}")
+
+        segments.save()
+        if cleanup_segments:
+            # Stale segments are deleted in the background; the send is already done
+            segments.collect_garbage_async()
 
         logger.info(f"Sent emails to {emails_sent} subscribers across {groups_processed} segments")
         return {
             "matched_subscribers": len(matches),
             "emails_sent": emails_sent,
             "groups_created": groups_processed,
+            "groups_failed": len(failed),
             "success_rate": f"{(emails_sent / len(matches) * 100):.1f}%" if matches else "0%"
         }
 
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+One-off migration: convert string scraped_date values in bizbuysell-data to BSON datetimes
+Resumable: walks documents in _id order in chunks and checkpoints the last converted _id after every bulk write
+"""
+
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+
+from helpers.mongo import LISTINGS_COLLECTION, ensure_indexes, get_collection
+
+CHECKPOINT_FILE = ".scraped_date_migration.json"
+LEGACY_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_legacy_date(value: str, source_tz) -> Optional[datetime]:
+    """Parse a legacy scraped_date string (written with datetime.now() on the worker) into aware UTC"""
+    try:
+        parsed = datetime.strptime(value.strip(), LEGACY_DATE_FORMAT)
+    except ValueError:
+        try:
+            parsed = datetime.fromisoformat(value.strip())
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=source_tz)
+    return parsed.astimezone(timezone.utc)
+
+
+def load_checkpoint() -> Optional[ObjectId]:
+    try:
+        with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+            return ObjectId(json.load(f)['last_id'])
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Ignoring unreadable checkpoint {CHECKPOINT_FILE}: {e}")
+        return None
+
+
+def save_checkpoint(last_id: ObjectId, converted: int, skipped: int) -> None:
+    with open(CHECKPOINT_FILE, 'w', encoding='utf-8') as f:
+        json.dump({'last_id': str(last_id), 'converted': converted, 'skipped': skipped,
+                   'updated_at': datetime.now(timezone.utc).isoformat()}, f)
+
+
+def migrate(batch_size: int = 500, source_tz_name: str = 'UTC') -> int:
+    """Convert every remaining string scraped_date; returns the number of documents converted"""
+    logger = logging.getLogger(__name__)
+    col = get_collection(LISTINGS_COLLECTION)
+    source_tz = ZoneInfo(source_tz_name)
+
+    last_id = load_checkpoint()
+    if last_id:
+        logger.info(f"Resuming after _id {last_id}")
+
+    remaining = col.count_documents({'scraped_date': {'$type': 'string'}})
+    logger.info(f"🚀 Migrating scraped_date on {remaining} documents (batches of {batch_size}, source tz {source_tz_name})")
+
+    converted = skipped = 0
+    while True:
+        query = {'scraped_date': {'$type': 'string'}}
+        if last_id:
+            query['_id'] = {'$gt': last_id}
+        batch = list(col.find(query, {'scraped_date': 1}).sort('_id', ASCENDING).limit(batch_size))
+        if not batch:
+            break
+
+        ops = []
+        for doc in batch:
+            scraped_date = parse_legacy_date(doc['scraped_date'], source_tz)
+            if scraped_date is None:
+                # Left as-is; the checkpoint moves past it so it is not retried forever
+                logger.warning(f"Unparseable scraped_date on {doc['_id']}: {doc['scraped_date']!r}")
+                skipped += 1
+                continue
+            # Guard on the old value so a concurrent re-scrape is never overwritten
+            ops.append(UpdateOne({'_id': doc['_id'], 'scraped_date': doc['scraped_date']},
+                                 {'$set': {'scraped_date': scraped_date}}))
+
+        if ops:
+            result = col.bulk_write(ops, ordered=False)
+            converted += result.modified_count
+
+        last_id = batch[-1]['_id']
+        save_checkpoint(last_id, converted, skipped)
+        logger.info(f"Converted {converted}/{remaining} (skipped {skipped}), checkpoint {last_id}")
+
+    logger.info(f"✅ Migration finished: {converted} converted, {skipped} skipped")
+    return converted
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    try:
+        migrate(batch_size=int(os.getenv('MIGRATION_BATCH_SIZE', 500)),
+                source_tz_name=os.getenv('SCRAPED_DATE_SOURCE_TZ', 'UTC'))
+        # The 24h window now compares datetimes; make sure it is index-backed
+        ensure_indexes()
+        return True
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Migration failed: {e}", exc_info=True)
+        return False
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,131 @@
+"""
+Listing card HTML for alert emails
+Each listing's card is rendered once per run (escaped) and cached by listing id + content hash, so a
+group's email body is just its cached cards joined together
+"""
+
+import hashlib
+import html
+import threading
+from typing import Dict, List, Tuple
+
+CARD_FIELDS = ('title', 'asking_price', 'cashflow', 'broker_name', 'broker_phone', 'description', 'url', 'listing_url')
+
+DESCRIPTION_MAX_CHARS = 300
+
+LISTING_CARD_TEMPLATE = """
+        <div style="margin-bottom: 30px; padding: 20px; border: 2px solid #e0e0e0; border-radius: 8px; background-color: #fafafa;">
+            <div style="margin-bottom: 15px;">
+                <p style="text-align: left; margin: 0 0 5px 0; font-weight: bold; color: #007cba; font-size: 16px;">TITLE</p>
+                <p style="text-align: left; margin: 0 0 15px 0; font-size: 18px; font-weight: bold; color: #333;">{title}</p>
+            </div>
+            <div style="margin-bottom: 15px;">
+                <p style="text-align: left; margin: 0 0 5px 0; font-weight: bold; color: #007cba; font-size: 16px;">ASKING PRICE</p>
+                <p style="text-align: left; margin: 0 0 15px 0; font-size: 16px; color: #333; font-weight: bold;">{asking_price}</p>
+            </div>
+            <div style="margin-bottom: 15px;">
+                <p style="text-align: left; margin: 0 0 5px 0; font-weight: bold; color: #007cba; font-size: 16px;">Sellers Discretionary Earnings (SDE):</p>
+                <p style="text-align: left; margin: 0 0 15px 0; font-size: 16px; color: #333;">{cash_flow}</p>
+            </div>
+            <div style="margin-bottom: 15px;">
+                <p style="text-align: left; margin: 0 0 5px 0; font-weight: bold; color: #007cba; font-size: 16px;">BROKER'S NAME</p>
+                <p style="text-align: left; margin: 0 0 15px 0; font-size: 16px; color: #333;">{broker_name}</p>
+            </div>
+            <div style="margin-bottom: 15px;">
+                <p style="text-align: left; margin: 0 0 5px 0; font-weight: bold; color: #007cba; font-size: 16px;">BROKER'S PHONE</p>
+                <p style="text-align: left; margin: 0 0 15px 0; font-size: 16px; color: #333;">{broker_phone}</p>
+            </div>
+            <div style="margin-bottom: 15px;">
+                <p style="text-align: left; margin: 0 0 5px 0; font-weight: bold; color: #007cba; font-size: 16px;">DESCRIPTION</p>
+                <p style="text-align: left; margin: 0 0 15px 0; font-size: 14px; color: #333; line-height: 1.4;">{description}</p>
+            </div>
+            <div style="margin-bottom: 0;">
+                <p style="text-align: left; margin: 0; font-size: 16px;">
+                    <a href="{listing_url}" target="_blank" style="color: #007cba; text-decoration: none; font-weight: bold;">View Full Details →</a>
+                </p>
+            </div>
+        </div>
+        """
+
+NUMBERED_CARD_TEMPLATE = """
+            <div style="margin-bottom: 20px;">
+                <h2 style="color: #007cba; font-size: 20px; margin: 0 0 10px 0;">Business Opportunity #{number}</h2>
+                {card}
+            </div>
+            """
+
+NO_LISTINGS_HTML = """
+            <div style="text-align: center; padding: 20px; background-color: #f9f9f9; border-radius: 5px;">
+                <p style="color: #666; font-size: 16px; margin: 0;">No new listings match your criteria at this time.</p>
+                <p style="color: #666; font-size: 14px; margin: 10px 0 0 0;">We'll notify you when new opportunities become available!</p>
+            </div>
+            """
+
+
+def _text(value) -> str:
+    return html.escape(str(value if value is not None else 'N/A'))
+
+
+def _href(value) -> str:
+    """Only http(s) links make it into the email"""
+    url = str(value or '').strip()
+    if not url.lower().startswith(('http://', 'https://')):
+        return '#'
+    return html.escape(url, quote=True)
+
+
+def render_listing_card(listing: Dict) -> str:
+    """Escaped HTML card for one listing"""
+    description = str(listing.get('description', 'N/A'))
+    if len(description) > DESCRIPTION_MAX_CHARS:
+        description = description[:DESCRIPTION_MAX_CHARS] + "..."
+
+    return LISTING_CARD_TEMPLATE.format(
+        title=_text(listing.get('title', 'N/A')),
+        asking_price=_text(listing.get('asking_price', 'N/A')),
+        cash_flow=_text(listing.get('cashflow', 'N/A')),
+        broker_name=_text(listing.get('broker_name', 'N/A')),
+        broker_phone=_text(listing.get('broker_phone', 'N/A')),
+        description=_text(description),
+        listing_url=_href(listing.get('url') or listing.get('listing_url')),
+    )
+
+
+class ListingCardRenderer:
+    """Renders each listing's card once per run and joins cached cards per group"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cards: Dict[Tuple[str, str], str] = {}
+        self.rendered = 0
+
+    @staticmethod
+    def cache_key(listing: Dict) -> Tuple[str, str]:
+        """(listing id or url, hash of the fields the card shows)"""
+        identity = str(listing.get('listing_id') or listing.get('url') or listing.get('listing_url') or '')
+        content = '\x1f'.join(str(listing.get(field, '')) for field in CARD_FIELDS)
+        return identity, hashlib.md5(content.encode('utf-8')).hexdigest()
+
+    def card(self, listing: Dict) -> str:
+        # Keyed on content every time, so a listing edited mid-run gets a fresh card
+        key = self.cache_key(listing)
+        card = self._cards.get(key)
+        if card is None:
+            card = render_listing_card(listing)
+            with self._lock:
+                card = self._cards.setdefault(key, card)
+                self.rendered += 1
+        return card
+
+    def prepare(self, listings: List[Dict]) -> None:
+        """Render every listing of the batch up front, before groups are dispatched concurrently"""
+        for listing in listings:
+            self.card(listing)
+
+    def render(self, listings: List[Dict]) -> str:
+        """Numbered cards for one group's listings"""
+        if not listings:
+            return NO_LISTINGS_HTML
+        return "".join(NUMBERED_CARD_TEMPLATE.format(number=number, card=self.card(listing))
+                       for number, listing in enumerate(listings, 1))
+
@@ -0,0 +1,57 @@
+import logging
+import time
+
+from listing_detail_scraper import ListingDetailScraper, ScrapeOutcome
+
+
+class FakeEnricher:
+    def enrich(self, details):
+        return details
+
+
+def make_scraper(delays, task_timeout, run_deadline=None, max_concurrent=4):
+    """A scraper whose listings take `delays[url]` seconds each and are never saved anywhere"""
+    scraper = ListingDetailScraper.__new__(ListingDetailScraper)
+    scraper.logger = logging.getLogger(__name__)
+    scraper.max_concurrent = max_concurrent
+    scraper.task_timeout = task_timeout
+    scraper.run_deadline = run_deadline
+    scraper.enricher = FakeEnricher()
+    scraper._save_details_to_mongo = len
+
+    def scrape_listing(url_data):
+        url = url_data['url']
+        time.sleep(delays[url])
+        return ScrapeOutcome(url, ScrapeOutcome.SUCCESS, detail={'url': url}, elapsed=delays[url])
+
+    scraper.scrape_listing = scrape_listing
+    return scraper
+
+
+def run(scraper, urls):
+    outcomes = []
+    details = scraper._process_urls_threaded([{'url': url} for url in urls], on_outcome=outcomes.append)
+    return details, {outcome.url: outcome.status for outcome in outcomes}, len(outcomes)
+
+
+def test_late_result_before_the_run_deadline_is_kept():
+    scraper = make_scraper({'fast': 0.05, 'slow': 0.6}, task_timeout=0.2, run_deadline=3)
+
+    details, statuses, emitted = run(scraper, ['fast', 'slow'])
+
+    assert statuses == {'fast': ScrapeOutcome.SUCCESS, 'slow': ScrapeOutcome.SUCCESS}
+    assert emitted == 2
+    assert sorted(detail['url'] for detail in details) == ['fast', 'slow']
+
+
+def test_straggler_is_a_timeout_past_the_run_deadline():
+    scraper = make_scraper({'fast': 0.05, 'slow': 2.0}, task_timeout=0.2, run_deadline=0.5)
+
+    started = time.monotonic()
+    details, statuses, emitted = run(scraper, ['fast', 'slow'])
+
+    assert time.monotonic() - started < 1.5
+    assert statuses == {'fast': ScrapeOutcome.SUCCESS, 'slow': ScrapeOutcome.TIMEOUT}
+    assert emitted == 2
+    assert [detail['url'] for detail in details] == ['fast']
+
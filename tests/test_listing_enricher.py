@@ -0,0 +1,53 @@
+import json
+from types import SimpleNamespace
+
+from listing_enricher import ListingEnricher
+
+
+class FakeCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value):
+        self.entries[key] = value
+
+
+class FakeGazetteer:
+    def parse(self, location):
+        return {'city': 'austin', 'state': 'texas'} if location else None
+
+    def learn(self, city, state):
+        pass
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.items = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **kwargs):
+        prompt = messages[-1]['content']
+        items = json.loads(prompt.split('Items:', 1)[1].split('Return ONLY', 1)[0])
+        self.items.extend(items)
+        # Never answers validly, so every item it sees is retried
+        content = json.dumps({'results': []})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def test_listings_without_original_category_never_reach_the_llm():
+    client = FakeOpenAI()
+    enricher = ListingEnricher(client, ['Retail'], FakeCache(), FakeGazetteer(), max_retries=2)
+    details = [{'original_category': '', 'location': 'Austin, TX'},
+               {'original_category': 'Bakery', 'location': 'Austin, TX'}]
+
+    enricher.enrich(details)
+
+    assert details[0]['category'] == []
+    assert details[0]['state'] == 'texas'
+    assert details[1]['category'] == ['Bakery']
+    assert all(item.get('original_category') == 'Bakery' for item in client.items)
+    # One first attempt plus two retry rounds, for the categorisable listing only
+    assert len(client.items) == 3
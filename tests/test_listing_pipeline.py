@@ -0,0 +1,55 @@
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from listing_detail_scraper import ScrapeOutcome
+from listing_pipeline import ListingPipeline
+
+
+class FakeEnricher:
+    def enrich(self, batch):
+        pass
+
+
+class FakeScraper:
+    """Scrapes every URL successfully; the MongoDB write fails as configured"""
+
+    max_concurrent = 2
+
+    def __init__(self, fail_urls=(), fail_all=False):
+        self.enricher = FakeEnricher()
+        self.fail_urls = set(fail_urls)
+        self.fail_all = fail_all
+
+    def scrape_listing(self, url_data):
+        return ScrapeOutcome(url_data['url'], ScrapeOutcome.SUCCESS, {'url': url_data['url']})
+
+    def _save_details_to_mongo(self, details, raise_errors=False):
+        if self.fail_all:
+            raise PyMongoError("connection reset")
+        errors = [{'index': index, 'code': 2, 'errmsg': 'bad document'}
+                  for index, detail in enumerate(details) if detail['url'] in self.fail_urls]
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'writeConcernErrors': []})
+        return len(details)
+
+
+def _run(scraper, count=10):
+    matched = []
+    pipeline = ListingPipeline(scraper, on_listings=matched.extend, flush_size=3, flush_interval=0.05,
+                               notify_interval=0.05)
+    stats = pipeline.run([{'url': f'https://example.com/{i}'} for i in range(count)])
+    return stats, sorted(detail['url'] for detail in matched)
+
+
+def test_only_written_listings_are_counted_and_forwarded():
+    stats, matched = _run(FakeScraper(fail_urls={'https://example.com/3', 'https://example.com/7'}))
+    assert stats['persisted'] == 8
+    assert stats['failed'] == 2
+    assert 'https://example.com/3' not in matched and 'https://example.com/7' not in matched
+    assert len(matched) == 8
+
+
+def test_failed_flush_forwards_nothing():
+    stats, matched = _run(FakeScraper(fail_all=True))
+    assert stats['persisted'] == 0
+    assert stats['failed'] == 10
+    assert matched == []
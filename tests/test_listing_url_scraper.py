@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from helpers.proxy_pool import ProxyPool
+from helpers.retry import RetryPolicy
+from listing_url_scraper import ListingURLScraper
+
+
+def search_page(listing_ids):
+    about = [{'@type': 'ListItem',
+              'item': {'@type': 'Product', 'name': f"Listing {listing_id}",
+                       'url': f"https://www.bizbuysell.com/listing/{listing_id}/", 'productId': listing_id}}
+             for listing_id in listing_ids]
+    block = json.dumps({'@type': 'SearchResultsPage', 'about': about})
+    return f'<html><head><script type="application/ld+json">{block}</script></head><body></body></html>'
+
+
+class SearchSite:
+    """Serves /businesses-for-sale/<page> from a {page: [listing ids]} map and tracks concurrency"""
+
+    def __init__(self, pages, delay=0.1):
+        self.pages = pages
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                page_num = int(self.path.rstrip('/').rsplit('/', 1)[-1])
+                with site.lock:
+                    site.requests.append(page_num)
+                    site.in_flight += 1
+                    site.max_in_flight = max(site.max_in_flight, site.in_flight)
+                try:
+                    time.sleep(site.delay)
+                    body = search_page(site.listing_ids(page_num)).encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with site.lock:
+                        site.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/businesses-for-sale/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def listing_ids(self, page_num):
+        ids = self.pages.get(page_num, [])
+        return ids() if callable(ids) else ids
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def site_factory():
+    sites = []
+
+    def make(pages, **kwargs):
+        site = SearchSite(pages, **kwargs)
+        sites.append(site)
+        return site
+
+    yield make
+    for site in sites:
+        site.close()
+
+
+def make_scraper(site, tmp_path, **kwargs):
+    return ListingURLScraper(base_url=site.base_url, use_proxies=False,
+                             proxy_pool=ProxyPool(cache_file=str(tmp_path / 'proxies.json')),
+                             retry_policy=RetryPolicy(max_attempts=2, base_delay=0.01, deadline=5),
+                             known_urls_cache=str(tmp_path / 'known.txt'), **kwargs)
+
+
+def listing_ids_of(listings):
+    return [listing['listing_id'] for listing in listings]
+
+
+def test_crawl_merges_pages_in_order_and_respects_budget_and_concurrency(site_factory, tmp_path):
+    # 'b' shifts from page 1 to page 2 while we crawl; pages 5 and 6 are past the budget
+    site = site_factory({1: ['a', 'b'], 2: ['c', 'b'], 3: ['d', 'e'], 4: ['f'], 5: ['g'], 6: ['h']})
+    scraper = make_scraper(site, tmp_path, max_pages=4, max_concurrent=2)
+
+    listings = scraper.get_urls_only()
+
+    assert listing_ids_of(listings) == ['a', 'b', 'c', 'd', 'e', 'f']
+    assert sorted(site.requests) == [1, 2, 3, 4]
+    assert site.max_in_flight == 2
+
+
+def test_crawl_starts_at_start_page(site_factory, tmp_path):
+    site = site_factory({1: ['a'], 2: ['b'], 3: ['c'], 4: ['d']})
+    scraper = make_scraper(site, tmp_path, start_page=2, max_pages=2, max_concurrent=4)
+
+    assert listing_ids_of(scraper.get_urls_only()) == ['b', 'c']
+    assert sorted(site.requests) == [2, 3]
+
+
+def test_empty_page_is_retried_instead_of_taken_for_the_frontier(site_factory, tmp_path):
+    responses = iter([[], ['a', 'b']])
+    site = site_factory({1: lambda: next(responses, ['a', 'b']), 2: ['c']}, delay=0)
+    scraper = make_scraper(site, tmp_path, max_pages=2, max_concurrent=1, incremental=True)
+
+    listings = scraper.get_urls_only()
+
+    assert listing_ids_of(listings) == ['a', 'b', 'c']
+    assert not scraper.reached_known_frontier
+
+
+def test_page_that_stays_empty_stops_without_reaching_the_frontier(site_factory, tmp_path):
+    site = site_factory({1: ['a'], 2: []}, delay=0)
+    scraper = make_scraper(site, tmp_path, max_pages=3, max_concurrent=1, incremental=True)
+
+    listings = scraper.get_urls_only()
+
+    assert listing_ids_of(listings) == ['a']
+    assert site.requests.count(2) == 2
+    assert 3 not in site.requests
+    assert not scraper.reached_known_frontier
+
+
+def test_attempted_but_unstored_urls_count_toward_the_frontier(site_factory, tmp_path):
+    site = site_factory({1: ['new'], 2: ['stored', 'failed'], 3: ['older']}, delay=0)
+    first_run = make_scraper(site, tmp_path, max_pages=3, max_concurrent=1, incremental=True,
+                             attempted_urls_cache=str(tmp_path / 'attempted.txt'))
+    first_run.remember_urls(['https://www.bizbuysell.com/listing/stored/'])
+    first_run.remember_attempted_urls(['https://www.bizbuysell.com/listing/stored/',
+                                       'https://www.bizbuysell.com/listing/failed/'])
+
+    # A later run reloads both caches from disk
+    scraper = make_scraper(site, tmp_path, max_pages=3, max_concurrent=1, incremental=True,
+                           attempted_urls_cache=str(tmp_path / 'attempted.txt'))
+    listings = scraper.get_urls_only()
+
+    assert listing_ids_of(listings) == ['new']
+    assert scraper.reached_known_frontier
+    assert 3 not in site.requests
@@ -0,0 +1,190 @@
+import functools
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+os.environ.setdefault("MAILCHIMP_API_KEY", "test-us1")
+os.environ.setdefault("MAILCHIMP_LIST_ID", "testlist")
+os.environ.setdefault("MAILCHIMP_EMAIL_TEMPLATE_ID", "1")
+os.environ.setdefault("MONGO_DB_URI", "mongodb://127.0.0.1:27017")
+
+import mailchimp_notifier
+from fake_mailchimp import FakeMailchimpServer
+from helpers.mailchimp_batch import MailchimpBatchRunner
+from helpers.retry import RetryPolicy
+from mailchimp_marketing.api_client import ApiClientError
+from mailchimp_notifier import MailchimpNotifier
+
+GROUPS = 12
+
+
+class StaticSubscribers:
+    def __init__(self, subscribers):
+        self.criteria = MailchimpNotifier._compile_subscribers(subscribers)
+
+    def refresh(self):
+        return self.criteria
+
+
+@pytest.fixture
+def fake(monkeypatch, tmp_path):
+    # Segment and template caches are written to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(mailchimp_notifier, 'MailchimpBatchRunner',
+                        functools.partial(MailchimpBatchRunner, poll_interval=0.05))
+    subscribers = [{'email': f"subscriber{i}@example.com", 'industries': f"Industry{i % GROUPS}"}
+                   for i in range(GROUPS * 3)]
+    monkeypatch.setattr(mailchimp_notifier, 'get_subscriber_cache', lambda: StaticSubscribers(subscribers))
+
+    server = FakeMailchimpServer(latency=0, batch_seconds_per_operation=0).start()
+    yield server
+    server.stop()
+
+
+def make_notifier(fake):
+    notifier = MailchimpNotifier(os.environ["MAILCHIMP_API_KEY"])
+    notifier.mailchimp_client.api_client.host = fake.api_url
+    notifier.api_retry_policy = RetryPolicy(max_attempts=3, base_delay=0.01, deadline=5)
+    notifier.dispatch_mode = "batch"
+    return notifier
+
+
+def fail_batches(notifier, path_fragment, error, times):
+    """Make batches.start raise `error` for the first `times` batches containing `path_fragment`"""
+    start = notifier.mailchimp_client.batches.start
+    failures = {'left': times}
+
+    def flaky_start(body):
+        if failures['left'] and any(path_fragment in op['path'] for op in body['operations']):
+            failures['left'] -= 1
+            raise error
+        return start(body)
+
+    notifier.mailchimp_client.batches.start = flaky_start
+    return failures
+
+
+def listings():
+    return [{'url': f"https://www.bizbuysell.com/listing/{i}/", 'title': f"Listing {i}",
+             'category': [f"Industry{i}"], 'asking_price': '$100,000'} for i in range(GROUPS)]
+
+
+def test_send_batch_submit_is_retried_after_a_server_error(fake):
+    notifier = make_notifier(fake)
+    failures = fail_batches(notifier, '/actions/send', ApiClientError('{"status": 503}', 503), times=1)
+
+    result = notifier.notify(listings(), cleanup_segments=False)
+
+    assert failures['left'] == 0
+    assert result['emails_sent'] == GROUPS * 3
+    assert fake.state.sent_campaigns == GROUPS
+
+
+def test_rejected_send_batch_falls_back_to_direct_sends(fake):
+    notifier = make_notifier(fake)
+    fail_batches(notifier, '/actions/send', ApiClientError('{"status": 400}', 400), times=10)
+
+    result = notifier.notify(listings(), cleanup_segments=False)
+
+    assert result['emails_sent'] == GROUPS * 3
+    assert fake.state.sent_campaigns == GROUPS
+    assert fake.requests['POST /3.0/campaigns/{id}/actions/send'] == GROUPS
+
+
+def test_rejected_content_batch_hands_groups_to_the_parallel_path(fake):
+    notifier = make_notifier(fake)
+    fail_batches(notifier, '/content', ApiClientError('{"status": 400}', 400), times=10)
+
+    result = notifier.notify(listings(), cleanup_segments=False)
+
+    assert result['emails_sent'] == GROUPS * 3
+    assert fake.state.sent_campaigns == GROUPS
+    # The batch's drafts are removed before the parallel path creates its own campaigns
+    assert len(fake.state.campaigns) == GROUPS
+
+
+def test_failed_content_operations_are_retried_directly(fake):
+    notifier = make_notifier(fake)
+    set_content = fake.state.set_content
+    failed = set()
+
+    def set_content_once_failing(match, query, body):
+        if match['campaign_id'] not in failed:
+            failed.add(match['campaign_id'])
+            return 500, {'title': "Internal Server Error", 'status': 500}
+        return set_content(match, query, body)
+
+    fake.state.set_content = set_content_once_failing
+
+    result = notifier.notify(listings(), cleanup_segments=False)
+
+    assert len(failed) == GROUPS
+    assert result['emails_sent'] == GROUPS * 3
+    assert fake.state.sent_campaigns == GROUPS
+    # Retried on the existing campaigns, not by creating new ones
+    assert len(fake.state.campaigns) == GROUPS
+
+
+def test_error_detail_is_not_empty_for_api_errors():
+    assert MailchimpNotifier._error_detail(ApiClientError('{"detail": "nope"}', 400)) == '400 {"detail": "nope"}'
+
+
+def test_parallel_path_removes_drafts_and_retries_failed_groups(fake):
+    notifier = make_notifier(fake)
+    notifier.dispatch_mode = "parallel"
+    set_content = fake.state.set_content
+    failed = set()
+
+    def set_content_failing_first_campaigns(match, query, body):
+        if len(failed) < GROUPS // 2 and match['campaign_id'] not in failed:
+            failed.add(match['campaign_id'])
+            return 400, {'title': "Invalid Resource", 'status': 400}
+        return set_content(match, query, body)
+
+    fake.state.set_content = set_content_failing_first_campaigns
+
+    result = notifier.notify(listings(), cleanup_segments=False)
+
+    assert result['emails_sent'] == GROUPS * 3
+    assert result['groups_failed'] == 0
+    assert fake.state.sent_campaigns == GROUPS
+    # The drafts of the failed first attempts were removed
+    assert len(fake.state.campaigns) == GROUPS
+
+
+def test_parallel_path_reports_groups_that_never_went_out(fake):
+    notifier = make_notifier(fake)
+    notifier.dispatch_mode = "parallel"
+
+    def refuse_send(match, query, body):
+        return 400, {'title': "Bad Request", 'status': 400, 'detail': "Refused"}
+
+    fake.state.send_campaign = refuse_send
+
+    result = notifier.notify(listings(), cleanup_segments=False)
+
+    assert result['emails_sent'] == 0
+    assert result['groups_failed'] == GROUPS
+    assert fake.state.campaigns == {}
+
+
+def test_collected_batches_are_sent_once_per_group(fake, monkeypatch):
+    subscribers = [{'email': "both@example.com", 'industries': "Industry0, Industry11"},
+                   {'email': "first@example.com", 'industries': "Industry0"}]
+    monkeypatch.setattr(mailchimp_notifier, 'get_subscriber_cache', lambda: StaticSubscribers(subscribers))
+    notifier = make_notifier(fake)
+    notifier.dispatch_mode = "parallel"
+    batch = listings()
+
+    assert notifier.collect(batch[:6]) == 2
+    assert notifier.collect(batch[6:]) == 1
+    result = notifier.notify_collected()
+
+    # "both" matched listings from two batches but gets a single campaign
+    assert result['matched_subscribers'] == 2
+    assert result['emails_sent'] == 2
+    assert fake.state.sent_campaigns == 2
+    assert notifier.notify_collected()['emails_sent'] == 0
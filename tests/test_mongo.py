@@ -0,0 +1,52 @@
+from pymongo.errors import OperationFailure
+
+from helpers import mongo
+
+
+class FakeCursor:
+    def __init__(self, query):
+        self.query = query
+
+    def explain(self):
+        return {'queryPlanner': {'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}}}}
+
+
+class FakeUpdateResult:
+    modified_count = 0
+
+
+class FakeCollection:
+    name = 'listings'
+
+    def __init__(self, existing_filter=None):
+        self.indexes = {}
+        if existing_filter is not None:
+            self.indexes['listing_id_unique'] = {'partialFilterExpression': existing_filter}
+        self.queries = []
+
+    def update_many(self, query, update):
+        return FakeUpdateResult()
+
+    def create_index(self, keys, unique=False, **options):
+        current = self.indexes.get(options['name'])
+        if current is not None and current.get('partialFilterExpression') != options.get('partialFilterExpression'):
+            raise OperationFailure("Index already exists with different options", code=85)
+        self.indexes[options['name']] = options
+
+    def drop_index(self, name):
+        del self.indexes[name]
+
+    def find(self, query):
+        self.queries.append(query)
+        return FakeCursor(query)
+
+
+def test_listing_id_index_covers_numeric_ids_and_replaces_old_filter():
+    col = FakeCollection(existing_filter={'listing_id': {'$gt': ''}})
+
+    plans = mongo.ensure_indexes(col)
+
+    assert col.indexes['listing_id_unique']['partialFilterExpression'] == {'listing_id': {'$exists': True}}
+    assert {'listing_id': '__plan_check__'} in col.queries
+    assert {'listing_id': -1} in col.queries
+    assert all('COLLSCAN' not in stages for stages in plans.values())
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import PyMongoError
+
+from helpers.subscriber_cache import SubscriberCache
+
+
+class FakeCollection:
+    """Just enough of a pymongo collection for the watermark sync (no change streams)"""
+
+    def __init__(self, docs):
+        self.docs = {doc['_id']: doc for doc in docs}
+
+    def watch(self, **kwargs):
+        raise PyMongoError("change streams need a replica set")
+
+    def find(self, query=None, projection=None):
+        query = query or {}
+        for doc in list(self.docs.values()):
+            if '_id' in query and doc['_id'] not in query['_id']['$in']:
+                continue
+            if 'updated_at' in query:
+                stamp = doc.get('updated_at')
+                if not isinstance(stamp, datetime) or stamp < query['updated_at']['$gte']:
+                    continue
+            yield {'_id': doc['_id']} if projection else dict(doc)
+
+
+def _subscriber(key, email, state, updated_at):
+    return {'_id': key, 'email': email, 'state': state, 'updated_at': updated_at}
+
+
+def test_cache_survives_save_reload_and_refresh(tmp_path):
+    now = datetime.now(timezone.utc)
+    collection = FakeCollection([_subscriber('a', 'a@example.com', 'Nevada', now)])
+    path = str(tmp_path / 'subscriber_cache.json')
+
+    first = SubscriberCache(collection=collection, path=path)
+    assert [c.email for c in first.refresh()] == ['a@example.com']
+
+    # A new process reads the watermark back from disk and syncs incrementally
+    collection.docs['b'] = _subscriber('b', 'b@example.com', 'Texas', now + timedelta(minutes=5))
+    second = SubscriberCache(collection=collection, path=path)
+    assert second._watermark.tzinfo is not None
+    assert sorted(c.email for c in second.refresh()) == ['a@example.com', 'b@example.com']
+
+    del collection.docs['a']
+    third = SubscriberCache(collection=collection, path=path)
+    assert [c.email for c in third.refresh()] == ['b@example.com']
+
+
+class Unreadable:
+    """A field value that cannot be turned into text, so compiling the subscriber raises"""
+
+    def __str__(self):
+        raise ValueError("cannot decode field")
+
+
+def test_bad_document_does_not_abort_refresh(tmp_path):
+    now = datetime.now(timezone.utc)
+    broken = _subscriber('d', 'd@example.com', 'Nevada', now)
+    broken['industries'] = [Unreadable()]
+    collection = FakeCollection([
+        _subscriber('a', 'a@example.com', 'Nevada', now),
+        _subscriber('b', 'b@example.com', 'Texas', '2026-01-01'),
+        _subscriber('c', 'c@example.com', 'Utah', now.replace(tzinfo=None)),
+        broken,
+    ])
+    cache = SubscriberCache(collection=collection, path=str(tmp_path / 'subscriber_cache.json'))
+    assert not cache._apply_document(broken)
+
+    # The broken document is skipped, the others still load
+    assert sorted(c.email for c in cache.refresh()) == ['a@example.com', 'b@example.com', 'c@example.com']
+    assert cache._watermark.tzinfo is not None
@@ -0,0 +1,171 @@
+import itertools
+
+import pytest
+
+from helpers.subscriber_index import SubscriberCriteria, SubscriberIndex, normalize_price
+from helpers.vector_matcher import NUMPY_AVAILABLE, VectorMatcher
+
+BOUNDS = [None, '100000', '$500,000']
+PRICES = [None, '$50,000', '$250,000', '$900,000']
+
+
+def legacy_price_filter(price, min_price, max_price) -> bool:
+    """The price check of the per-pair loop before the index (condition copied verbatim)"""
+    try:
+        if (min_price is None and (price is None)) and (int(price) >= int(min_price)):
+            return False
+        if (max_price is None and price is None) and (int(price) <= int(max_price)):
+            return False
+        return True
+    except Exception:
+        return False
+
+
+def bounded_price_filter(price, min_price, max_price) -> bool:
+    """min_price <= price <= max_price; an unpriced listing only reaches subscribers without bounds"""
+    price = normalize_price(price)
+    low, high = normalize_price(min_price), normalize_price(max_price)
+    if price is None:
+        return low is None and high is None
+    return (low is None or low <= price) and (high is None or price <= high)
+
+
+def price_pairs():
+    subscribers = [{'email': f"s{i}@example.com", 'price_min': low, 'price_max': high}
+                   for i, (low, high) in enumerate(itertools.product(BOUNDS, BOUNDS))]
+    listings = [{'url': f"https://www.bizbuysell.com/listing/{i}/", 'asking_price': price}
+                for i, price in enumerate(PRICES)]
+    return subscribers, listings
+
+
+def expected_matches(subscribers, listings, price_filter):
+    matches = {}
+    for subscriber in subscribers:
+        matched = [listing for listing in listings
+                   if price_filter(listing['asking_price'], subscriber['price_min'], subscriber['price_max'])]
+        if matched:
+            matches[subscriber['email']] = matched
+    return matches
+
+
+def compiled(subscribers):
+    return [SubscriberCriteria.from_document(subscriber) for subscriber in subscribers]
+
+
+def test_index_applies_price_bounds():
+    subscribers, listings = price_pairs()
+
+    assert SubscriberIndex(compiled(subscribers)).match(listings) == \
+        expected_matches(subscribers, listings, bounded_price_filter)
+
+
+def test_price_rule_change_against_the_legacy_filter():
+    criteria = SubscriberCriteria('a@example.com', 100000.0, 500000.0)
+
+    # Old: a priced listing was never rejected on price; new: the bounds apply
+    assert legacy_price_filter('$900,000', '100000', '$500,000')
+    assert not criteria.price_matches(900000.0)
+    assert criteria.price_matches(250000.0)
+
+    # Old: an unpriced listing reached only subscribers with both bounds; new: only those with none
+    assert legacy_price_filter(None, '100000', '$500,000')
+    assert not criteria.price_matches(None)
+    assert not legacy_price_filter(None, None, None)
+    assert SubscriberCriteria('b@example.com', None, None).price_matches(None)
+
+
+@pytest.mark.skipif(not NUMPY_AVAILABLE, reason="numpy is not installed")
+def test_vector_matcher_agrees_with_the_index():
+    subscribers, listings = price_pairs()
+
+    assert VectorMatcher(compiled(subscribers)).match(listings) == SubscriberIndex(compiled(subscribers)).match(listings)
+
+
+def original_list_field(field_value):
+    """normalize_list_field as it was before the index"""
+    if not field_value:
+        return []
+    if isinstance(field_value, list):
+        field_value = ','.join(str(item) for item in field_value)
+    return [item.strip() for item in str(field_value).replace('\xa0', '').split(',') if item and item.strip()]
+
+
+def original_loop(subscribers, listings):
+    """The per-pair loop before the index, copied verbatim except for the price check.
+
+    The original price condition could never reject a priced listing (see legacy_price_filter),
+    so the bounded rule stands in for it; everything else is the old code.
+    """
+    def listing_matches_subscriber(listing, min_price, max_price, subscriber_industries,
+                                   subscriber_states, subscriber_cities):
+        try:
+            if not bounded_price_filter(listing.get('asking_price'), min_price, max_price):
+                return False
+            if subscriber_industries:
+                listing_categories = listing.get('category') or []
+                if not isinstance(listing_categories, list):
+                    listing_categories = [listing_categories]
+                listing_industries = set(str(cat).lower().strip() for cat in listing_categories if cat)
+                if not subscriber_industries.intersection(listing_industries):
+                    return False
+            if subscriber_states:
+                if not subscriber_states.intersection({listing.get('state', '').lower()}):
+                    return False
+            if subscriber_cities:
+                if not subscriber_cities.intersection({listing.get('city', '').lower()}):
+                    return False
+            return True
+        except Exception:
+            return False
+
+    matches = {}
+    for subscriber in subscribers:
+        email = subscriber.get('email')
+        if not email:
+            continue
+        min_price = subscriber.get('price_min')
+        max_price = subscriber.get('price_max')
+        subscriber_industries = set(i.lower() for i in original_list_field(subscriber.get('industries')))
+        subscriber_states = set(i.lower() for i in original_list_field(subscriber.get('state')))
+        subscriber_cities = set(i.lower() for i in original_list_field(subscriber.get('city')))
+        matched = [listing for listing in listings
+                   if listing_matches_subscriber(listing, min_price, max_price, subscriber_industries,
+                                                 subscriber_states, subscriber_cities)]
+        if matched:
+            matches[email] = matched
+    return matches
+
+
+def criteria_table():
+    subscribers = [{'email': f"s{i}@example.com", 'state': state, 'city': city, 'industries': industries,
+                    'price_min': low, 'price_max': high}
+                   for i, (state, city, industries, (low, high)) in enumerate(itertools.product(
+                       [None, 'Nevada', 'nevada, Texas', ' TEXAS '],
+                       [None, 'Las Vegas', 'reno, austin'],
+                       [None, 'Retail', 'Retail, Food', 'FOOD'],
+                       [(None, None), ('100000', '$500,000')]))]
+    listings = [{'url': f"https://www.bizbuysell.com/listing/{i}/", 'state': state, 'city': city,
+                 'category': category, 'asking_price': price}
+                for i, (state, city, category, price) in enumerate(itertools.product(
+                    ['nevada', 'Texas', '', None],
+                    ['las vegas', 'Austin', ''],
+                    [[], ['Retail'], ['Food', 'Online'], 'retail'],
+                    [None, '$250,000', '$900,000']))]
+    return subscribers, listings
+
+
+def test_index_matches_the_original_loop():
+    subscribers, listings = criteria_table()
+    expected = original_loop(subscribers, listings)
+
+    # The table has to exercise both outcomes for the comparison to mean anything
+    pairs = sum(len(matched) for matched in expected.values())
+    assert 0 < pairs < len(subscribers) * len(listings)
+    assert SubscriberIndex(compiled(subscribers)).match(listings) == expected
+
+
+@pytest.mark.skipif(not NUMPY_AVAILABLE, reason="numpy is not installed")
+def test_vector_matcher_matches_the_original_loop():
+    subscribers, listings = criteria_table()
+
+    assert VectorMatcher(compiled(subscribers)).match(listings) == original_loop(subscribers, listings)